@@ -0,0 +1,287 @@
+"""API JSON `/api/v1` sobre los mismos servicios que las páginas HTML.
+
+Pensada para que el frontend (y un futuro cliente móvil) pida sólo los datos
+que cambian en vez de recargar la página entera y seguir un 302. Usa la misma
+sesión por cookie que el sitio; las escrituras exigen `Content-Type:
+application/json`, así un formulario de otro sitio no puede dispararlas.
+
+Respuestas:
+- éxito: el objeto pedido, o `{"items": [...], "next": cursor, "prev": cursor}`
+  en los listados (mismos cursores keyset que los dashboards);
+- error: `{"error": "mensaje"}` con 400/401/403/404/405/415.
+
+Los GET llevan ETag con las versiones de datos de `fragment_cache` y responden
+304 igual que los dashboards.
+"""
+import json
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+
+from app.core.fragment_cache import data_versions, fragment_cache, make_etag
+from app.core.metrics import metrics
+
+API_PREFIX = "/api/v1"
+API_DEFAULT_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+API_MAX_BODY = 16 * 1024
+
+# (método, ruta relativa a API_PREFIX, método del handler)
+API_ROUTES = [
+    ("GET", r"/canchas", "api_canchas"),
+    ("GET", r"/canchas/(\d+)/disponibilidad", "api_disponibilidad"),
+    ("GET", r"/reservas", "api_mis_reservas"),
+    ("POST", r"/reservas", "api_crear_reserva"),
+    ("POST", r"/reservas/(\d+)/cancelar", "api_cancelar_reserva"),
+    ("GET", r"/pagos", "api_mis_pagos"),
+    ("GET", r"/admin/usuarios", "api_admin_usuarios"),
+    ("GET", r"/admin/reservas", "api_admin_reservas"),
+    ("GET", r"/admin/pagos", "api_admin_pagos"),
+]
+_COMPILED_ROUTES = [(method, re.compile(pattern), name) for method, pattern, name in API_ROUTES]
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="seconds")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} no es serializable a JSON")
+
+
+def dumps(data: Any) -> bytes:
+    """JSON compacto: sin espacios y con acentos en UTF-8 en vez de \\uXXXX."""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
+def court_json(court) -> Dict[str, Any]:
+    return {"id": court.id, "nombre": court.nombre, "deporte": court.deporte, "precio_hora": court.precio_hora}
+
+
+def reserva_json(row: dict) -> Dict[str, Any]:
+    data = {
+        "id": row["id"],
+        "cancha": row["cancha"],
+        "fecha_inicio": row["fecha_inicio"],
+        "fecha_fin": row["fecha_fin"],
+        "estado": row["estado"],
+    }
+    if "usuario" in row:
+        data["usuario"] = row["usuario"]
+    return data
+
+
+def pago_json(row: dict) -> Dict[str, Any]:
+    data = {
+        "id": row["id"],
+        "reservation_id": row.get("reservation_id"),
+        "amount": row["amount"],
+        "currency": row.get("currency"),
+        "estado": row["estado"],
+        "metodo": row.get("metodo_nombre"),
+        "created_at": row["created_at"],
+    }
+    if "usuario_nombre" in row:
+        data["usuario"] = row["usuario_nombre"]
+    return data
+
+
+def page_json(page, serialize) -> Dict[str, Any]:
+    return {"items": [serialize(r) for r in page.items], "next": page.next_cursor, "prev": page.prev_cursor}
+
+
+class JsonApiMixin:
+    """Rutas /api/v1 para SimpleHandler (usa sus servicios, sesión y rate limiter)."""
+
+    def handle_api(self, method: str, parsed):
+        route = parsed.path[len(API_PREFIX):].rstrip("/") or "/"
+        name, args, allowed = None, (), []
+        for route_method, pattern, handler_name in _COMPILED_ROUTES:
+            match = pattern.fullmatch(route)
+            if match:
+                allowed.append(route_method)
+                if route_method == method:
+                    name, args = handler_name, match.groups()
+        if name is None:
+            if allowed:
+                self.send_json(405, {"error": "Método no permitido."}, headers={"Allow": ", ".join(allowed)})
+            else:
+                self.send_json(404, {"error": "Recurso no encontrado."})
+            return
+
+        try:
+            user = self.get_current_user()
+            if not user:
+                raise ApiError(401, "Debes iniciar sesión.")
+            if route.startswith("/admin/") and user.rol_id != 1:
+                raise ApiError(403, "Acceso sólo para administradores.")
+            result = getattr(self, name)(user, parse_qs(parsed.query), *args)
+        except ApiError as e:
+            result = (e.status, {"error": e.message})
+        except ValueError as e:
+            result = (400, {"error": str(e)})
+        except Exception as e:
+            print(f"[ERROR] API {method} {parsed.path}: {e}")
+            result = (500, {"error": "Error interno, intenta nuevamente."})
+        if result is None:
+            # El handler ya respondió (304 o 429)
+            return
+        status, data, *etag = result
+        metrics.inc("api_requests_total", route=name, status=str(status))
+        self.send_json(status, data, etag[0] if etag else None)
+
+    def send_json(self, status: int, data: Any, etag: Optional[str] = None, headers: Optional[dict] = None):
+        body = dumps(data)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_cache_validators(etag)
+        else:
+            self.send_header("Cache-Control", "no-store")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self) -> dict:
+        if self.headers.get("Content-Type", "").split(";")[0].strip() != "application/json":
+            raise ApiError(415, "Se espera Content-Type: application/json.")
+        length = int(self.headers.get("Content-Length", "0") or 0)
+        if length > API_MAX_BODY:
+            raise ApiError(413, "Cuerpo demasiado grande.")
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, UnicodeDecodeError):
+            raise ApiError(400, "JSON inválido.")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Se espera un objeto JSON.")
+        return data
+
+    def page_params(self, query: dict, default: int = API_DEFAULT_PAGE_SIZE):
+        limit = min(self.int_param(query, "limit", default), API_MAX_PAGE_SIZE)
+        return limit, query.get("after", [None])[0], query.get("before", [None])[0]
+
+    # --- Canchas -----------------------------------------------------------
+
+    def api_canchas(self, user, query):
+        etag = make_etag("api_canchas", data_versions.get("canchas"))
+        if self.not_modified("/api/v1/canchas", etag):
+            return None
+        canchas = fragment_cache.get_or_render(
+            "api_canchas", None, (data_versions.get("canchas"),),
+            lambda: [court_json(c) for c in self.reservation_service.court_repo.find_all()],
+        )
+        return 200, canchas, etag
+
+    def api_disponibilidad(self, user, query, cancha_id):
+        try:
+            dia = date.fromisoformat(query.get("fecha", [""])[0])
+        except ValueError:
+            raise ValueError("Parámetro fecha inválido (formato AAAA-MM-DD).")
+        # Las horas libres dependen de la hora actual (no se ofrecen horas pasadas)
+        etag = make_etag(
+            "api_disponibilidad", cancha_id, dia, datetime.now().strftime("%Y%m%d%H"),
+            data_versions.get("canchas"), data_versions.get("reservas"),
+        )
+        if self.not_modified("/api/v1/canchas/disponibilidad", etag):
+            return None
+        disp = self.reservation_service.disponibilidad(int(cancha_id), dia)
+        return 200, {
+            "cancha": court_json(disp["cancha"]),
+            "fecha": dia,
+            "ocupados": [{"inicio": inicio, "fin": fin} for inicio, fin in disp["ocupados"]],
+            "libres": [h.strftime("%H:%M") for h in disp["libres"]],
+        }, etag
+
+    # --- Reservas del usuario -----------------------------------------------
+
+    def api_mis_reservas(self, user, query):
+        limit, after, before = self.page_params(query, 10)
+        etag = make_etag(
+            "api_reservas", user.id, limit, after, before,
+            data_versions.get("canchas"), data_versions.get("reservas", user.id),
+        )
+        if self.not_modified("/api/v1/reservas", etag):
+            return None
+        page = self.reservation_service.reservation_repo.find_page_by_user(user.id, limit, after, before)
+        return 200, page_json(page, reserva_json), etag
+
+    def api_crear_reserva(self, user, query):
+        if not self.check_rate_limit("/reservar", "ip", self.client_address[0]):
+            return None
+        if not self.check_rate_limit("/reservar", "account", str(user.id)):
+            return None
+        data = self.read_json()
+        try:
+            cancha_id = int(data["cancha_id"])
+            duracion = int(data["duracion"])
+            fecha_inicio = datetime.fromisoformat(str(data["fecha_inicio"]))
+        except KeyError as e:
+            raise ValueError(f"Falta el campo {e.args[0]}.")
+        except (TypeError, ValueError):
+            raise ValueError("Datos inválidos: cancha_id y duracion son enteros, fecha_inicio AAAA-MM-DDTHH:MM.")
+        reserva = self.reservation_service.crear_reserva(user.id, cancha_id, fecha_inicio, duracion)
+        return 201, {
+            "id": reserva.id,
+            "cancha_id": reserva.cancha_id,
+            "fecha_inicio": reserva.fecha_inicio,
+            "fecha_fin": reserva.fecha_fin,
+            "estado": reserva.estado,
+        }
+
+    def api_cancelar_reserva(self, user, query, reservation_id):
+        self.reservation_service.cancelar_reserva(int(reservation_id), user.id, user.rol_id == 1)
+        return 200, {"id": int(reservation_id), "estado": "cancelada"}
+
+    # --- Pagos del usuario --------------------------------------------------
+
+    def api_mis_pagos(self, user, query):
+        limit, after, before = self.page_params(query)
+        etag = make_etag("api_pagos", user.id, limit, after, before, data_versions.get("pagos", user.id))
+        if self.not_modified("/api/v1/pagos", etag):
+            return None
+        page = self.payment_service.payment_repo.find_page_by_user(user.id, limit, after, before)
+        return 200, page_json(page, pago_json), etag
+
+    # --- Admin ----------------------------------------------------------------
+
+    def api_admin_usuarios(self, user, query):
+        limit, after, before = self.page_params(query)
+        etag = make_etag("api_admin_usuarios", limit, after, before, data_versions.get("usuarios"))
+        if self.not_modified("/api/v1/admin/usuarios", etag):
+            return None
+        page = self.admin_repo.get_users_page(limit, after, before)
+        return 200, page_json(page, dict), etag
+
+    def api_admin_reservas(self, user, query):
+        limit, after, before = self.page_params(query)
+        etag = make_etag(
+            "api_admin_reservas", limit, after, before,
+            data_versions.get("canchas"), data_versions.get("usuarios"), data_versions.get("reservas"),
+        )
+        if self.not_modified("/api/v1/admin/reservas", etag):
+            return None
+        page = self.reservation_service.reservation_repo.find_page_detailed(limit, after, before)
+        return 200, page_json(page, reserva_json), etag
+
+    def api_admin_pagos(self, user, query):
+        limit, after, before = self.page_params(query)
+        etag = make_etag(
+            "api_admin_pagos", limit, after, before, data_versions.get("usuarios"), data_versions.get("pagos"),
+        )
+        if self.not_modified("/api/v1/admin/pagos", etag):
+            return None
+        page = self.payment_service.payment_repo.find_page_detailed(limit, after, before)
+        return 200, page_json(page, pago_json), etag
@@ -0,0 +1,348 @@
+"""Servidor HTTP con control de admisión y descarte de carga.
+
+El hilo que acepta conexiones no atiende peticiones ni espera datos: pasa cada
+conexión a un hilo clasificador que vigila muchas a la vez con un selector y,
+cuando llega la línea de petición (o vence `peek_timeout`), la mira con
+MSG_PEEK, asigna la prioridad y la deja en una cola acotada que consumen N
+hilos trabajadores. Si la cola está
+llena se descarta la conexión menos prioritaria con un 503, y las conexiones
+que esperaron demasiado también se descartan en vez de atenderse tarde.
+
+Las conexiones largas (`/events`, server-sent events) no pasan por la cola:
+ocuparían un trabajador durante minutos. Van a un carril aparte con un hilo
+por conexión y un máximo propio (`max_streams`).
+"""
+import heapq
+import itertools
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from http.server import HTTPServer
+from typing import Deque, Dict, List, Tuple
+
+from app.core.metrics import metrics
+
+PRIORITY_CRITICAL = 0  # webhook de Stripe y pagos
+PRIORITY_NORMAL = 1    # login, reservas, formularios, estáticos
+PRIORITY_LOW = 2       # dashboards y listados
+
+PRIORITY_NAMES = {
+    PRIORITY_CRITICAL: "critical",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_LOW: "low",
+}
+
+SHED_RESPONSE = (
+    b"HTTP/1.0 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain; charset=utf-8\r\n"
+    b"Retry-After: 2\r\n"
+    b"Connection: close\r\n"
+    b"Content-Length: 38\r\n"
+    b"\r\n"
+    b"Servidor saturado, intenta nuevamente."
+)
+
+
+STREAM_PATHS = (b"/events",)
+
+# Marca los hilos del carril de conexiones largas (ver in_stream_lane)
+_lane = threading.local()
+
+
+def in_stream_lane() -> bool:
+    """True si el hilo actual atiende una conexión del carril de streams.
+
+    Una petición a /events cuya línea llegó después de `peek_timeout` se
+    clasifica como normal y cae en un trabajador; el handler lo comprueba con
+    esto para no retener al trabajador durante minutos.
+    """
+    return getattr(_lane, "stream", False)
+
+
+def is_stream(request_line: bytes) -> bool:
+    """True si la petición abre una conexión larga (SSE)."""
+    parts = request_line.split(b" ")
+    return len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?", 1)[0] in STREAM_PATHS
+
+
+def classify(request_line: bytes) -> int:
+    """Prioridad según la línea de petición ("GET /ruta HTTP/1.1")."""
+    parts = request_line.split(b" ")
+    if len(parts) < 2:
+        return PRIORITY_NORMAL
+    path = parts[1].split(b"?", 1)[0]
+    if path.startswith(b"/webhook/stripe") or path.startswith(b"/pagos"):
+        return PRIORITY_CRITICAL
+    if path.startswith(b"/dashboard"):
+        return PRIORITY_LOW
+    # Las lecturas de la API son listados como los del dashboard; las escrituras, formularios
+    if path.startswith(b"/api/") and parts[0] == b"GET":
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+
+class DeadlineRequestHandlerMixin:
+    """Limita el tiempo total para recibir la línea de petición y las cabeceras.
+
+    `timeout` (de StreamRequestHandler) sólo acota cada recv; un cliente que
+    manda un byte cada pocos segundos (slowloris) nunca lo dispara. Aquí un
+    temporizador cierra la conexión si las cabeceras no llegan a tiempo.
+    """
+    header_timeout = 10.0
+    timeout = 30.0
+
+    def handle_one_request(self):
+        self._header_timer = threading.Timer(self.header_timeout, self._abort_slow_client)
+        self._header_timer.daemon = True
+        self._header_timer.start()
+        try:
+            super().handle_one_request()
+        finally:
+            self._header_timer.cancel()
+
+    def parse_request(self):
+        # parse_request lee las cabeceras; al volver ya no aplica el plazo
+        ok = super().parse_request()
+        self._header_timer.cancel()
+        return ok
+
+    def _abort_slow_client(self):
+        metrics.inc("http_header_timeouts_total")
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class AdmissionControlledHTTPServer(HTTPServer):
+    def __init__(
+        self,
+        server_address,
+        handler_class,
+        workers: int = 16,
+        max_queue: int = 64,
+        queue_timeout: float = 10.0,
+        peek_timeout: float = 0.1,
+        max_streams: int = 200,
+    ):
+        self.workers = workers
+        self.max_streams = max_streams
+        self._streams = 0
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.peek_timeout = peek_timeout
+        # Backlog del listen() también acotado: lo que no cabe lo rechaza el kernel
+        self.request_queue_size = max_queue
+        super().__init__(server_address, handler_class)
+        self._queue: List[Tuple[int, int, float, socket.socket, tuple]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._busy = 0
+        self._stopping = False
+        self._threads = [
+            threading.Thread(target=self._worker_loop, name=f"http-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        # Conexiones aceptadas que esperan su línea de petición para clasificarse
+        self._selector = selectors.DefaultSelector()
+        self._incoming: Deque[Tuple[socket.socket, tuple]] = deque()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._classifier = threading.Thread(target=self._classifier_loop, name="http-classifier", daemon=True)
+        self._classifier.start()
+
+    @staticmethod
+    def _peek_request_line(request: socket.socket) -> bytes:
+        """Primera línea de lo ya recibido, sin consumirlo ni bloquear."""
+        try:
+            request.setblocking(False)
+            data = request.recv(1024, socket.MSG_PEEK)
+        except (BlockingIOError, InterruptedError, OSError, ValueError):
+            data = b""
+        finally:
+            try:
+                request.setblocking(True)
+            except OSError:
+                pass
+        return data.split(b"\r\n", 1)[0]
+
+    def process_request(self, request, client_address):
+        # El hilo del accept sólo entrega la conexión al clasificador
+        self._incoming.append((request, client_address))
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _classifier_loop(self) -> None:
+        """Espera la línea de petición de muchas conexiones a la vez.
+
+        Cada conexión se clasifica en cuanto es legible o, si el cliente no
+        manda nada en `peek_timeout`, con prioridad normal (el trabajador
+        aplicará el plazo de cabeceras). Un cliente lento ya no frena el accept.
+        """
+        deadlines: Dict[socket.socket, Tuple[float, tuple]] = {}
+        while not self._stopping:
+            timeout = None
+            if deadlines:
+                timeout = max(0.0, min(d for d, _ in deadlines.values()) - time.monotonic())
+            try:
+                events = self._selector.select(timeout)
+            except (OSError, ValueError):
+                if self._stopping:
+                    return
+                raise
+            ready = []
+            for key, _ in events:
+                if key.fileobj is self._wakeup_r:
+                    try:
+                        while self._wakeup_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                ready.append(key.fileobj)
+            while self._incoming:
+                request, client_address = self._incoming.popleft()
+                try:
+                    self._selector.register(request, selectors.EVENT_READ)
+                except (OSError, ValueError):
+                    self.shutdown_request(request)
+                    continue
+                deadlines[request] = (time.monotonic() + self.peek_timeout, client_address)
+            now = time.monotonic()
+            ready.extend(sock for sock, (deadline, _) in deadlines.items() if deadline <= now and sock not in ready)
+            for request in ready:
+                _, client_address = deadlines.pop(request)
+                self._selector.unregister(request)
+                try:
+                    self._dispatch(request, client_address, self._peek_request_line(request))
+                except Exception:
+                    self.handle_error(request, client_address)
+                    self.shutdown_request(request)
+
+    def _dispatch(self, request, client_address, request_line: bytes) -> None:
+        if is_stream(request_line):
+            self._start_stream(request, client_address)
+            return
+        priority = classify(request_line)
+        shed = None
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                worst_index = max(range(len(self._queue)), key=lambda i: self._queue[i][:2], default=None)
+                if worst_index is not None and priority < self._queue[worst_index][0]:
+                    # Desplazar a la petición encolada menos importante
+                    shed = self._queue[worst_index]
+                    self._queue[worst_index] = self._queue[-1]
+                    self._queue.pop()
+                    heapq.heapify(self._queue)
+                else:
+                    shed = (priority, 0, 0.0, request, client_address)
+            if shed is None or shed[3] is not request:
+                heapq.heappush(
+                    self._queue, (priority, next(self._seq), time.monotonic(), request, client_address)
+                )
+                metrics.inc("http_admitted_total", priority=PRIORITY_NAMES[priority])
+                self._cond.notify()
+            metrics.set_gauge("http_queue_depth", len(self._queue))
+        if shed is not None:
+            self._shed(shed[3], shed[0], "queue_full")
+
+    def _start_stream(self, request, client_address) -> None:
+        with self._cond:
+            if self._streams >= self.max_streams:
+                full = True
+            else:
+                full = False
+                self._streams += 1
+                metrics.set_gauge("http_open_streams", self._streams)
+        if full:
+            self._shed(request, PRIORITY_LOW, "streams_full")
+            return
+        threading.Thread(
+            target=self._stream_thread, args=(request, client_address), name="http-stream", daemon=True
+        ).start()
+
+    def _stream_thread(self, request, client_address) -> None:
+        _lane.stream = True
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._cond:
+                self._streams -= 1
+                metrics.set_gauge("http_open_streams", self._streams)
+
+    def open_streams(self) -> int:
+        with self._cond:
+            return self._streams
+
+    def _shed(self, request, priority: int, reason: str) -> None:
+        metrics.inc("http_shed_total", priority=PRIORITY_NAMES[priority], reason=reason)
+        try:
+            request.settimeout(1.0)
+            request.sendall(SHED_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                priority, _, enqueued_at, request, client_address = heapq.heappop(self._queue)
+                metrics.set_gauge("http_queue_depth", len(self._queue))
+                if time.monotonic() - enqueued_at > self.queue_timeout:
+                    expired = True
+                else:
+                    expired = False
+                    self._busy += 1
+                    metrics.set_gauge("http_busy_workers", self._busy)
+            if expired:
+                self._shed(request, priority, "queue_timeout")
+                continue
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._cond:
+                    self._busy -= 1
+                    metrics.set_gauge("http_busy_workers", self._busy)
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def server_close(self):
+        with self._cond:
+            self._stopping = True
+            pending, self._queue = self._queue, []
+            self._cond.notify_all()
+        for item in pending:
+            self.shutdown_request(item[3])
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError:
+            pass
+        self._classifier.join(1.0)
+        for key in list(self._selector.get_map().values()):
+            if key.fileobj is not self._wakeup_r:
+                self.shutdown_request(key.fileobj)
+        while self._incoming:
+            self.shutdown_request(self._incoming.popleft()[0])
+        self._selector.close()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+        super().server_close()
@@ -0,0 +1,176 @@
+"""Bundles de CSS/JS con nombre por contenido para cache `immutable`.
+
+Las plantillas siguen enlazando los archivos fuente (`/static/style.css`). Al
+cargarlas, `rewrite` reemplaza los `<link>`/`<script>` locales de cada página
+por un único bundle minificado cuyo nombre lleva el hash del contenido
+(`/static/dist/style-dashboard.3f2a9c1b0d4e.css`). Si un archivo cambia, cambia
+el hash y por lo tanto la URL, así que el navegador puede guardar el bundle
+para siempre sin pedirlo de nuevo.
+
+Los bundles se arman en memoria (con variante gzip) y además se escriben en
+`static/dist/` para poder inspeccionarlos o servirlos desde un proxy.
+"""
+import gzip
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+DIST_PREFIX = "/static/dist/"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CONTENT_TYPES = {
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+}
+
+_STYLESHEET_RE = re.compile(r'<link\s+rel="stylesheet"\s+href="/static/([\w.-]+\.css)"\s*/?>')
+_SCRIPT_RE = re.compile(r'<script\s+src="/static/([\w.-]+\.js)"\s*>\s*</script>')
+
+_DIST_NAME_RE = re.compile(r"[\w-]+\.[0-9a-f]{12}\.(css|js)")
+
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE_RE = re.compile(r"\s+")
+_CSS_PUNCT_RE = re.compile(r"\s*([{};,])\s*")
+
+
+def minify_css(source: str) -> str:
+    """Quita comentarios y espacios sobrantes (conservador: no toca selectores ni valores)."""
+    css = _CSS_COMMENT_RE.sub("", source)
+    css = _CSS_SPACE_RE.sub(" ", css)
+    css = _CSS_PUNCT_RE.sub(r"\1", css)
+    css = css.replace(": ", ":").replace(";}", "}")
+    return css.strip()
+
+
+def minify_js(source: str) -> str:
+    """Quita indentación, líneas vacías y líneas de comentario `//`.
+
+    Se mantienen los saltos de línea para no depender de la inserción
+    automática de punto y coma.
+    """
+    lines = (line.strip() for line in source.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+
+class Bundle:
+    def __init__(self, url: str, content_type: str, body: bytes):
+        self.url = url
+        self.content_type = content_type
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+
+
+class AssetPipeline:
+    def __init__(self, static_dir: str, dist_dir: Optional[str] = None):
+        self.static_dir = static_dir
+        self.dist_dir = dist_dir or os.path.join(static_dir, "dist")
+        # Fuentes -> bundle, y nombre publicado -> bundle
+        self._by_sources: Dict[Tuple[str, ...], Bundle] = {}
+        self._by_name: Dict[str, Bundle] = {}
+        self._lock = threading.Lock()
+
+    def rewrite(self, html: str) -> str:
+        """Reemplaza las referencias a /static/*.css y *.js de la página por sus bundles."""
+        if "/static/" not in html:
+            return html
+        html = self._rewrite_tags(html, _STYLESHEET_RE, '<link rel="stylesheet" href="{}">')
+        return self._rewrite_tags(html, _SCRIPT_RE, '<script src="{}"></script>')
+
+    def _rewrite_tags(self, html: str, pattern, tag: str) -> str:
+        matches = list(pattern.finditer(html))
+        sources = [m.group(1) for m in matches]
+        if not sources or not all(os.path.isfile(os.path.join(self.static_dir, s)) for s in sources):
+            return html
+        bundle = self.bundle(tuple(sources))
+        # El bundle ocupa el lugar del primer tag; el resto se elimina
+        parts: List[str] = []
+        pos = 0
+        for i, m in enumerate(matches):
+            end = m.start()
+            if i:
+                # Si el tag quedó solo en su línea, se va también la indentación
+                line_start = html.rfind("\n", pos, end) + 1
+                if not html[line_start:end].strip():
+                    end = line_start
+            parts.append(html[pos:end])
+            if i == 0:
+                parts.append(tag.format(bundle.url))
+            pos = m.end()
+            if i and html.startswith("\n", pos):
+                pos += 1
+        parts.append(html[pos:])
+        return "".join(parts)
+
+    def bundle(self, sources: Tuple[str, ...]) -> Bundle:
+        bundle = self._by_sources.get(sources)
+        if bundle is not None:
+            return bundle
+        with self._lock:
+            bundle = self._by_sources.get(sources)
+            if bundle is None:
+                bundle = self._build(sources)
+                self._by_sources[sources] = bundle
+                self._by_name[bundle.url[len(DIST_PREFIX):]] = bundle
+        return bundle
+
+    def _build(self, sources: Tuple[str, ...]) -> Bundle:
+        ext = os.path.splitext(sources[0])[1]
+        minify = minify_css if ext == ".css" else minify_js
+        chunks = []
+        for source in sources:
+            with open(os.path.join(self.static_dir, source), "r", encoding="utf-8") as f:
+                chunks.append(minify(f.read()))
+        # ";" entre scripts por si alguno no termina en punto y coma
+        body = ("\n" if ext == ".css" else ";\n").join(chunks).encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        stem = "-".join(os.path.splitext(s)[0] for s in sources)
+        name = f"{stem}.{digest}{ext}"
+        self._write(name, body)
+        return Bundle(DIST_PREFIX + name, CONTENT_TYPES[ext], body)
+
+    def _write(self, name: str, body: bytes) -> None:
+        path = os.path.join(self.dist_dir, name)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(self.dist_dir, exist_ok=True)
+            # Escribir y renombrar: otro proceso nunca ve un archivo a medias
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+        except OSError:
+            # Con el directorio de sólo lectura el bundle se sirve igual desde memoria
+            pass
+
+    def build_templates(self, templates_dir: str) -> List[str]:
+        """Arma los bundles de todas las plantillas; devuelve sus URLs."""
+        for name in sorted(os.listdir(templates_dir)):
+            if not name.endswith(".html"):
+                continue
+            with open(os.path.join(templates_dir, name), "r", encoding="utf-8") as f:
+                self.rewrite(f.read())
+        return sorted(b.url for b in self._by_sources.values())
+
+    def get(self, name: str) -> Optional[Bundle]:
+        """Bundle publicado como /static/dist/<name>, o None.
+
+        Si no se armó en este proceso se busca en `dist/`: páginas servidas
+        antes de un despliegue pueden seguir pidiendo bundles anteriores.
+        """
+        bundle = self._by_name.get(name)
+        if bundle is not None:
+            return bundle
+        ext = os.path.splitext(name)[1]
+        if ext not in CONTENT_TYPES or not _DIST_NAME_RE.fullmatch(name):
+            return None
+        path = os.path.join(self.dist_dir, name)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            bundle = Bundle(DIST_PREFIX + name, CONTENT_TYPES[ext], f.read())
+        with self._lock:
+            self._by_name.setdefault(name, bundle)
+        return bundle
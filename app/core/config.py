@@ -35,6 +35,54 @@ class Settings:
     smtp_from_email: str
     smtp_from_name: str
     notification_mode: str  # "smtp" or "simulated"
+    # Pool de procesos para hashing de contraseñas (0 = hashear en el hilo de la petición)
+    password_hash_workers: int = 0
+    password_hash_queue_size: int = 64
+    # Parámetros de hash para contraseñas nuevas (ver scripts/calibrate_password_hash.py)
+    password_algorithm: str = "pbkdf2_sha256"  # "pbkdf2_sha256" o "scrypt"
+    password_iterations: int = 260_000
+    scrypt_n: int = 2**14
+    scrypt_r: int = 8
+    scrypt_p: int = 1
+    # Rate limiting de login, reservas y pagos
+    rate_limit_enabled: bool = True
+    rate_limit_max_buckets: int = 10_000
+    # Control de admisión del servidor HTTP
+    server_workers: int = 16
+    server_max_queue: int = 64
+    server_queue_timeout: float = 10.0
+    server_header_timeout: float = 10.0
+    server_read_timeout: float = 30.0
+    # Server-sent events (/events): conexiones largas fuera del pool de trabajadores
+    sse_max_connections: int = 200
+    sse_keepalive: float = 15.0
+    sse_max_duration: float = 600.0
+    # Bandeja de salida de notificaciones (ver app/services/notification_worker.py)
+    notification_inline_workers: int = 1
+    notification_batch_size: int = 20
+    notification_poll_interval: float = 2.0
+    notification_lease_seconds: int = 300
+    # Reintentos con backoff exponencial; después de max_attempts la notificación queda 'descartado'
+    notification_max_attempts: int = 6
+    notification_retry_base: float = 60.0
+    notification_retry_max: float = 3600.0
+    # Pool de sesiones SMTP autenticadas (ver app/services/smtp_pool.py)
+    smtp_pool_size: int = 4
+    smtp_max_messages_per_connection: int = 100
+    smtp_noop_after: float = 30.0
+    smtp_timeout: float = 30.0
+    smtp_starttls: bool = True  # false sólo para el SMTP local de pruebas (tests/smtp_sink.py)
+    # Envío en paralelo y límite de mensajes por servidor SMTP (0 = sin límite)
+    notification_concurrency: int = 4
+    smtp_rate_per_second: float = 0.5
+    smtp_rate_burst: float = 10
+    # Recordatorios antes de las reservas pagadas (ver app/services/reminder_scheduler.py)
+    reminder_scheduler_enabled: bool = True
+    reminder_hours_before: float = 24.0
+    reminder_batch_size: int = 200
+    reminder_refresh_interval: float = 300.0
+    # Comunicados del admin: destinatarios por INSERT multi-fila (ver app/services/broadcast_service.py)
+    broadcast_batch_size: int = 1000
 
     @classmethod
     def from_env(cls) -> "Settings":
@@ -55,4 +103,42 @@ class Settings:
             smtp_from_email=os.environ.get("SMTP_FROM_EMAIL", ""),
             smtp_from_name=os.environ.get("SMTP_FROM_NAME", "Centro Deportivo"),
             notification_mode=os.environ.get("NOTIFICATION_MODE", "simulated"),
+            # Password hashing pool
+            password_hash_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1))),
+            password_hash_queue_size=int(os.environ.get("PASSWORD_HASH_QUEUE_SIZE", "64")),
+            password_algorithm=os.environ.get("PASSWORD_ALGORITHM", "pbkdf2_sha256"),
+            password_iterations=int(os.environ.get("PASSWORD_ITERATIONS", "260000")),
+            scrypt_n=int(os.environ.get("SCRYPT_N", "16384")),
+            scrypt_r=int(os.environ.get("SCRYPT_R", "8")),
+            scrypt_p=int(os.environ.get("SCRYPT_P", "1")),
+            rate_limit_enabled=os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes"),
+            rate_limit_max_buckets=int(os.environ.get("RATE_LIMIT_MAX_BUCKETS", "10000")),
+            server_workers=int(os.environ.get("SERVER_WORKERS", "16")),
+            server_max_queue=int(os.environ.get("SERVER_MAX_QUEUE", "64")),
+            server_queue_timeout=float(os.environ.get("SERVER_QUEUE_TIMEOUT", "10")),
+            server_header_timeout=float(os.environ.get("SERVER_HEADER_TIMEOUT", "10")),
+            server_read_timeout=float(os.environ.get("SERVER_READ_TIMEOUT", "30")),
+            sse_max_connections=int(os.environ.get("SSE_MAX_CONNECTIONS", "200")),
+            sse_keepalive=float(os.environ.get("SSE_KEEPALIVE", "15")),
+            sse_max_duration=float(os.environ.get("SSE_MAX_DURATION", "600")),
+            notification_inline_workers=int(os.environ.get("NOTIFICATION_INLINE_WORKERS", "1")),
+            notification_batch_size=int(os.environ.get("NOTIFICATION_BATCH_SIZE", "20")),
+            notification_poll_interval=float(os.environ.get("NOTIFICATION_POLL_INTERVAL", "2")),
+            notification_lease_seconds=int(os.environ.get("NOTIFICATION_LEASE_SECONDS", "300")),
+            notification_max_attempts=int(os.environ.get("NOTIFICATION_MAX_ATTEMPTS", "6")),
+            notification_retry_base=float(os.environ.get("NOTIFICATION_RETRY_BASE", "60")),
+            notification_retry_max=float(os.environ.get("NOTIFICATION_RETRY_MAX", "3600")),
+            smtp_pool_size=int(os.environ.get("SMTP_POOL_SIZE", "4")),
+            smtp_max_messages_per_connection=int(os.environ.get("SMTP_MAX_MESSAGES_PER_CONNECTION", "100")),
+            smtp_noop_after=float(os.environ.get("SMTP_NOOP_AFTER", "30")),
+            smtp_timeout=float(os.environ.get("SMTP_TIMEOUT", "30")),
+            smtp_starttls=os.environ.get("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes"),
+            notification_concurrency=int(os.environ.get("NOTIFICATION_CONCURRENCY", "4")),
+            smtp_rate_per_second=float(os.environ.get("SMTP_RATE_PER_SECOND", "0.5")),
+            smtp_rate_burst=float(os.environ.get("SMTP_RATE_BURST", "10")),
+            reminder_scheduler_enabled=os.environ.get("REMINDER_SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes"),
+            reminder_hours_before=float(os.environ.get("REMINDER_HOURS_BEFORE", "24")),
+            reminder_batch_size=int(os.environ.get("REMINDER_BATCH_SIZE", "200")),
+            reminder_refresh_interval=float(os.environ.get("REMINDER_REFRESH_INTERVAL", "300")),
+            broadcast_batch_size=int(os.environ.get("BROADCAST_BATCH_SIZE", "1000")),
         )
@@ -1,4 +1,7 @@
+from typing import Iterator, Sequence
+
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
 
 from app.core.config import Settings
@@ -16,3 +19,28 @@ def get_connection(settings: Settings):
     )
     conn.autocommit = True  # evitar rollbacks implícitos al cerrar
     return conn
+
+
+def iter_server_side(
+    settings: Settings, query: str, params: Sequence = (), itersize: int = 2000, as_dict: bool = False
+) -> Iterator:
+    """Recorre el resultado con un cursor con nombre (del lado del servidor).
+
+    Postgres entrega las filas de a `itersize` por viaje, así que la memoria
+    usada no depende del tamaño del resultado. Los cursores con nombre viven
+    dentro de una transacción, por eso aquí no se usa autocommit. Las filas son
+    tuplas, o dicts si `as_dict` es True.
+    """
+    conn = get_connection(settings)
+    try:
+        conn.autocommit = False
+        conn.set_session(readonly=True)
+        factory = RealDictCursor if as_dict else psycopg2.extensions.cursor
+        with conn.cursor(name="stream", cursor_factory=factory) as cur:
+            cur.itersize = itersize
+            cur.execute(query, params)
+            for row in cur:
+                yield row
+        conn.rollback()
+    finally:
+        conn.close()
@@ -0,0 +1,131 @@
+"""Bus de eventos en memoria para Server-Sent Events (`GET /events`).
+
+Los repositorios publican cada cambio de estado (reservas, pagos, canchas) en
+los mismos puntos donde incrementan `data_versions`, así que cualquier camino
+que escriba (checkout, webhook de Stripe, cancelación, panel de admin) llega
+al bus. Cada pestaña conectada tiene una suscripción con cola acotada:
+
+- los eventos de una reserva o pago van a su dueño y a los administradores;
+- los de disponibilidad y canchas, a todos.
+
+El evento se serializa una sola vez y se comparte entre suscriptores. Un
+cliente que no consume (cola llena) se desconecta en vez de acumular memoria;
+el navegador reconecta solo y pide lo perdido con `Last-Event-ID`, que se
+responde desde un historial corto.
+
+Igual que las versiones de datos, el bus es del proceso: cambios hechos desde
+otra instancia no generan eventos aquí.
+"""
+import itertools
+import json
+import queue
+import threading
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Deque, List, Optional, Set
+
+from app.core.fragment_cache import BOOT_ID
+from app.core.metrics import metrics
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} no es serializable a JSON")
+
+
+class Event:
+    __slots__ = ("id", "type", "data", "user_id", "frame")
+
+    def __init__(self, event_id: int, event_type: str, data: dict, user_id: Optional[int]):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+        self.user_id = user_id
+        payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+        # El id lleva el arranque del proceso: un Last-Event-ID de antes de reiniciar no se confunde
+        self.frame = f"id: {BOOT_ID}-{event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class Subscription:
+    def __init__(self, user_id: int, is_admin: bool, max_queue: int):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.queue: "queue.Queue[Event]" = queue.Queue(maxsize=max_queue)
+        self.closed = False
+
+    def wants(self, event: Event) -> bool:
+        return event.user_id is None or self.is_admin or event.user_id == self.user_id
+
+    def get(self, timeout: float) -> Optional[Event]:
+        """Siguiente evento, o None si pasó `timeout` sin eventos."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    def __init__(self, max_queue: int = 100, history: int = 500):
+        self.max_queue = max_queue
+        self._subscribers: Set[Subscription] = set()
+        self._history: Deque[Event] = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int, is_admin: bool = False) -> Subscription:
+        sub = Subscription(user_id, is_admin, self.max_queue)
+        with self._lock:
+            self._subscribers.add(sub)
+            metrics.set_gauge("sse_subscribers", len(self._subscribers))
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        sub.closed = True
+        with self._lock:
+            self._subscribers.discard(sub)
+            metrics.set_gauge("sse_subscribers", len(self._subscribers))
+
+    def publish(self, event_type: str, data: dict, user_id: Optional[int] = None) -> Event:
+        """Envía el evento a los suscriptores que pueden verlo. `user_id=None` es público."""
+        with self._lock:
+            event = Event(next(self._ids), event_type, data, user_id)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if not sub.wants(event):
+                continue
+            try:
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                # Cliente lento: se corta y al reconectar recupera lo perdido del historial
+                self.unsubscribe(sub)
+                metrics.inc("sse_dropped_subscribers_total")
+        metrics.inc("sse_events_published_total", type=event_type)
+        return event
+
+    def replay(self, sub: Subscription, last_event_id: Optional[str]) -> List[Event]:
+        """Eventos posteriores a `last_event_id` (cabecera Last-Event-ID) que siguen en el historial."""
+        boot, _, seq = (last_event_id or "").partition("-")
+        if boot != BOOT_ID or not seq.isdigit():
+            return []
+        with self._lock:
+            return [e for e in self._history if e.id > int(seq) and sub.wants(e)]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def publish_safely(event_type: str, data: dict, user_id: Optional[int] = None) -> None:
+    """Publica sin dejar que un error del bus afecte la escritura que lo originó."""
+    try:
+        event_bus.publish(event_type, data, user_id)
+    except Exception as e:
+        print(f"[WARNING] No se pudo publicar el evento {event_type}: {e}")
+
+
+event_bus = EventBus()
@@ -0,0 +1,92 @@
+"""Caché de fragmentos HTML invalidada por versión de los datos.
+
+Los repositorios llaman a `data_versions.bump(entidad, clave)` cada vez que
+escriben (canchas, reservas de un usuario, pagos de un usuario). Un fragmento
+se guarda junto con las versiones de los datos con los que se armó y se
+reutiliza mientras esas versiones no cambien; no hay expiración por tiempo.
+
+Las versiones viven en memoria del proceso: escrituras hechas por fuera del
+servidor (scripts, otra instancia) no invalidan la caché de éste.
+
+Las mismas versiones sirven como validador HTTP: `make_etag` arma un ETag con
+ellas para responder 304 sin consultar la BD.
+"""
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.metrics import metrics
+
+
+class DataVersions:
+    def __init__(self):
+        self._versions: Dict[Tuple[str, Optional[Hashable]], int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, entity: str, key: Optional[Hashable] = None) -> int:
+        return self._versions.get((entity, key), 0)
+
+    def bump(self, entity: str, key: Optional[Hashable] = None) -> None:
+        """Marca la entidad como modificada. Con `key` también cambia la versión global de la entidad."""
+        with self._lock:
+            self._versions[(entity, None)] = self._versions.get((entity, None), 0) + 1
+            if key is not None:
+                self._versions[(entity, key)] = self._versions.get((entity, key), 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._versions.clear()
+
+
+class FragmentCache:
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[tuple, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, name: str, key: Hashable, versions: tuple, render: Callable[[], Any]) -> Any:
+        """Devuelve el fragmento `name`/`key` si se armó con `versions`; si no, lo arma con `render`.
+
+        Las versiones se leen antes de renderizar: si una escritura ocurre
+        mientras tanto, el fragmento queda guardado con la versión vieja y la
+        siguiente petición lo vuelve a armar.
+        """
+        cache_key = (name, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(cache_key)
+                metrics.inc("fragment_cache_hits_total", fragment=name)
+                return entry[1]
+        metrics.inc("fragment_cache_misses_total", fragment=name)
+        value = render()
+        with self._lock:
+            self._entries[cache_key] = (versions, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.inc("fragment_cache_evictions_total")
+            metrics.set_gauge("fragment_cache_entries", len(self._entries))
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def make_etag(*parts: Hashable) -> str:
+    """ETag débil a partir de versiones y datos de la vista.
+
+    Incluye un id aleatorio del arranque: al reiniciar, las versiones vuelven a
+    cero y plantillas o código pueden haber cambiado, así que los ETag viejos
+    dejan de coincidir.
+    """
+    raw = repr((BOOT_ID,) + parts).encode("utf-8")
+    return 'W/"' + hashlib.blake2b(raw, digest_size=12).hexdigest() + '"'
+
+
+BOOT_ID = secrets.token_hex(8)
+data_versions = DataVersions()
+fragment_cache = FragmentCache()
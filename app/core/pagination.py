@@ -0,0 +1,128 @@
+"""Paginación por keyset (seek) para listados grandes.
+
+En lugar de OFFSET, cada página se pide "después de" o "antes de" la clave de
+ordenación de una fila concreta, p. ej. `(fecha_inicio, id) < (%s, %s)`. Con un
+índice sobre esas columnas la consulta lee sólo las filas de la página, sin
+importar en qué página estemos. Los cursores viajan en la URL como base64.
+"""
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+
+@dataclass
+class Page:
+    items: List[dict] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    encoded = [{"$dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(encoded, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[list]:
+    """Devuelve los valores del cursor, o None si no hay cursor o es inválido."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        # Sólo listas (de escalares o fechas): cualquier otro JSON es un cursor editado a mano
+        if not isinstance(values, list):
+            return None
+        decoded = []
+        for v in values:
+            if isinstance(v, dict):
+                if set(v) != {"$dt"} or not isinstance(v["$dt"], str):
+                    return None
+                v = datetime.fromisoformat(v["$dt"])
+            elif isinstance(v, list):
+                return None
+            decoded.append(v)
+        return decoded
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def _cursor_fits(values: Optional[list], sort_types: Sequence[type], size: int) -> bool:
+    """El cursor tiene un valor por columna y, si se indicaron tipos, cada uno es del tipo de su columna."""
+    if values is None or len(values) != size:
+        return False
+    for value, expected in zip(values, sort_types):
+        # bool es subclase de int, pero true/false en un cursor de ids es un cursor editado
+        if isinstance(value, bool) or not isinstance(value, expected):
+            return False
+    return True
+
+
+def fetch_keyset_page(
+    cur,
+    select_sql: str,
+    sort_columns: Sequence[str],
+    row_keys: Sequence[str],
+    limit: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    conditions: Sequence[str] = (),
+    params: Sequence[Any] = (),
+    descending: bool = True,
+    sort_types: Sequence[type] = (),
+) -> Page:
+    """Ejecuta `select_sql` paginado por las columnas `sort_columns`.
+
+    `row_keys` son los nombres de esas mismas columnas en el resultado, para
+    construir los cursores. `after` avanza a la página siguiente y `before`
+    retrocede a la anterior. `sort_types` (p. ej. `(datetime, int)`) son los
+    tipos de esas columnas: un cursor con otros tipos, como un entero donde va
+    una fecha, se ignora igual que uno con otro largo en vez de llegar a la BD.
+    """
+    after_values = decode_cursor(after)
+    if not _cursor_fits(after_values, sort_types, len(sort_columns)):
+        after_values = None
+    before_values = decode_cursor(before) if after_values is None else None
+    if not _cursor_fits(before_values, sort_types, len(sort_columns)):
+        before_values = None
+    backwards = before_values is not None
+    cursor_values = before_values if backwards else after_values
+
+    # Recorrer hacia atrás es recorrer el orden inverso y voltear el resultado
+    ascending = descending == backwards
+    where = list(conditions)
+    query_params = list(params)
+    if cursor_values is not None:
+        columns = ", ".join(sort_columns)
+        placeholders = ", ".join(["%s"] * len(sort_columns))
+        where.append(f"({columns}) {'>' if ascending else '<'} ({placeholders})")
+        query_params.extend(cursor_values)
+    direction = "ASC" if ascending else "DESC"
+    sql = select_sql
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY " + ", ".join(f"{c} {direction}" for c in sort_columns)
+    sql += " LIMIT %s"
+    query_params.append(limit + 1)
+
+    cur.execute(sql, query_params)
+    rows = [dict(r) for r in cur.fetchall()]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    def key(row):
+        return encode_cursor([row[k] for k in row_keys])
+
+    page = Page(items=rows)
+    if rows:
+        if backwards:
+            page.next_cursor = key(rows[-1])
+            page.prev_cursor = key(rows[0]) if has_more else None
+        else:
+            page.next_cursor = key(rows[-1]) if has_more else None
+            page.prev_cursor = key(rows[0]) if cursor_values is not None else None
+    return page
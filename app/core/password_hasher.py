@@ -0,0 +1,93 @@
+"""Pool de procesos para hashear y verificar contraseñas fuera del hilo de la petición.
+
+PBKDF2 con cientos de miles de iteraciones ocupa un núcleo completo durante
+decenas de milisegundos. Ejecutarlo en procesos separados evita que una ráfaga
+de logins bloquee al resto de peticiones, y la cola acotada hace que el exceso
+de carga se rechace en lugar de acumularse sin límite.
+
+Si un proceso del pool muere (OOM, segfault) el executor queda roto para
+siempre; se reemplaza por uno nuevo y el trabajo se reintenta una vez.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from app.core import security
+from app.core.config import Settings
+from app.core.metrics import metrics
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int = 64, acquire_timeout: float = 5.0):
+        if workers < 1:
+            raise ValueError("El pool de hashing necesita al menos un proceso.")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.acquire_timeout = acquire_timeout
+        self._executor = self._new_executor()
+        self._executor_lock = threading.Lock()
+        # Trabajos en ejecución + en espera; el resto se rechaza
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # "spawn" evita heredar locks de los hilos del servidor al hacer fork
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_broken(self, broken: ProcessPoolExecutor) -> None:
+        with self._executor_lock:
+            # Varios hilos ven el mismo pool roto: sólo el primero lo reemplaza
+            if self._executor is broken:
+                self._executor = self._new_executor()
+                metrics.inc("password_hash_pool_restarts_total")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise ValueError("El servidor está ocupado, intenta nuevamente en unos segundos.")
+        try:
+            for attempt in (1, 2):
+                executor = self._executor
+                try:
+                    return executor.submit(fn, *args).result()
+                except BrokenProcessPool:
+                    if attempt == 2:
+                        raise
+                    self._replace_broken(executor)
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str, policy: security.HashPolicy = security.DEFAULT_POLICY) -> str:
+        return self._submit(security.generate_password_hash, password, policy)
+
+    def verify(self, password: str, stored_hash: str) -> bool:
+        return self._submit(security.verify_password, password, stored_hash)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher(settings: Settings) -> Optional[PasswordHasher]:
+    """Devuelve el pool compartido del proceso, o None si está deshabilitado."""
+    global _hasher
+    if settings.password_hash_workers < 1:
+        return None
+    with _hasher_lock:
+        if _hasher is None:
+            _hasher = PasswordHasher(
+                settings.password_hash_workers, settings.password_hash_queue_size
+            )
+        return _hasher
+
+
+def shutdown_password_hasher() -> None:
+    global _hasher
+    with _hasher_lock:
+        if _hasher is not None:
+            _hasher.shutdown()
+            _hasher = None
@@ -0,0 +1,90 @@
+"""Páginas anónimas (inicio, login, registro) prerenderizadas en memoria.
+
+Estas plantillas `string.Template` sólo tienen, como mucho, la variable
+`$message`. Al cargarlas se parten en los bytes de antes y de después del
+mensaje, así que:
+
+- sin mensaje, la respuesta ya está armada (también comprimida con gzip) y
+  servirla es escribir bytes en el socket;
+- con mensaje, basta con escaparlo y pegarlo entre las dos mitades.
+"""
+import gzip
+import html
+import os
+import threading
+from string import Template
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Separa las dos mitades de la página; no puede aparecer en una plantilla
+_MESSAGE_MARKER = "\x00message\x00"
+
+Headers = List[Tuple[str, str]]
+
+
+class PrerenderedPage:
+    def __init__(self, source: str):
+        page = Template(source).substitute(message=_MESSAGE_MARKER)
+        head, _, tail = page.partition(_MESSAGE_MARKER)
+        self.head = head.encode("utf-8")
+        self.tail = tail.encode("utf-8")
+        self.body = self.head + self.tail
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.headers = self._headers(len(self.body))
+        self.gzip_headers = self._headers(len(self.gzip_body), encoding="gzip")
+
+    @staticmethod
+    def _headers(length: int, encoding: Optional[str] = None) -> Headers:
+        headers = [("Content-Type", "text/html; charset=utf-8"), ("Content-Length", str(length))]
+        if encoding:
+            headers.append(("Content-Encoding", encoding))
+        headers.append(("Vary", "Accept-Encoding"))
+        return headers
+
+    def response(self, message: str = "", accept_gzip: bool = False) -> Tuple[Headers, bytes]:
+        """Cabeceras y cuerpo para `message` (se escapa como HTML)."""
+        if not message:
+            if accept_gzip:
+                return self.gzip_headers, self.gzip_body
+            return self.headers, self.body
+        # Con mensaje la página cambia en cada petición: no vale la pena comprimirla
+        body = b"".join((self.head, html.escape(message).encode("utf-8"), self.tail))
+        return self._headers(len(body)), body
+
+
+class PrerenderedPages:
+    def __init__(self, directory: str, preprocess: Optional[Callable[[str], str]] = None):
+        self.directory = directory
+        self.preprocess = preprocess
+        self._pages: Dict[str, PrerenderedPage] = {}
+        self._lock = threading.Lock()
+
+    def load(self, *names: str) -> None:
+        for name in names:
+            self.get(name)
+
+    def get(self, name: str) -> PrerenderedPage:
+        page = self._pages.get(name)
+        if page is None:
+            with self._lock:
+                page = self._pages.get(name)
+                if page is None:
+                    with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                        source = f.read()
+                    page = PrerenderedPage(self.preprocess(source) if self.preprocess else source)
+                    self._pages[name] = page
+        return page
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """True si el cliente acepta gzip (sin `q=0`)."""
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        if coding.strip().lower() in ("gzip", "x-gzip"):
+            params = params.strip()
+            if not params.startswith("q="):
+                return True
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+    return False
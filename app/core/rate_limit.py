@@ -0,0 +1,146 @@
+"""Rate limiter en memoria con token buckets por IP y por cuenta.
+
+Cada ruta protegida tiene una política por ámbito ("ip" y "account"). Los
+buckets se guardan en un OrderedDict acotado: al superar el máximo se
+descartan los menos usados recientemente, así que la memoria no crece con el
+número de clientes distintos.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from app.core.config import Settings
+from app.core.metrics import metrics
+
+
+@dataclass(frozen=True)
+class RatePolicy:
+    capacity: float  # ráfaga máxima
+    refill_per_second: float
+
+
+# Políticas por ruta y ámbito. El login es lo más caro (PBKDF2), reservas y
+# pagos consultan varios repositorios por POST.
+DEFAULT_POLICIES: Dict[str, Dict[str, RatePolicy]] = {
+    "/login": {
+        "ip": RatePolicy(capacity=20, refill_per_second=20 / 60),
+        "account": RatePolicy(capacity=5, refill_per_second=5 / 60),
+    },
+    "/register": {
+        "ip": RatePolicy(capacity=5, refill_per_second=5 / 60),
+    },
+    "/reservar": {
+        "ip": RatePolicy(capacity=30, refill_per_second=30 / 60),
+        "account": RatePolicy(capacity=10, refill_per_second=10 / 60),
+    },
+    "/pagos/create": {
+        "ip": RatePolicy(capacity=20, refill_per_second=20 / 60),
+        "account": RatePolicy(capacity=5, refill_per_second=5 / 60),
+    },
+}
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+    def consume(self, policy: RatePolicy, now: float, cost: float = 1) -> float:
+        """Consume `cost` tokens. Devuelve 0 si se permitió o los segundos hasta poder hacerlo."""
+        elapsed = max(now - self.updated, 0)
+        self.tokens = min(policy.capacity, self.tokens + elapsed * policy.refill_per_second)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / policy.refill_per_second
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        policies: Dict[str, Dict[str, RatePolicy]] = DEFAULT_POLICIES,
+        max_buckets: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.policies = policies
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self._buckets: "OrderedDict[Tuple[str, str, str], TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, route: str, scope: str, key: str, cost: float = 1) -> float:
+        """Devuelve 0 si la petición puede seguir, o el Retry-After en segundos."""
+        policy = self.policies.get(route, {}).get(scope)
+        if policy is None or not key:
+            return 0.0
+        now = self.clock()
+        bucket_key = (route, scope, key)
+        with self._lock:
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None:
+                bucket = TokenBucket(policy.capacity, now)
+                self._buckets[bucket_key] = bucket
+                if len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+                    metrics.inc("rate_limit_evictions_total")
+            else:
+                self._buckets.move_to_end(bucket_key)
+            retry_after = bucket.consume(policy, now, cost)
+            metrics.set_gauge("rate_limit_buckets", len(self._buckets))
+        if retry_after:
+            metrics.inc("rate_limit_throttled_total", route=route, scope=scope)
+        return retry_after
+
+    def bucket_count(self) -> int:
+        return len(self._buckets)
+
+
+class Throttle:
+    """Token bucket bloqueante para trabajo saliente (p. ej. envíos a un servidor SMTP).
+
+    A diferencia de `RateLimiter`, no rechaza: `acquire` espera hasta que haya
+    token. Es seguro entre hilos; la espera se hace fuera del lock.
+    """
+
+    def __init__(
+        self,
+        policy: RatePolicy,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.policy = policy
+        self.clock = clock
+        self.sleep = sleep
+        self._bucket = TokenBucket(policy.capacity, clock())
+        self._lock = threading.Lock()
+
+    def acquire(self, cost: float = 1) -> float:
+        """Espera a tener `cost` tokens. Devuelve los segundos esperados."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                wait = self._bucket.consume(self.policy, self.clock(), cost)
+            if not wait:
+                return waited
+            self.sleep(wait)
+            waited += wait
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(settings: Settings) -> Optional[RateLimiter]:
+    """Devuelve el limiter compartido del proceso, o None si está deshabilitado."""
+    global _limiter
+    if not settings.rate_limit_enabled:
+        return None
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(max_buckets=settings.rate_limit_max_buckets)
+        return _limiter
@@ -2,41 +2,134 @@ import hashlib
 import hmac
 import os
 import secrets
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 
 PASSWORD_ALGORITHM = "pbkdf2_sha256"
+SCRYPT_ALGORITHM = "scrypt"
 ITERATIONS = 260_000
+SCRYPT_N = 2**14
+SCRYPT_R = 8
+SCRYPT_P = 1
 SALT_SIZE = 16
 
 
-def _pbkdf2_hash(password: str, salt: bytes) -> bytes:
+@dataclass(frozen=True)
+class HashPolicy:
+    """Parámetros con los que se generan los hashes nuevos."""
+    algorithm: str = PASSWORD_ALGORITHM
+    iterations: int = ITERATIONS
+    scrypt_n: int = SCRYPT_N
+    scrypt_r: int = SCRYPT_R
+    scrypt_p: int = SCRYPT_P
+
+    @classmethod
+    def from_settings(cls, settings) -> "HashPolicy":
+        return cls(
+            algorithm=settings.password_algorithm,
+            iterations=settings.password_iterations,
+            scrypt_n=settings.scrypt_n,
+            scrypt_r=settings.scrypt_r,
+            scrypt_p=settings.scrypt_p,
+        )
+
+
+DEFAULT_POLICY = HashPolicy()
+
+
+def _pbkdf2_hash(password: str, salt: bytes, iterations: int = ITERATIONS, dklen: int = 32) -> bytes:
     return hashlib.pbkdf2_hmac(
-        "sha256", password.encode("utf-8"), salt, ITERATIONS, dklen=32
+        "sha256", password.encode("utf-8"), salt, iterations, dklen=dklen
+    )
+
+
+def _scrypt_hash(password: str, salt: bytes, n: int, r: int, p: int, dklen: int = 32) -> bytes:
+    # OpenSSL limita la memoria a 32 MiB por defecto; scrypt necesita ~128*r*n bytes
+    maxmem = 128 * r * (n + p + 2) + 1024 * 1024
+    return hashlib.scrypt(
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=maxmem, dklen=dklen
     )
 
 
-def generate_password_hash(password: str) -> str:
+def generate_password_hash(password: str, policy: HashPolicy = DEFAULT_POLICY) -> str:
     salt = os.urandom(SALT_SIZE)
-    hash_bytes = _pbkdf2_hash(password, salt)
-    return f"{PASSWORD_ALGORITHM}${ITERATIONS}${salt.hex()}${hash_bytes.hex()}"
+    if policy.algorithm == SCRYPT_ALGORITHM:
+        hash_bytes = _scrypt_hash(password, salt, policy.scrypt_n, policy.scrypt_r, policy.scrypt_p)
+        return (
+            f"{SCRYPT_ALGORITHM}${policy.scrypt_n}${policy.scrypt_r}${policy.scrypt_p}"
+            f"${salt.hex()}${hash_bytes.hex()}"
+        )
+    if policy.algorithm != PASSWORD_ALGORITHM:
+        raise ValueError(f"Algoritmo de contraseña no soportado: {policy.algorithm}")
+    hash_bytes = _pbkdf2_hash(password, salt, policy.iterations)
+    return f"{PASSWORD_ALGORITHM}${policy.iterations}${salt.hex()}${hash_bytes.hex()}"
 
 
 def verify_password(password: str, stored_hash: str) -> bool:
     try:
-        algorithm, iterations_str, salt_hex, hash_hex = stored_hash.split("$")
-        if algorithm != PASSWORD_ALGORITHM:
+        parts = stored_hash.split("$")
+        if parts[0] == PASSWORD_ALGORITHM:
+            _, iterations_str, salt_hex, hash_hex = parts
+            expected_hash = bytes.fromhex(hash_hex)
+            new_hash = _pbkdf2_hash(
+                password, bytes.fromhex(salt_hex), int(iterations_str), dklen=len(expected_hash)
+            )
+        elif parts[0] == SCRYPT_ALGORITHM:
+            _, n_str, r_str, p_str, salt_hex, hash_hex = parts
+            expected_hash = bytes.fromhex(hash_hex)
+            new_hash = _scrypt_hash(
+                password, bytes.fromhex(salt_hex), int(n_str), int(r_str), int(p_str),
+                dklen=len(expected_hash),
+            )
+        else:
             return False
-        iterations = int(iterations_str)
-        salt = bytes.fromhex(salt_hex)
-        expected_hash = bytes.fromhex(hash_hex)
-        new_hash = hashlib.pbkdf2_hmac(
-            "sha256", password.encode("utf-8"), salt, iterations, dklen=len(expected_hash)
-        )
         return hmac.compare_digest(new_hash, expected_hash)
     except (ValueError, TypeError):
         return False
 
 
+def needs_rehash(stored_hash: str, policy: HashPolicy = DEFAULT_POLICY) -> bool:
+    """True si el hash guardado no usa el algoritmo o los parámetros actuales."""
+    parts = stored_hash.split("$")
+    if parts[0] != policy.algorithm:
+        return True
+    try:
+        if policy.algorithm == SCRYPT_ALGORITHM:
+            return (int(parts[1]), int(parts[2]), int(parts[3])) != (
+                policy.scrypt_n, policy.scrypt_r, policy.scrypt_p
+            )
+        return int(parts[1]) != policy.iterations
+    except (IndexError, ValueError):
+        return True
+
+
+def calibrate_policy(algorithm: str = PASSWORD_ALGORITHM, target_ms: float = 250.0) -> HashPolicy:
+    """Mide el coste del hash en esta máquina y elige parámetros cercanos a target_ms."""
+    salt = os.urandom(SALT_SIZE)
+    if algorithm == SCRYPT_ALGORITHM:
+        # El coste de scrypt crece con n (potencia de 2): duplicar hasta alcanzar el objetivo
+        n = 2**12
+        while True:
+            start = time.perf_counter()
+            _scrypt_hash("calibracion", salt, n, SCRYPT_R, SCRYPT_P)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms * 2 > target_ms or n >= 2**20:
+                return HashPolicy(algorithm=SCRYPT_ALGORITHM, scrypt_n=n)
+            n *= 2
+    if algorithm != PASSWORD_ALGORITHM:
+        raise ValueError(f"Algoritmo de contraseña no soportado: {algorithm}")
+    # PBKDF2 escala linealmente con las iteraciones
+    sample = 50_000
+    start = time.perf_counter()
+    _pbkdf2_hash("calibracion", salt, sample)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    iterations = int(sample * target_ms / max(elapsed_ms, 0.001))
+    # Redondear a miles y no bajar del mínimo recomendado por OWASP
+    iterations = max(round(iterations, -3), 100_000)
+    return HashPolicy(algorithm=PASSWORD_ALGORITHM, iterations=iterations)
+
+
 def generate_token() -> str:
     return secrets.token_urlsafe(32)
 
@@ -0,0 +1,403 @@
+"""Motor de plantillas HTML compiladas.
+
+Cada plantilla se traduce una sola vez a una función Python que va agregando
+trozos a una lista (`out.append`); renderizar es llamar a esa función y hacer
+un único `"".join`. Sintaxis:
+
+    {{ expr }}              expresión Python, escapada para HTML
+    {{ expr|safe }}         sin escapar (HTML ya armado, p. ej. un paginador)
+    {% for a, b in expr %} ... {% else %} ... {% endfor %}   (else: lista vacía)
+    {% if expr %} ... {% elif expr %} ... {% else %} ... {% endif %}
+    {% include "parcial.html" %}
+    {% extends "base.html" %} + {% block nombre %} ... {% endblock %}
+    {# comentario #}
+
+Las expresiones son Python normal: `r['usuario']`, `enumerate(items, start=1)`,
+`"%.2f" % monto`. Los nombres que no están en el contexto valen "" (falsos e
+iterables vacíos), y `None` se muestra como "".
+"""
+import ast
+import builtins
+import html
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+_TOKEN_RE = re.compile(r"(\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\})", re.S)
+
+_BUILTINS = {
+    name: getattr(builtins, name)
+    for name in (
+        "enumerate", "len", "range", "zip", "str", "int", "float", "min", "max",
+        "sorted", "reversed", "round", "abs", "sum", "any", "all", "format", "isinstance",
+    )
+}
+
+
+class TemplateSyntaxError(ValueError):
+    def __init__(self, message: str, name: str, line: int):
+        super().__init__(f"{name}, línea {line}: {message}")
+        self.template_name = name
+        self.line = line
+
+
+class Markup(str):
+    """Texto que ya es HTML seguro y no se vuelve a escapar."""
+
+
+class _Undefined:
+    def __str__(self):
+        return ""
+
+    def __bool__(self):
+        return False
+
+    def __iter__(self):
+        return iter(())
+
+    def __len__(self):
+        return 0
+
+    def __repr__(self):
+        return "Undefined"
+
+
+UNDEFINED = _Undefined()
+
+
+def escape(value) -> str:
+    # Se llama una vez por valor y por fila: los casos comunes van primero y
+    # html.escape sólo corre si hay algo que escapar.
+    cls = type(value)
+    if cls is int or cls is float:
+        return str(value)
+    if cls is not str:
+        if value is None or value is UNDEFINED:
+            return ""
+        if isinstance(value, Markup):
+            return value
+        value = str(value)
+    if "&" in value or "<" in value or ">" in value or '"' in value or "'" in value:
+        return html.escape(value, quote=True)
+    return value
+
+
+def _to_str(value) -> str:
+    return "" if value is None or value is UNDEFINED else str(value)
+
+
+def _lookup(ctx: dict, name: str):
+    if name in ctx:
+        return ctx[name]
+    return _BUILTINS.get(name, UNDEFINED)
+
+
+class _Node:
+    __slots__ = ("kind", "line", "args", "body", "branches", "else_body")
+
+    def __init__(self, kind, line, args=None):
+        self.kind = kind
+        self.line = line
+        self.args = args
+        self.body: List["_Node"] = []
+        self.branches: list = []  # if/elif: [(condición, cuerpo)]
+        self.else_body: Optional[List["_Node"]] = None
+
+
+class _Compiler:
+    def __init__(self, name: str, source: str, loader: Optional[Callable[[str], str]] = None, depth: int = 0):
+        self.name = name
+        self.source = source
+        self.loader = loader
+        self.depth = depth
+        self.parent: Optional[str] = None
+        self.blocks: Dict[str, List[_Node]] = {}
+        self._counter = 0
+
+    # --- Análisis -------------------------------------------------------
+
+    def error(self, message: str, line: int):
+        return TemplateSyntaxError(message, self.name, line)
+
+    def check_expr(self, code: str, line: int) -> ast.Expression:
+        try:
+            return ast.parse(code.strip(), mode="eval")
+        except SyntaxError as e:
+            raise self.error(f"expresión inválida {code.strip()!r} ({e.msg})", line)
+
+    def parse(self) -> List[_Node]:
+        root: List[_Node] = []
+        stack: List[_Node] = []
+        current = root
+        line = 1
+        for token in _TOKEN_RE.split(self.source):
+            token_line = line
+            line += token.count("\n")
+            if not token:
+                continue
+            if token.startswith("{#") and token.endswith("#}"):
+                continue
+            if token.startswith("{{") and token.endswith("}}"):
+                code, safe = token[2:-2].strip(), False
+                if code.endswith("|safe"):
+                    code, safe = code[:-5].strip(), True
+                self.check_expr(code, token_line)
+                current.append(_Node("expr", token_line, (code, safe)))
+                continue
+            if not (token.startswith("{%") and token.endswith("%}")):
+                current.append(_Node("text", token_line, token))
+                continue
+
+            tag = token[2:-2].strip()
+            keyword, _, rest = tag.partition(" ")
+            rest = rest.strip()
+            if keyword == "for":
+                target, sep, iterable = rest.partition(" in ")
+                if not sep:
+                    raise self.error("se esperaba {% for x in lista %}", token_line)
+                self.check_expr(iterable, token_line)
+                try:
+                    ast.parse(f"for {target.strip()} in (): pass")
+                except SyntaxError:
+                    raise self.error(f"variable de ciclo inválida {target.strip()!r}", token_line)
+                node = _Node("for", token_line, (target.strip(), iterable.strip()))
+                current.append(node)
+                stack.append(node)
+                current = node.body
+            elif keyword == "if":
+                self.check_expr(rest, token_line)
+                node = _Node("if", token_line)
+                node.branches.append((rest, []))
+                current.append(node)
+                stack.append(node)
+                current = node.branches[-1][1]
+            elif keyword == "elif":
+                if not stack or stack[-1].kind != "if" or stack[-1].else_body is not None:
+                    raise self.error("elif fuera de un if", token_line)
+                self.check_expr(rest, token_line)
+                stack[-1].branches.append((rest, []))
+                current = stack[-1].branches[-1][1]
+            elif keyword == "else":
+                if not stack or stack[-1].kind not in ("if", "for") or stack[-1].else_body is not None:
+                    raise self.error("else fuera de un if o for", token_line)
+                stack[-1].else_body = []
+                current = stack[-1].else_body
+            elif keyword in ("endfor", "endif", "endblock"):
+                expected = keyword[3:]
+                if not stack or stack[-1].kind != expected:
+                    raise self.error(f"{keyword} sin {expected} abierto", token_line)
+                stack.pop()
+                current = self._body_of(stack[-1]) if stack else root
+            elif keyword == "block":
+                if not re.fullmatch(r"\w+", rest):
+                    raise self.error("nombre de bloque inválido", token_line)
+                if rest in self.blocks:
+                    raise self.error(f"bloque {rest!r} repetido", token_line)
+                node = _Node("block", token_line, rest)
+                self.blocks[rest] = node.body
+                current.append(node)
+                stack.append(node)
+                current = node.body
+            elif keyword == "include":
+                target = self.check_expr(rest, token_line).body
+                if self.loader and isinstance(target, ast.Constant) and isinstance(target.value, str):
+                    # Parcial con nombre fijo: se copia su código aquí mismo, sin llamada por fila
+                    current.extend(self.inline(target.value, token_line))
+                else:
+                    current.append(_Node("include", token_line, rest))
+            elif keyword == "extends":
+                if stack or any(n.kind != "text" or n.args.strip() for n in root):
+                    raise self.error("extends debe ser la primera etiqueta", token_line)
+                parent = self.check_expr(rest, token_line).body
+                if not (isinstance(parent, ast.Constant) and isinstance(parent.value, str)):
+                    raise self.error("extends requiere un nombre entre comillas", token_line)
+                self.parent = parent.value
+            else:
+                raise self.error(f"etiqueta desconocida {keyword!r}", token_line)
+        if stack:
+            raise self.error(f"falta cerrar {stack[-1].kind}", stack[-1].line)
+        return root
+
+    def inline(self, name: str, line: int) -> List[_Node]:
+        if self.depth >= 10:
+            raise self.error(f"demasiados include anidados ({name})", line)
+        try:
+            source = self.loader(name)
+        except OSError:
+            raise self.error(f"no existe la plantilla {name!r}", line)
+        sub = _Compiler(name, source, self.loader, self.depth + 1)
+        nodes = sub.parse()
+        if sub.parent or sub.blocks:
+            raise self.error(f"{name} no puede usar extends ni block si se incluye", line)
+        return nodes
+
+    @staticmethod
+    def _body_of(node: _Node) -> List[_Node]:
+        if node.else_body is not None:
+            return node.else_body
+        if node.kind == "if":
+            return node.branches[-1][1]
+        return node.body
+
+    # --- Generación de código -------------------------------------------
+
+    def names_in(self, nodes: List[_Node], names: set) -> set:
+        for node in nodes:
+            codes = []
+            if node.kind == "expr":
+                codes.append(node.args[0])
+            elif node.kind == "for":
+                codes.append(node.args[1])
+            elif node.kind == "include":
+                codes.append(node.args)
+            elif node.kind == "if":
+                codes.extend(cond for cond, _ in node.branches)
+            for code in codes:
+                for sub in ast.walk(ast.parse(code.strip(), mode="eval")):
+                    if isinstance(sub, ast.Name):
+                        names.add(sub.id)
+            self.names_in(node.body, names)
+            for _, body in node.branches:
+                self.names_in(body, names)
+            if node.else_body:
+                self.names_in(node.else_body, names)
+        return names
+
+    def emit_function(self, func_name: str, nodes: List[_Node], lines: List[str]):
+        lines.append(f"def {func_name}(_ctx, _out, _blocks):")
+        lines.append("    _append = _out.append")
+        for name in sorted(self.names_in(nodes, set())):
+            lines.append(f"    {name} = _lookup(_ctx, {name!r})")
+        self.emit_nodes(nodes, lines, 1, [])
+        lines.append("    return None")
+        lines.append("")
+
+    def emit_nodes(self, nodes: List[_Node], lines: List[str], depth: int, loop_names: List[str]):
+        pad = "    " * depth
+        run: List[str] = []
+        run_line = None
+        for node in nodes + [None]:
+            # Texto y expresiones seguidos se juntan en un solo append
+            if node is not None and node.kind == "text":
+                run.append(repr(node.args))
+                continue
+            if node is not None and node.kind == "expr":
+                code, safe = node.args
+                run.append(f"{'_to_str' if safe else '_escape'}({code})")
+                run_line = run_line or node.line
+                continue
+            if run:
+                comment = f"  # línea {run_line}" if run_line else ""
+                joined = run[0] if len(run) == 1 else "_join((" + ", ".join(run) + "))"
+                lines.append(f"{pad}_append({joined}){comment}")
+                run, run_line = [], None
+            if node is None:
+                break
+            if node.kind == "for":
+                target, iterable = node.args
+                self._counter += 1
+                empty = f"_empty{self._counter}"
+                if node.else_body is not None:
+                    lines.append(f"{pad}{empty} = True")
+                lines.append(f"{pad}for {target} in {iterable}:  # línea {node.line}")
+                if node.else_body is not None:
+                    lines.append(f"{pad}    {empty} = False")
+                bound = [n.id for n in ast.walk(ast.parse(f"{target} = 0").body[0].targets[0]) if isinstance(n, ast.Name)]
+                self.emit_nodes(node.body, lines, depth + 1, loop_names + bound)
+                lines.append(f"{pad}    pass")
+                if node.else_body is not None:
+                    lines.append(f"{pad}if {empty}:")
+                    self.emit_nodes(node.else_body, lines, depth + 1, loop_names)
+                    lines.append(f"{pad}    pass")
+            elif node.kind == "if":
+                for i, (cond, body) in enumerate(node.branches):
+                    lines.append(f"{pad}{'if' if i == 0 else 'elif'} {cond}:  # línea {node.line}")
+                    self.emit_nodes(body, lines, depth + 1, loop_names)
+                    lines.append(f"{pad}    pass")
+                if node.else_body is not None:
+                    lines.append(f"{pad}else:")
+                    self.emit_nodes(node.else_body, lines, depth + 1, loop_names)
+                    lines.append(f"{pad}    pass")
+            elif node.kind == "block":
+                lines.append(f"{pad}_blocks.get({node.args!r}, _block_{node.args})(_ctx, _out, _blocks)")
+            elif node.kind == "include":
+                ctx = "_ctx"
+                if loop_names:
+                    ctx = "{**_ctx, " + ", ".join(f"{n!r}: {n}" for n in dict.fromkeys(loop_names)) + "}"
+                lines.append(f"{pad}_env.get_template({node.args})._render({ctx}, _out, {{}})")
+
+    def compile(self) -> str:
+        root = self.parse()
+        lines: List[str] = []
+        for block_name, body in self.blocks.items():
+            self.emit_function(f"_block_{block_name}", body, lines)
+        lines.append("_own_blocks = {" + ", ".join(f"{b!r}: _block_{b}" for b in self.blocks) + "}")
+        if self.parent:
+            # Lo que está fuera de los bloques de una plantilla hija se ignora
+            lines.append("def _render(_ctx, _out, _blocks):")
+            lines.append(f"    _env.get_template({self.parent!r})._render(_ctx, _out, {{**_own_blocks, **_blocks}})")
+            lines.append("")
+        else:
+            self.emit_function("_render", root, lines)
+        return "\n".join(lines)
+
+
+class Template:
+    def __init__(self, env: "TemplateEnvironment", name: str, source: str):
+        self.name = name
+        self.source = source
+        self.code = _Compiler(name, source, env.load_source).compile()
+        namespace = {
+            "_env": env,
+            "_lookup": _lookup,
+            "_escape": escape,
+            "_to_str": _to_str,
+            "_join": "".join,
+        }
+        exec(compile(self.code, f"<plantilla {name}>", "exec"), namespace)
+        self._render: Callable = namespace["_render"]
+
+    def render(self, context: Optional[dict] = None, **kwargs) -> str:
+        out: List[str] = []
+        self._render({**(context or {}), **kwargs}, out, {})
+        return "".join(out)
+
+    def render_into(self, out, context: Optional[dict] = None, **kwargs) -> None:
+        """Renderiza agregando trozos a `out` (cualquier objeto con `append`)."""
+        self._render({**(context or {}), **kwargs}, out, {})
+
+
+class TemplateEnvironment:
+    """Carga y compila plantillas de un directorio, una sola vez cada una."""
+
+    def __init__(self, directory: str, auto_reload: bool = False, preprocess: Optional[Callable[[str], str]] = None):
+        self.directory = directory
+        self.auto_reload = auto_reload
+        # Transformación del fuente antes de compilar (p. ej. reescribir URLs de assets)
+        self.preprocess = preprocess
+        self._cache: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def load_source(self, name: str) -> str:
+        with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+            source = f.read()
+        return self.preprocess(source) if self.preprocess else source
+
+    def get_template(self, name: str) -> Template:
+        cached = self._cache.get(name)
+        if cached and not self.auto_reload:
+            return cached[1]
+        mtime = os.path.getmtime(os.path.join(self.directory, name))
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with self._lock:
+            template = Template(self, name, self.load_source(name))
+            self._cache[name] = (mtime, template)
+        return template
+
+    def from_string(self, source: str, name: str = "<string>") -> Template:
+        return Template(self, name, source)
+
+    def render(self, name: str, context: Optional[dict] = None, **kwargs) -> str:
+        return self.get_template(name).render(context, **kwargs)
@@ -0,0 +1,24 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+
+@dataclass
+class Broadcast:
+    """Comunicado del admin a todos los usuarios activos, encolado por lotes"""
+    asunto: str
+    mensaje: str
+    created_by: Optional[int] = None
+    estado: str = "en_curso"  # 'en_curso', 'completado'
+    total: int = 0  # usuarios activos al crearlo (para mostrar el avance)
+    encoladas: int = 0
+    last_user_id: int = 0  # checkpoint: último destinatario ya encolado
+    id: Optional[int] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
+
+    def validar_datos(self) -> None:
+        if not self.asunto or not self.asunto.strip() or not self.mensaje or not self.mensaje.strip():
+            raise ValueError("Asunto y mensaje son obligatorios.")
+        if len(self.asunto) > 255:
+            raise ValueError("El asunto no puede superar los 255 caracteres.")
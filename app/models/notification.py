@@ -2,16 +2,28 @@ from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Optional
 
+# Los workers reclaman primero las de menor prioridad: los correos
+# transaccionales no esperan detrás de un comunicado masivo
+PRIORIDAD_TRANSACCIONAL = 0
+PRIORIDAD_MASIVA = 1
+
 
 @dataclass
 class Notification:
     """Modelo de dominio para notificaciones por email"""
     user_id: int
-    tipo: str  # 'welcome', 'reservation_confirmation', 'payment_confirmation', 'cancellation'
+    tipo: str  # 'welcome', 'reservation_confirmation', 'payment_confirmation', 'payment_reservation_confirmation', 'cancellation', 'reservation_reminder', 'broadcast'
     asunto: str
-    contenido: str
-    estado: str = "pendiente"  # 'pendiente', 'enviado', 'fallido'
+    contenido: Optional[str]  # HTML ya armado; None si se guarda como plantilla + params
+    estado: str = "pendiente"  # 'pendiente', 'enviando', 'enviado', 'fallido' (reintento programado), 'descartado'
     id: Optional[int] = None
     sent_at: Optional[datetime] = None
     created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     error_message: Optional[str] = None
+    texto_plano: str = ""
+    attempts: int = 0
+    next_attempt_at: Optional[datetime] = None
+    template_id: Optional[str] = None
+    template_version: Optional[int] = None
+    params: Optional[dict] = None
+    prioridad: int = PRIORIDAD_TRANSACCIONAL
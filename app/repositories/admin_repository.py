@@ -1,6 +1,7 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.core.config import Settings
 from app.core.db import get_connection
+from app.core.pagination import Page, fetch_keyset_page
 
 class AdminRepository:
     def __init__(self, settings: Settings):
@@ -17,4 +18,25 @@ class AdminRepository:
             """)
             rows = cur.fetchall()
         conn.close()
-        return [dict(row) for row in rows]
\ No newline at end of file
+        return [dict(row) for row in rows]
+
+    def get_users_page(self, limit: int = 20, after: Optional[str] = None, before: Optional[str] = None) -> Page:
+        conn = get_connection(self.settings)
+        with conn.cursor() as cur:
+            page = fetch_keyset_page(
+                cur,
+                """
+                SELECT u.id, u.nombre, u.email, r.nombre_rol as rol, u.estado
+                FROM users u
+                JOIN roles r ON u.rol_id = r.id
+                """,
+                sort_columns=("u.id",),
+                sort_types=(int,),
+                row_keys=("id",),
+                limit=limit,
+                after=after,
+                before=before,
+                descending=False,
+            )
+        conn.close()
+        return page
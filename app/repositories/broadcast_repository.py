@@ -0,0 +1,115 @@
+"""Repository for admin broadcasts and their recipients"""
+from typing import Iterator, List, Optional, Sequence
+
+from app.core.config import Settings
+from app.core.db import get_connection, iter_server_side
+from app.models.broadcast import Broadcast
+from app.models.notification import Notification
+from app.repositories.notification_repository import insert_notifications
+
+BROADCAST_COLUMNS = "id, asunto, mensaje, created_by, estado, total, encoladas, last_user_id, created_at, finished_at"
+
+
+class BroadcastRepository:
+    def __init__(self, settings: Settings):
+        self.settings = settings
+
+    def create(self, broadcast: Broadcast) -> Broadcast:
+        """Insert the broadcast; `total` is the number of active users at this moment"""
+        conn = get_connection(self.settings)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO broadcasts (asunto, mensaje, created_by, total)
+                    SELECT %s, %s, %s, COUNT(*) FROM users WHERE estado = 'activo'
+                    RETURNING id, total, created_at
+                    """,
+                    (broadcast.asunto, broadcast.mensaje, broadcast.created_by),
+                )
+                row = cur.fetchone()
+            broadcast.id, broadcast.total, broadcast.created_at = row["id"], row["total"], row["created_at"]
+            return broadcast
+        finally:
+            conn.close()
+
+    def find_by_id(self, broadcast_id: int) -> Optional[Broadcast]:
+        conn = get_connection(self.settings)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE id = %s", (broadcast_id,))
+                row = cur.fetchone()
+            return Broadcast(**row) if row else None
+        finally:
+            conn.close()
+
+    def find_recent(self, limit: int = 20) -> List[Broadcast]:
+        conn = get_connection(self.settings)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {BROADCAST_COLUMNS} FROM broadcasts ORDER BY id DESC LIMIT %s", (limit,))
+                return [Broadcast(**row) for row in cur.fetchall()]
+        finally:
+            conn.close()
+
+    def find_unfinished(self) -> List[Broadcast]:
+        conn = get_connection(self.settings)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE estado = 'en_curso' ORDER BY id")
+                return [Broadcast(**row) for row in cur.fetchall()]
+        finally:
+            conn.close()
+
+    def iter_recipients(self, after_user_id: int, itersize: int = 2000) -> Iterator[dict]:
+        """Active users with id > after_user_id, in id order, streamed from a server-side cursor"""
+        return iter_server_side(
+            self.settings,
+            "SELECT id, nombre FROM users WHERE estado = 'activo' AND id > %s ORDER BY id",
+            (after_user_id,),
+            itersize=itersize,
+            as_dict=True,
+        )
+
+    def enqueue_batch(
+        self, broadcast_id: int, notifications: Sequence[Notification], expected_last_user_id: int, last_user_id: int
+    ) -> bool:
+        """Insert one batch of notifications and move the checkpoint, in one transaction.
+
+        The checkpoint only moves if it is still `expected_last_user_id`; if
+        another runner already advanced it, nothing is inserted and False is
+        returned, so resuming a broadcast never emails anyone twice.
+        """
+        conn = get_connection(self.settings)
+        try:
+            conn.autocommit = False
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE broadcasts SET last_user_id = %s, encoladas = encoladas + %s
+                    WHERE id = %s AND estado = 'en_curso' AND last_user_id = %s
+                    """,
+                    (last_user_id, len(notifications), broadcast_id, expected_last_user_id),
+                )
+                if cur.rowcount == 0:
+                    conn.rollback()
+                    return False
+                insert_notifications(cur, notifications)
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def finish(self, broadcast_id: int) -> None:
+        conn = get_connection(self.settings)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE broadcasts SET estado = 'completado', finished_at = NOW() WHERE id = %s",
+                    (broadcast_id,),
+                )
+        finally:
+            conn.close()
@@ -1,6 +1,8 @@
 from typing import List, Optional
 from app.core.config import Settings
 from app.core.db import get_connection
+from app.core.events import publish_safely
+from app.core.fragment_cache import data_versions
 from app.models.court import Court
 
 class CourtRepository:
@@ -34,6 +36,8 @@ class CourtRepository:
             )
             court.id = cur.fetchone()['id']
         conn.close()
+        data_versions.bump("canchas")
+        publish_safely("canchas", {"accion": "creada", "id": court.id})
         return court
 
     def update(self, court: Court):
@@ -44,9 +48,13 @@ class CourtRepository:
                 (court.nombre, court.deporte, court.precio_hora, court.id)
             )
         conn.close()
+        data_versions.bump("canchas")
+        publish_safely("canchas", {"accion": "actualizada", "id": court.id})
 
     def delete(self, court_id: int):
         conn = get_connection(self.settings)
         with conn.cursor() as cur:
             cur.execute("DELETE FROM canchas WHERE id = %s", (court_id,))
-        conn.close()
\ No newline at end of file
+        conn.close()
+        data_versions.bump("canchas")
+        publish_safely("canchas", {"accion": "eliminada", "id": court_id})
\ No newline at end of file
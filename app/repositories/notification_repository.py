@@ -1,50 +1,74 @@
 """Repository for managing notifications in the database"""
-import psycopg2
-from typing import Optional, List
+import psycopg2.extras
+from typing import NamedTuple, Optional, List, Sequence
 from datetime import datetime
 from app.core.config import Settings
+from app.core.db import get_connection
+from app.core.pagination import Page, fetch_keyset_page
 from app.models.notification import Notification
 
+NOTIFICATION_COLUMNS = (
+    "id, user_id, tipo, asunto, contenido, estado, sent_at, error_message, created_at, attempts, next_attempt_at, "
+    "template_id, template_version, params"
+)
+
+
+class StatusUpdate(NamedTuple):
+    """Outcome of one delivery attempt. `None` attempts keeps the stored count."""
+    id: int
+    estado: str
+    sent_at: Optional[datetime] = None
+    error_message: Optional[str] = None
+    attempts: Optional[int] = None
+    next_attempt_at: Optional[datetime] = None
+
+
+def insert_notifications(cur, notifications: Sequence[Notification]) -> List[Notification]:
+    """Multi-row INSERT on `cur`, so callers can make it part of a larger transaction"""
+    rows = psycopg2.extras.execute_values(
+        cur,
+        """
+        INSERT INTO notifications (
+            user_id, tipo, asunto, contenido, texto_plano, estado, created_at,
+            template_id, template_version, params, prioridad
+        )
+        VALUES %s
+        RETURNING id
+        """,
+        [
+            (
+                n.user_id, n.tipo, n.asunto, n.contenido, n.texto_plano, n.estado, n.created_at,
+                n.template_id, n.template_version,
+                psycopg2.extras.Json(n.params) if n.params is not None else None,
+                n.prioridad,
+            )
+            for n in notifications
+        ],
+        page_size=500,
+        fetch=True,
+    )
+    # RETURNING keeps the order of the VALUES list
+    for notification, row in zip(notifications, rows):
+        notification.id = row["id"]
+    return list(notifications)
+
 
 class NotificationRepository:
     def __init__(self, settings: Settings):
         self.settings = settings
 
-    def _get_connection(self):
-        """Create a new database connection"""
-        return psycopg2.connect(
-            host=self.settings.db_host,
-            port=self.settings.db_port,
-            dbname=self.settings.db_name,
-            user=self.settings.db_user,
-            password=self.settings.db_password,
-        )
-
     def create(self, notification: Notification) -> Notification:
         """Create a new notification record"""
-        conn = self._get_connection()
+        return self.create_many([notification])[0]
+
+    def create_many(self, notifications: Sequence[Notification]) -> List[Notification]:
+        """Insert several notifications with one multi-row INSERT; sets their ids"""
+        if not notifications:
+            return []
+        conn = get_connection(self.settings)
         try:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO notifications (user_id, tipo, asunto, contenido, estado, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    RETURNING id, sent_at
-                    """,
-                    (
-                        notification.user_id,
-                        notification.tipo,
-                        notification.asunto,
-                        notification.contenido,
-                        notification.estado,
-                        notification.created_at,
-                    ),
-                )
-                notification_id, sent_at = cur.fetchone()
-                notification.id = notification_id
-                notification.sent_at = sent_at
-                conn.commit()
-                return notification
+                return insert_notifications(cur, notifications)
         finally:
             conn.close()
 
@@ -56,79 +80,150 @@ class NotificationRepository:
         error_message: Optional[str] = None,
     ) -> None:
         """Update notification status after sending attempt"""
-        conn = self._get_connection()
+        self.update_statuses([StatusUpdate(notification_id, estado, sent_at, error_message)])
+
+    def update_statuses(self, updates: Sequence[StatusUpdate]) -> None:
+        """Record the outcome of a whole delivery batch with one UPDATE ... FROM (VALUES ...)"""
+        if not updates:
+            return
+        conn = get_connection(self.settings)
+        try:
+            with conn.cursor() as cur:
+                psycopg2.extras.execute_values(
+                    cur,
+                    """
+                    UPDATE notifications AS n
+                    SET estado = v.estado, sent_at = v.sent_at, error_message = v.error_message,
+                        attempts = COALESCE(v.attempts, n.attempts), next_attempt_at = v.next_attempt_at
+                    FROM (VALUES %s) AS v (id, estado, sent_at, error_message, attempts, next_attempt_at)
+                    WHERE n.id = v.id
+                    """,
+                    [tuple(StatusUpdate(*u)) for u in updates],
+                    template="(%s::integer, %s::varchar, %s::timestamptz, %s::text, %s::integer, %s::timestamptz)",
+                    page_size=500,
+                )
+        finally:
+            conn.close()
+
+    def claim_pending(self, limit: int, lease_seconds: int) -> List[dict]:
+        """Claim up to `limit` queued notifications for delivery.
+
+        Rows are locked with FOR UPDATE SKIP LOCKED, so concurrent workers (on
+        this or other nodes) never claim the same row, and marked 'enviando' in
+        the same statement: the SMTP round trip happens without holding any
+        lock. A claim older than `lease_seconds` is treated as a
+        crashed worker and handed out again. Lower `prioridad` goes first, so
+        transactional mail is not stuck behind a broadcast.
+
+        Returns dicts with the notification fields plus the recipient's email.
+        """
+        conn = get_connection(self.settings)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    WITH batch AS (
+                        SELECT id FROM notifications
+                        WHERE estado = 'pendiente'
+                           OR (estado = 'enviando' AND claimed_at < NOW() - make_interval(secs => %s))
+                        ORDER BY prioridad, id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE notifications n
+                    SET estado = 'enviando', claimed_at = NOW()
+                    FROM batch, users u
+                    WHERE n.id = batch.id AND u.id = n.user_id
+                    RETURNING n.id, n.user_id, n.tipo, n.asunto, n.contenido, n.texto_plano, n.attempts,
+                              n.template_id, n.template_version, n.params, n.prioridad, u.email
+                    """,
+                    (lease_seconds, limit),
+                )
+                rows = cur.fetchall()
+                rows.sort(key=lambda row: (row["prioridad"], row["id"]))
+                return rows
+        finally:
+            conn.close()
+
+    def schedule_due_retries(self, limit: int) -> int:
+        """Move up to `limit` failed notifications whose next_attempt_at has passed back to 'pendiente'.
+
+        Uses the (estado, next_attempt_at) index, oldest due first; SKIP LOCKED
+        lets several schedulers run at once. Returns the number of rows moved.
+        """
+        conn = get_connection(self.settings)
         try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
                     UPDATE notifications
-                    SET estado = %s, sent_at = %s, error_message = %s
-                    WHERE id = %s
+                    SET estado = 'pendiente'
+                    WHERE id IN (
+                        SELECT id FROM notifications
+                        WHERE estado = 'fallido' AND next_attempt_at <= NOW()
+                        ORDER BY next_attempt_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
                     """,
-                    (estado, sent_at, error_message, notification_id),
+                    (limit,),
                 )
-                conn.commit()
+                return cur.rowcount
         finally:
             conn.close()
 
     def get_by_user(self, user_id: int) -> List[Notification]:
         """Get all notifications for a specific user"""
-        conn = self._get_connection()
+        conn = get_connection(self.settings)
         try:
             with conn.cursor() as cur:
                 cur.execute(
-                    """
-                    SELECT id, user_id, tipo, asunto, contenido, estado, sent_at, error_message, created_at
+                    f"""
+                    SELECT {NOTIFICATION_COLUMNS}
                     FROM notifications
                     WHERE user_id = %s
                     ORDER BY created_at DESC
                     """,
                     (user_id,),
                 )
-                rows = cur.fetchall()
-                return [
-                    Notification(
-                        id=row[0],
-                        user_id=row[1],
-                        tipo=row[2],
-                        asunto=row[3],
-                        contenido=row[4],
-                        estado=row[5],
-                        sent_at=row[6],
-                        error_message=row[7],
-                        created_at=row[8],
-                    )
-                    for row in rows
-                ]
+                return [Notification(**row) for row in cur.fetchall()]
+        finally:
+            conn.close()
+
+    def get_page_by_user(
+        self, user_id: int, limit: int = 20, after: Optional[str] = None, before: Optional[str] = None
+    ) -> Page:
+        """Get one page of a user's notifications, newest first (keyset pagination)"""
+        conn = get_connection(self.settings)
+        try:
+            with conn.cursor() as cur:
+                page = fetch_keyset_page(
+                    cur,
+                    f"SELECT {NOTIFICATION_COLUMNS} FROM notifications",
+                    sort_columns=("created_at", "id"),
+                    sort_types=(datetime, int),
+                    row_keys=("created_at", "id"),
+                    limit=limit,
+                    after=after,
+                    before=before,
+                    conditions=("user_id = %s",),
+                    params=(user_id,),
+                )
+                page.items = [Notification(**row) for row in page.items]
+                return page
         finally:
             conn.close()
 
     def get_by_id(self, notification_id: int) -> Optional[Notification]:
         """Get a specific notification by ID"""
-        conn = self._get_connection()
+        conn = get_connection(self.settings)
         try:
             with conn.cursor() as cur:
                 cur.execute(
-                    """
-                    SELECT id, user_id, tipo, asunto, contenido, estado, sent_at, error_message, created_at
-                    FROM notifications
-                    WHERE id = %s
-                    """,
+                    f"SELECT {NOTIFICATION_COLUMNS} FROM notifications WHERE id = %s",
                     (notification_id,),
                 )
                 row = cur.fetchone()
-                if row:
-                    return Notification(
-                        id=row[0],
-                        user_id=row[1],
-                        tipo=row[2],
-                        asunto=row[3],
-                        contenido=row[4],
-                        estado=row[5],
-                        sent_at=row[6],
-                        error_message=row[7],
-                        created_at=row[8],
-                    )
-                return None
+                return Notification(**row) if row else None
         finally:
             conn.close()
@@ -1,9 +1,29 @@
-from typing import Optional, List
+from datetime import datetime
+from typing import Iterator, Optional, List
 from app.core.config import Settings
-from app.core.db import get_connection
+from app.core.db import get_connection, iter_server_side
+from app.core.events import publish_safely
+from app.core.fragment_cache import data_versions
+from app.core.pagination import Page, fetch_keyset_page
 from app.models.payment import Payment, Transaction
 import psycopg2.extras
 
+PAYMENT_EXPORT_COLUMNS = (
+    "id", "reservation_id", "usuario", "email", "amount", "currency", "metodo", "estado", "gateway_ref", "created_at",
+)
+TRANSACTION_EXPORT_COLUMNS = ("id", "payment_id", "reservation_id", "gateway_ref", "status", "details", "created_at")
+
+
+def _date_range(column: str, desde: Optional[datetime], hasta: Optional[datetime]):
+    conditions, params = [], []
+    if desde:
+        conditions.append(f"{column} >= %s")
+        params.append(desde)
+    if hasta:
+        conditions.append(f"{column} < %s")
+        params.append(hasta)
+    return conditions, params
+
 
 class PaymentRepository:
     def __init__(self, settings: Settings):
@@ -30,13 +50,26 @@ class PaymentRepository:
             )
             payment.id = cur.fetchone()["id"]
         conn.close()
+        data_versions.bump("pagos", payment.user_id)
+        publish_safely("pago", {
+            "id": payment.id, "reservation_id": payment.reservation_id, "estado": payment.estado,
+        }, user_id=payment.user_id)
         return payment
 
     def update_payment_status(self, payment_id: int, new_status: str):
         conn = get_connection(self.settings)
         with conn.cursor() as cur:
-            cur.execute("UPDATE payments SET estado = %s WHERE id = %s", (new_status, payment_id))
+            cur.execute(
+                "UPDATE payments SET estado = %s WHERE id = %s RETURNING user_id, reservation_id",
+                (new_status, payment_id),
+            )
+            row = cur.fetchone()
         conn.close()
+        if row:
+            data_versions.bump("pagos", row["user_id"])
+            publish_safely("pago", {
+                "id": payment_id, "reservation_id": row["reservation_id"], "estado": new_status,
+            }, user_id=row["user_id"])
 
     def get_by_id(self, payment_id: int) -> Optional[dict]:
         conn = get_connection(self.settings)
@@ -66,6 +99,34 @@ class PaymentRepository:
         conn.close()
         return [dict(r) for r in rows]
 
+    def find_page_by_user(
+        self, user_id: int, limit: int = 20, after: Optional[str] = None, before: Optional[str] = None
+    ) -> Page:
+        """Página de pagos confirmados/fallidos del usuario, más recientes primero (keyset)."""
+        conn = get_connection(self.settings)
+        with conn.cursor() as cur:
+            page = fetch_keyset_page(
+                cur,
+                """
+                                SELECT p.*, pm.nombre as metodo_nombre,
+                                    (
+                                        SELECT t.gateway_ref FROM transactions t WHERE t.payment_id = p.id ORDER BY t.created_at DESC LIMIT 1
+                                    ) as gateway_ref
+                                FROM payments p
+                                LEFT JOIN payment_methods pm ON p.payment_method_id = pm.id
+                """,
+                sort_columns=("p.created_at", "p.id"),
+                sort_types=(datetime, int),
+                row_keys=("created_at", "id"),
+                limit=limit,
+                after=after,
+                before=before,
+                conditions=("p.user_id = %s", "p.estado IN ('confirmado','fallido')"),
+                params=(user_id,),
+            )
+        conn.close()
+        return page
+
     def find_all_detailed(self) -> List[dict]:
         conn = get_connection(self.settings)
         with conn.cursor() as cur:
@@ -86,6 +147,63 @@ class PaymentRepository:
         conn.close()
         return [dict(r) for r in rows]
 
+    def find_page_detailed(self, limit: int = 50, after: Optional[str] = None, before: Optional[str] = None) -> Page:
+        """Página de pagos confirmados/fallidos para el admin, más recientes primero (keyset)."""
+        conn = get_connection(self.settings)
+        with conn.cursor() as cur:
+            page = fetch_keyset_page(
+                cur,
+                """
+                                SELECT p.*, u.nombre as usuario_nombre, pm.nombre as metodo_nombre,
+                                    (
+                                        SELECT t.gateway_ref FROM transactions t WHERE t.payment_id = p.id ORDER BY t.created_at DESC LIMIT 1
+                                    ) as gateway_ref
+                                FROM payments p
+                                JOIN users u ON p.user_id = u.id
+                                LEFT JOIN payment_methods pm ON p.payment_method_id = pm.id
+                """,
+                sort_columns=("p.created_at", "p.id"),
+                sort_types=(datetime, int),
+                row_keys=("created_at", "id"),
+                limit=limit,
+                after=after,
+                before=before,
+                conditions=("p.estado IN ('confirmado','fallido')",),
+            )
+        conn.close()
+        return page
+
+    def iter_payments_export(self, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> Iterator[tuple]:
+        """Pagos creados en [desde, hasta) en el orden de PAYMENT_EXPORT_COLUMNS, vía cursor del servidor."""
+        conditions, params = _date_range("p.created_at", desde, hasta)
+        query = """
+            SELECT p.id, p.reservation_id, u.nombre, u.email, p.amount, p.currency, pm.nombre, p.estado,
+                (
+                    SELECT t.gateway_ref FROM transactions t WHERE t.payment_id = p.id ORDER BY t.created_at DESC LIMIT 1
+                ),
+                p.created_at
+            FROM payments p
+            JOIN users u ON p.user_id = u.id
+            LEFT JOIN payment_methods pm ON p.payment_method_id = pm.id
+        """
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY p.created_at, p.id"
+        return iter_server_side(self.settings, query, params)
+
+    def iter_transactions_export(self, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> Iterator[tuple]:
+        """Transacciones creadas en [desde, hasta) en el orden de TRANSACTION_EXPORT_COLUMNS, vía cursor del servidor."""
+        conditions, params = _date_range("t.created_at", desde, hasta)
+        query = """
+            SELECT t.id, t.payment_id, p.reservation_id, t.gateway_ref, t.status, t.details, t.created_at
+            FROM transactions t
+            JOIN payments p ON t.payment_id = p.id
+        """
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY t.created_at, t.id"
+        return iter_server_side(self.settings, query, params)
+
     def create_transaction(self, tx: Transaction) -> Transaction:
         conn = get_connection(self.settings)
         with conn.cursor() as cur:
@@ -0,0 +1,114 @@
+"""Repository for reservation reminders (reservas pagadas + reservation_reminders)"""
+from datetime import datetime
+from typing import List, Sequence, Tuple
+
+import psycopg2.extras
+
+from app.core.config import Settings
+from app.core.db import get_connection
+from app.models.notification import Notification
+from app.repositories.notification_repository import insert_notifications
+
+# Pagadas, sin recordatorio, con fecha_inicio en un rango: usa idx_reservas_pagada_inicio
+_PENDING_CONDITIONS = """
+    r.estado = 'pagada' AND rr.reservation_id IS NULL
+    AND r.fecha_inicio > %s AND r.fecha_inicio <= %s
+    AND (r.fecha_inicio, r.id) > (%s, %s)
+"""
+
+
+class ReminderRepository:
+    def __init__(self, settings: Settings):
+        self.settings = settings
+
+    def find_due(
+        self, start: datetime, end: datetime, after: Tuple[datetime, int], limit: int
+    ) -> List[dict]:
+        """Paid reservations starting in (start, end] with no reminder yet, after the keyset `after`"""
+        conn = get_connection(self.settings)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT r.id, r.user_id, r.fecha_inicio, r.fecha_fin,
+                           c.nombre AS cancha, c.deporte, u.nombre, u.email
+                    FROM reservas r
+                    JOIN canchas c ON c.id = r.cancha_id
+                    JOIN users u ON u.id = r.user_id
+                    LEFT JOIN reservation_reminders rr ON rr.reservation_id = r.id
+                    WHERE {_PENDING_CONDITIONS}
+                    ORDER BY r.fecha_inicio, r.id
+                    LIMIT %s
+                    """,
+                    (start, end, after[0], after[1], limit),
+                )
+                return cur.fetchall()
+        finally:
+            conn.close()
+
+    def upcoming_start_times(self, start: datetime, end: datetime, limit: int) -> List[Tuple[int, datetime]]:
+        """(id, fecha_inicio) of paid reservations without reminder starting in (start, end]"""
+        conn = get_connection(self.settings)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT r.id, r.fecha_inicio
+                    FROM reservas r
+                    LEFT JOIN reservation_reminders rr ON rr.reservation_id = r.id
+                    WHERE {_PENDING_CONDITIONS}
+                    ORDER BY r.fecha_inicio, r.id
+                    LIMIT %s
+                    """,
+                    (start, end, start, 0, limit),
+                )
+                return [(row["id"], row["fecha_inicio"]) for row in cur.fetchall()]
+        finally:
+            conn.close()
+
+    def record(self, reminders: Sequence[Tuple[int, Notification]]) -> List[Notification]:
+        """Claim reservations and queue their reminder notifications in one transaction.
+
+        The claim (INSERT ... ON CONFLICT DO NOTHING on the reservation id),
+        the notifications insert and the notification_id link commit or roll
+        back together, so a crash can't leave a reservation marked as reminded
+        without its email queued. If two schedulers race, each reservation is
+        claimed by only one of them. Returns the notifications this call queued.
+        """
+        if not reminders:
+            return []
+        conn = get_connection(self.settings)
+        try:
+            conn.autocommit = False
+            with conn.cursor() as cur:
+                rows = psycopg2.extras.execute_values(
+                    cur,
+                    """
+                    INSERT INTO reservation_reminders (reservation_id) VALUES %s
+                    ON CONFLICT (reservation_id) DO NOTHING
+                    RETURNING reservation_id
+                    """,
+                    [(reservation_id,) for reservation_id, _ in reminders],
+                    fetch=True,
+                )
+                claimed = {row["reservation_id"] for row in rows}
+                queued = [(rid, notification) for rid, notification in reminders if rid in claimed]
+                if queued:
+                    insert_notifications(cur, [notification for _, notification in queued])
+                    psycopg2.extras.execute_values(
+                        cur,
+                        """
+                        UPDATE reservation_reminders AS rr SET notification_id = v.notification_id
+                        FROM (VALUES %s) AS v (reservation_id, notification_id)
+                        WHERE rr.reservation_id = v.reservation_id
+                        """,
+                        [(rid, notification.id) for rid, notification in queued],
+                        template="(%s::integer, %s::integer)",
+                    )
+            conn.commit()
+            return [notification for _, notification in queued]
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
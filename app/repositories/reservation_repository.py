@@ -1,9 +1,14 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Iterator, List, Optional
 from app.core.config import Settings
-from app.core.db import get_connection
+from app.core.db import get_connection, iter_server_side
+from app.core.events import publish_safely
+from app.core.fragment_cache import data_versions
+from app.core.pagination import Page, fetch_keyset_page
 from app.models.reservation import Reservation
 
+EXPORT_COLUMNS = ("id", "usuario", "email", "cancha", "fecha_inicio", "fecha_fin", "estado", "created_at")
+
 class ReservationRepository:
     def __init__(self, settings: Settings):
         self.settings = settings
@@ -23,8 +28,23 @@ class ReservationRepository:
             new_id = cur.fetchone()['id']
             reservation.id = new_id
         conn.close()
+        data_versions.bump("reservas", reservation.user_id)
+        self._publish(reservation.id, reservation.user_id, reservation.cancha_id,
+                      reservation.fecha_inicio, reservation.fecha_fin, reservation.estado)
         return reservation
 
+    @staticmethod
+    def _publish(reservation_id, user_id, cancha_id, fecha_inicio, fecha_fin, estado):
+        """Avisa por SSE al dueño (y admins) y a todos del cambio de disponibilidad."""
+        publish_safely("reserva", {
+            "id": reservation_id, "cancha_id": cancha_id, "fecha_inicio": fecha_inicio,
+            "fecha_fin": fecha_fin, "estado": estado,
+        }, user_id=user_id)
+        publish_safely("disponibilidad", {
+            "cancha_id": cancha_id, "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin,
+            "ocupado": estado != "cancelada",
+        })
+
     def find_by_id(self, reservation_id: int) -> Optional[Reservation]:
         conn = get_connection(self.settings)
         with conn.cursor() as cur:
@@ -55,8 +75,15 @@ class ReservationRepository:
     def update_status(self, reservation_id: int, new_status: str):
         conn = get_connection(self.settings)
         with conn.cursor() as cur:
-            cur.execute("UPDATE reservas SET estado = %s WHERE id = %s", (new_status, reservation_id))
+            cur.execute(
+                "UPDATE reservas SET estado = %s WHERE id = %s RETURNING user_id, cancha_id, fecha_inicio, fecha_fin",
+                (new_status, reservation_id),
+            )
+            row = cur.fetchone()
         conn.close()
+        if row:
+            data_versions.bump("reservas", row['user_id'])
+            self._publish(reservation_id, row['user_id'], row['cancha_id'], row['fecha_inicio'], row['fecha_fin'], new_status)
 
     def find_overlapping(self, cancha_id: int, start: datetime, end: datetime) -> List[Reservation]:
         """Busca reservas activas que se solapen con el horario dado."""
@@ -96,6 +123,31 @@ class ReservationRepository:
         conn.close()
         return [dict(row) for row in rows]
 
+    def find_page_by_user(
+        self, user_id: int, limit: int = 10, after: Optional[str] = None, before: Optional[str] = None
+    ) -> Page:
+        """Página de reservas del usuario, de la más reciente a la más antigua (keyset)."""
+        conn = get_connection(self.settings)
+        with conn.cursor() as cur:
+            page = fetch_keyset_page(
+                cur,
+                """
+                SELECT r.id, c.nombre as cancha, r.fecha_inicio, r.fecha_fin, r.estado
+                FROM reservas r
+                JOIN canchas c ON r.cancha_id = c.id
+                """,
+                sort_columns=("r.fecha_inicio", "r.id"),
+                sort_types=(datetime, int),
+                row_keys=("fecha_inicio", "id"),
+                limit=limit,
+                after=after,
+                before=before,
+                conditions=("r.user_id = %s",),
+                params=(user_id,),
+            )
+        conn.close()
+        return page
+
     def find_all_detailed(self) -> List[dict]:
         """Devuelve todas las reservas con nombres de usuario y cancha para el admin."""
         conn = get_connection(self.settings)
@@ -110,4 +162,61 @@ class ReservationRepository:
             cur.execute(query)
             rows = cur.fetchall()
         conn.close()
-        return [dict(row) for row in rows]
\ No newline at end of file
+        return [dict(row) for row in rows]
+
+    def iter_export(self, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> Iterator[tuple]:
+        """Reservas con inicio en [desde, hasta) como tuplas en el orden de EXPORT_COLUMNS, sin cargarlas en memoria."""
+        conditions, params = [], []
+        if desde:
+            conditions.append("r.fecha_inicio >= %s")
+            params.append(desde)
+        if hasta:
+            conditions.append("r.fecha_inicio < %s")
+            params.append(hasta)
+        query = """
+            SELECT r.id, u.nombre, u.email, c.nombre, r.fecha_inicio, r.fecha_fin, r.estado, r.created_at
+            FROM reservas r
+            JOIN users u ON r.user_id = u.id
+            JOIN canchas c ON r.cancha_id = c.id
+        """
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY r.fecha_inicio, r.id"
+        return iter_server_side(self.settings, query, params)
+
+    def iter_detailed(self) -> Iterator[dict]:
+        """Como find_all_detailed, pero fila a fila desde un cursor del servidor."""
+        return iter_server_side(
+            self.settings,
+            """
+            SELECT r.id, u.nombre as usuario, c.nombre as cancha, r.fecha_inicio, r.fecha_fin, r.estado
+            FROM reservas r
+            JOIN users u ON r.user_id = u.id
+            JOIN canchas c ON r.cancha_id = c.id
+            ORDER BY r.fecha_inicio DESC, r.id DESC
+            """,
+            itersize=500,
+            as_dict=True,
+        )
+
+    def find_page_detailed(self, limit: int = 20, after: Optional[str] = None, before: Optional[str] = None) -> Page:
+        """Página de reservas para el admin, de la más reciente a la más antigua (keyset)."""
+        conn = get_connection(self.settings)
+        with conn.cursor() as cur:
+            page = fetch_keyset_page(
+                cur,
+                """
+                SELECT r.id, u.nombre as usuario, c.nombre as cancha, r.fecha_inicio, r.fecha_fin, r.estado
+                FROM reservas r
+                JOIN users u ON r.user_id = u.id
+                JOIN canchas c ON r.cancha_id = c.id
+                """,
+                sort_columns=("r.fecha_inicio", "r.id"),
+                sort_types=(datetime, int),
+                row_keys=("fecha_inicio", "id"),
+                limit=limit,
+                after=after,
+                before=before,
+            )
+        conn.close()
+        return page
@@ -2,6 +2,7 @@ from typing import Optional
 
 from app.core.db import get_connection
 from app.core.config import Settings
+from app.core.fragment_cache import data_versions
 from app.models.user import User
 
 
@@ -24,6 +25,7 @@ class UserRepository:
                 row = cur.fetchone()
                 user.id = row["id"]
                 user.created_at = row["created_at"]
+        data_versions.bump("usuarios", user.id)
         return user
 
     def find_by_email(self, email: str) -> Optional[User]:
@@ -86,3 +88,4 @@ class UserRepository:
                         user.id,
                     ),
                 )
+        data_versions.bump("usuarios", user.id)
@@ -1,22 +1,43 @@
+import csv
 import http.cookies
+import io
+import itertools
+import json
+import math
 import os
 import sys
-from datetime import datetime
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler
 from string import Template
-from urllib.parse import parse_qs, urlparse
+from urllib.parse import parse_qs, urlencode, urlparse
 
+from app.api import API_PREFIX, JsonApiMixin
+from app.core.assets import DIST_PREFIX, IMMUTABLE_CACHE_CONTROL, AssetPipeline
+from app.core.admission import AdmissionControlledHTTPServer, DeadlineRequestHandlerMixin, in_stream_lane
 from app.core.config import Settings
+from app.core.events import event_bus
+from app.core.fragment_cache import data_versions, fragment_cache, make_etag
+from app.core.metrics import metrics
+from app.core.pagination import Page
+from app.core.prerender import PrerenderedPages, accepts_gzip
+from app.core.rate_limit import get_rate_limiter
+from app.core.template_engine import Markup, TemplateEnvironment
+from app.core.security import HashPolicy
+from app.core.password_hasher import get_password_hasher, shutdown_password_hasher
 from app.repositories.session_repository import SessionRepository
 from app.repositories.user_repository import UserRepository
 from app.repositories.court_repository import CourtRepository
-from app.repositories.reservation_repository import ReservationRepository
+from app.repositories.reservation_repository import EXPORT_COLUMNS as RESERVATION_EXPORT_COLUMNS, ReservationRepository
+from app.repositories.payment_repository import PAYMENT_EXPORT_COLUMNS, TRANSACTION_EXPORT_COLUMNS
 from app.repositories.admin_repository import AdminRepository
 from app.models.court import Court
 from app.services.auth_service import AuthService
 from app.services.reservation_service import ReservationService
 from app.services.payment_service import PaymentService
 from app.services.notification_service import NotificationService
+from app.services.broadcast_service import BroadcastService
+from app.services.notification_worker import start_inline_workers, stop_inline_workers
 
 # Forzar salida sin buffer para ver los logs
 sys.stdout.reconfigure(line_buffering=True)
@@ -28,14 +49,39 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, "web", "templates")
 STATIC_DIR = os.path.join(BASE_DIR, "web", "static")
 IMG_DIR = os.path.join(BASE_DIR, "web", "img")
 
+# Filas por página en los listados del admin
+ADMIN_PAGE_SIZE = 20
+ADMIN_PAYMENTS_PAGE_SIZE = 50
+ADMIN_PAYMENTS_PREVIEW = 5
+# Filas por página en el historial del usuario
+USER_PAGE_SIZE = 10
+USER_PAYMENTS_PAGE_SIZE = 20
+USER_PAYMENTS_PREVIEW = 5
+# Tamaño aproximado de cada chunk enviado en las exportaciones CSV y en las páginas en streaming
+EXPORT_CHUNK_SIZE = 64 * 1024
+HTML_CHUNK_SIZE = 16 * 1024
+# Marca dónde va el contenido dentro de dashboard.html al partir el layout
+CONTENT_MARKER = "\x00content\x00"
+
+
+# CSS/JS de cada página en un bundle con hash en el nombre; las plantillas se reescriben al cargarlas
+assets = AssetPipeline(STATIC_DIR)
+
+# Plantillas con {{ }} / {% %}: se compilan una vez y se reutilizan entre peticiones
+template_env = TemplateEnvironment(TEMPLATES_DIR, preprocess=assets.rewrite)
+
+# Páginas anónimas listas en bytes; run() las carga antes de aceptar conexiones
+ANONYMOUS_PAGES = ("welcome.html", "login.html", "register.html")
+prerendered_pages = PrerenderedPages(TEMPLATES_DIR, preprocess=assets.rewrite)
+
 
 def load_template(name: str) -> Template:
     path = os.path.join(TEMPLATES_DIR, name)
     with open(path, "r", encoding="utf-8") as f:
-        return Template(f.read())
+        return Template(assets.rewrite(f.read()))
 
 
-class SimpleHandler(BaseHTTPRequestHandler):
+class SimpleHandler(JsonApiMixin, DeadlineRequestHandlerMixin, BaseHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
         settings = Settings.from_env()
         user_repo = UserRepository(settings)
@@ -47,14 +93,22 @@ class SimpleHandler(BaseHTTPRequestHandler):
         # Initialize notification service
         notification_service = NotificationService(settings)
         
-        self.auth_service = AuthService(user_repo, session_repo, notification_service)
+        self.auth_service = AuthService(
+            user_repo, session_repo, notification_service,
+            get_password_hasher(settings), HashPolicy.from_settings(settings),
+        )
         self.reservation_service = ReservationService(court_repo, reservation_repo, user_repo, notification_service)
         self.payment_service = PaymentService(settings, user_repo, notification_service)
+        self.broadcast_service = BroadcastService(settings, notification_service)
+        self.rate_limiter = get_rate_limiter(settings)
         self.settings = settings
         super().__init__(*args, **kwargs)
 
     def do_GET(self):
         parsed = urlparse(self.path)
+        if parsed.path.startswith(API_PREFIX + "/"):
+            self.handle_api("GET", parsed)
+            return
         # Webhook endpoint (only accept POST usually, but allow GET for simple health check)
         if parsed.path == "/webhook/stripe":
             # Simple info page
@@ -63,6 +117,15 @@ class SimpleHandler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(b"Stripe webhook endpoint")
             return
+        if parsed.path == "/metrics":
+            self.handle_metrics()
+            return
+        if parsed.path == "/events":
+            self.handle_events()
+            return
+        if parsed.path.startswith("/dashboard/admin/export/"):
+            self.handle_admin_export(parsed)
+            return
         # Admin payments view
         if parsed.path == "/pagos/admin":
             self.handle_payments_admin()
@@ -78,15 +141,13 @@ class SimpleHandler(BaseHTTPRequestHandler):
             self.handle_payments_checkout_success(parsed)
             return
         if parsed.path == "/":
-            self.render_html("welcome.html", {})
+            self.send_prerendered("welcome.html")
         elif parsed.path == "/login":
-            params = parse_qs(parsed.query)
-            msg = params.get("msg", [""])[0]
-            self.render_html("login.html", {"message": msg})
+            msg = parse_qs(parsed.query).get("msg", [""])[0] if parsed.query else ""
+            self.send_prerendered("login.html", msg)
         elif parsed.path == "/register":
-            params = parse_qs(parsed.query)
-            msg = params.get("msg", [""])[0]
-            self.render_html("register.html", {"message": msg})
+            msg = parse_qs(parsed.query).get("msg", [""])[0] if parsed.query else ""
+            self.send_prerendered("register.html", msg)
         elif parsed.path.startswith("/dashboard/admin"):
             self.handle_admin_dashboard(parsed)
         elif parsed.path in ("/dashboard", "/dashboard/usuario"):
@@ -108,6 +169,11 @@ class SimpleHandler(BaseHTTPRequestHandler):
 
     def do_POST(self):
         parsed = urlparse(self.path)
+        if not self.check_rate_limit(parsed.path, "ip", self.client_address[0]):
+            return
+        if parsed.path.startswith(API_PREFIX + "/"):
+            self.handle_api("POST", parsed)
+            return
         # Rutas de pagos
         if parsed.path == "/pagos/create":
             self.handle_payment_create()
@@ -132,6 +198,8 @@ class SimpleHandler(BaseHTTPRequestHandler):
             self.handle_court_update()
         elif parsed.path == "/reservas/cancel":
             self.handle_reservation_cancel()
+        elif parsed.path == "/dashboard/admin/comunicados":
+            self.handle_broadcast_create()
         else:
             self.send_response(404)
             self.end_headers()
@@ -151,7 +219,7 @@ class SimpleHandler(BaseHTTPRequestHandler):
             self.redirect("/login?msg=Registro%20exitoso")
             return
         except ValueError as exc:
-            self.render_html("register.html", {"message": str(exc)})
+            self.send_prerendered("register.html", str(exc))
 
     def handle_login(self):
         length = int(self.headers.get("Content-Length", "0"))
@@ -159,6 +227,11 @@ class SimpleHandler(BaseHTTPRequestHandler):
         data = parse_qs(body)
         email = data.get("email", [""])[0]
         password = data.get("password", [""])[0]
+        # El bucket por cuenta va por (IP, email): quien sólo conoce el email de otro
+        # agota su propio bucket y no puede dejar al dueño de la cuenta sin entrar
+        account_key = f"{self.client_address[0]}|{email.strip().lower()}"
+        if not self.check_rate_limit("/login", "account", account_key):
+            return
         try:
             user, session = self.auth_service.autenticar(email, password)
             
@@ -171,7 +244,7 @@ class SimpleHandler(BaseHTTPRequestHandler):
             self.end_headers()
             return
         except ValueError as exc:
-            self.render_html("login.html", {"message": str(exc)})
+            self.send_prerendered("login.html", str(exc))
 
     def render_booking_form(self, message=""):
         user = self.get_current_user()
@@ -182,10 +255,15 @@ class SimpleHandler(BaseHTTPRequestHandler):
         # Por simplicidad, renderizamos un HTML básico o usamos un template si existe
         # Aquí asumiremos que existe 'booking.html' o reutilizamos dashboard con mensaje
         try:
-            # Listar canchas para el formulario (simplificado)
-            canchas = self.reservation_service.court_repo.find_all()
+            # Listar canchas para el formulario; se rearma sólo si cambió alguna cancha
             # Usamos data-price para que JS lo lea. El texto visible es más limpio.
-            options = "".join([f'<option value="{c.id}" data-price="{c.precio_hora}">{c.nombre} ({c.deporte})</option>' for c in canchas])
+            options = fragment_cache.get_or_render(
+                "cancha_options", None, (data_versions.get("canchas"),),
+                lambda: "".join([
+                    f'<option value="{c.id}" data-price="{c.precio_hora}">{c.nombre} ({c.deporte})</option>'
+                    for c in self.reservation_service.court_repo.find_all()
+                ]),
+            )
             
             # Generar HTML del mensaje si existe
             message_html = ""
@@ -259,14 +337,18 @@ class SimpleHandler(BaseHTTPRequestHandler):
         if not user:
             self.redirect("/login")
             return
-        rows = self.payment_service.payment_repo.find_by_user(user.id)
-        # For user full list, show sequential number + Reserva, Monto, Estado, Fecha
-        rows_html = "".join([
-            f"<tr><td>{i}</td><td>${r['amount']}</td><td>{r['estado']}</td><td>{r['created_at']}</td></tr>"
-            for i, r in enumerate(rows, start=1)
-        ])
-        template = load_template("payments_list_user.html")
-        content_html = template.safe_substitute(rows=rows_html)
+        query = parse_qs(urlparse(self.path).query)
+        pos = self.int_param(query, "pos", 1)
+        page = self.payment_service.payment_repo.find_page_by_user(
+            user.id, USER_PAYMENTS_PAGE_SIZE, query.get("after", [None])[0], query.get("before", [None])[0]
+        )
+        # Número secuencial (pos sigue la posición entre páginas), Monto, Estado, Fecha
+        content_html = template_env.render(
+            "payments_list_user.html",
+            pagos=page.items,
+            pos=pos,
+            pager=self.render_pager("/pagos", query, "", page, pos, USER_PAYMENTS_PAGE_SIZE),
+        )
         self.render_dashboard_layout(user, "Usuario", "", content_html)
 
     def handle_payments_checkout(self):
@@ -316,14 +398,18 @@ class SimpleHandler(BaseHTTPRequestHandler):
         if user.rol_id != 1:
             self.redirect("/dashboard")
             return
-        rows = self.payment_service.payment_repo.find_all_detailed()
-        # enumerate rows and show sequential index, reservation id, usuario, monto, metodo, estado, fecha
-        rows_html = "".join([
-            f"<tr><td>{i}</td><td>{r.get('usuario_nombre','')}</td><td>${r['amount']}</td><td>{(r.get('metodo_nombre') or '')}</td><td>{r['estado']}</td><td>{r['created_at']}</td></tr>"
-            for i, r in enumerate(rows, start=1)
-        ])
-        template = load_template("payments_list.html")
-        content_html = template.safe_substitute(rows=rows_html)
+        query = parse_qs(urlparse(self.path).query)
+        pos = self.int_param(query, "pos", 1)
+        page = self.payment_service.payment_repo.find_page_detailed(
+            ADMIN_PAYMENTS_PAGE_SIZE, query.get("after", [None])[0], query.get("before", [None])[0]
+        )
+        # Número secuencial, usuario, monto, método, estado, fecha
+        content_html = template_env.render(
+            "payments_list.html",
+            pagos=page.items,
+            pos=pos,
+            pager=self.render_pager("/pagos/admin", query, "", page, pos, ADMIN_PAYMENTS_PAGE_SIZE),
+        )
         self.render_dashboard_layout(user, "Administrador", "", content_html)
 
     def handle_payments_checkout_success(self, parsed):
@@ -351,6 +437,8 @@ class SimpleHandler(BaseHTTPRequestHandler):
         if not user:
             self.redirect("/login")
             return
+        if not self.check_rate_limit("/pagos/create", "account", str(user.id)):
+            return
         length = int(self.headers.get("Content-Length", "0"))
         body = self.rfile.read(length).decode()
         data = parse_qs(body)
@@ -372,6 +460,8 @@ class SimpleHandler(BaseHTTPRequestHandler):
         if not user:
             self.redirect("/login")
             return
+        if not self.check_rate_limit("/reservar", "account", str(user.id)):
+            return
         length = int(self.headers.get("Content-Length", "0"))
         body = self.rfile.read(length).decode()
         data = parse_qs(body)
@@ -487,6 +577,25 @@ class SimpleHandler(BaseHTTPRequestHandler):
             target = "/dashboard/admin" if is_admin else "/dashboard/usuario"
             self.redirect(f"{target}?msg=Error:%20{str(e)}")
 
+    def handle_broadcast_create(self):
+        user = self.get_current_user()
+        if not user or user.rol_id != 1:
+            self.send_response(403)
+            self.end_headers()
+            return
+        length = int(self.headers.get("Content-Length", "0"))
+        data = parse_qs(self.rfile.read(length).decode())
+        try:
+            broadcast = self.broadcast_service.create(
+                user, data.get("asunto", [""])[0], data.get("mensaje", [""])[0]
+            )
+        except ValueError as e:
+            self.redirect(f"/dashboard/admin/comunicados?msg=Error:%20{str(e)}")
+            return
+        # Se encola en segundo plano; el avance se ve en esta misma página
+        self.broadcast_service.start(broadcast)
+        self.redirect("/dashboard/admin/comunicados?msg=Comunicado%20en%20curso")
+
     def handle_admin_dashboard(self, parsed):
         user = self.get_current_user()
         if not user:
@@ -522,51 +631,77 @@ class SimpleHandler(BaseHTTPRequestHandler):
             self.render_dashboard_layout(user, "Administrador", msg, content_html)
             return
 
-        # 2. Dashboard Principal (Consolidado: Canchas + Usuarios + Reservas)
-        
-        # Datos Canchas
-        canchas = self.reservation_service.court_repo.find_all()
-        canchas_rows = "".join([
-            f"<tr><td>{c.id}</td><td>{c.nombre}</td><td>{c.deporte}</td><td>${c.precio_hora}</td>"
-            f"<td><a href='/canchas/edit?id={c.id}' class='btn btn-secondary' style='padding:5px 10px; font-size:0.8rem; margin-right:5px; width:auto;'>Editar</a>"
-            f"<form action='/canchas/delete' method='POST' style='display:inline'><input type='hidden' name='id' value='{c.id}'><button type='submit' class='btn btn-danger' style='padding:5px 10px; font-size:0.8rem; width:auto;'>Eliminar</button></form></td></tr>" 
-            for c in canchas
-        ])
-
-        # Datos Usuarios
-        users = self.admin_repo.get_all_users()
-        users_rows = "".join([f"<tr><td>{u['id']}</td><td>{u['nombre']}</td><td>{u['email']}</td><td>{u['rol']}</td></tr>" for u in users])
-
-        # Datos Reservas (mostrar número secuencial 1..N en la columna ID)
-        reservas = self.reservation_service.reservation_repo.find_all_detailed()
-        reservas_rows = ""
-        for idx, r in enumerate(reservas, start=1):
-            # Acción: Ver Detalle (link usa el id real)
-            accion = f"<a href='/dashboard/admin/reservas/detalle?id={r['id']}' class='btn btn-secondary' style='padding:5px 10px; font-size:0.8rem;'>Ver Detalle</a>"
-            reservas_rows += f"<tr><td>{idx}</td><td>{r['usuario']}</td><td>{r['cancha']}</td><td>{r['fecha_inicio']}</td><td>{r['estado']}</td><td>{accion}</td></tr>"
-
-        # Datos Pagos (admin)
+        # 2. Listado completo de reservas: se envía en streaming a medida que sale del cursor
+        if path == "/dashboard/admin/reservas":
+            self.stream_dashboard_layout(user, "Administrador", msg, self.iter_admin_reservas_html())
+            return
+
+        # 3. Comunicados: formulario y avance de los últimos envíos
+        if path == "/dashboard/admin/comunicados":
+            content_html = template_env.render(
+                "admin_comunicados.html", broadcasts=self.broadcast_service.broadcast_repo.find_recent()
+            )
+            self.render_dashboard_layout(user, "Administrador", msg, content_html)
+            return
+
+        # 4. Dashboard Principal (Consolidado: Canchas + Usuarios + Reservas)
+        etag = make_etag(
+            "admin", user.id, user.nombre, user.email, parsed.query, datetime.now().year,
+            data_versions.get("canchas"), data_versions.get("usuarios"),
+            data_versions.get("reservas"), data_versions.get("pagos"),
+        )
+        if self.not_modified("/dashboard/admin", etag):
+            return
+
+        # Datos Usuarios (paginados por id)
+        users_page = self.admin_repo.get_users_page(
+            ADMIN_PAGE_SIZE, query.get("usuarios_after", [None])[0], query.get("usuarios_before", [None])[0]
+        )
+
+        # Datos Reservas (mostrar número secuencial en la columna ID; reservas_pos lleva la posición entre páginas)
+        reservas_pos = self.int_param(query, "reservas_pos", 1)
+        reservas_page = self.reservation_service.reservation_repo.find_page_detailed(
+            ADMIN_PAGE_SIZE, query.get("reservas_after", [None])[0], query.get("reservas_before", [None])[0]
+        )
+
+        # Datos Pagos (admin): sólo las filas más recientes, con LIMIT en SQL
         try:
-            pagos = self.payment_service.payment_repo.find_all_detailed()
+            pagos = self.payment_service.payment_repo.find_page_detailed(limit=ADMIN_PAYMENTS_PREVIEW).items
         except Exception:
             pagos = []
-        # Mostrar sólo las 5 filas más recientes (orden descendente por id)
-        pagos = sorted(pagos, key=lambda x: x.get('id', 0), reverse=True)[:5]
-        pagos_rows = ""
-        for idx, p in enumerate(pagos, start=1):
-            # First column: sequential reservation number (1..N in preview)
-            pagos_rows += f"<tr><td>{idx}</td><td>{p.get('usuario_nombre','')}</td><td>${p['amount']}</td><td>{(p.get('metodo_nombre') or '')}</td><td>{p['estado']}</td><td>{p['created_at']}</td></tr>"
-
-        # Renderizar todo en dashboard_admin.html
-        template = load_template("dashboard_admin.html")
-        content_html = template.safe_substitute(
-            canchas_rows=canchas_rows,
-            users_rows=users_rows,
-            reservas_rows=reservas_rows
+
+        # dashboard_admin.html extiende dashboard.html: la página se arma en una sola pasada
+        html = template_env.render(
+            "dashboard_admin.html",
+            self.layout_context(user, "Administrador", msg),
+            canchas_rows=Markup(fragment_cache.get_or_render(
+                "admin_canchas", None, (data_versions.get("canchas"),),
+                lambda: template_env.render("_canchas_rows.html", canchas=self.reservation_service.court_repo.find_all()),
+            )),
+            usuarios=users_page.items,
+            reservas=reservas_page.items,
+            reservas_pos=reservas_pos,
+            pagos=pagos,
+            usuarios_pager=self.render_pager("/dashboard/admin", query, "usuarios_", users_page, 1, ADMIN_PAGE_SIZE, "#usuarios"),
+            reservas_pager=self.render_pager("/dashboard/admin", query, "reservas_", reservas_page, reservas_pos, ADMIN_PAGE_SIZE, "#reservas"),
         )
-        # Inyectar la sección de pagos (usamos marcador HTML para evitar colisiones con Template)
-        content_html = content_html.replace("<!-- PAGOS_ROWS -->", pagos_rows)
-        self.render_dashboard_layout(user, "Administrador", msg, content_html)
+        self.send_html(html, etag)
+
+    def iter_admin_reservas_html(self):
+        """Fragmentos HTML del listado completo de reservas, fila a fila."""
+        before, after = load_template("admin_reservas.html").template.split("<!-- RESERVAS_ROWS -->", 1)
+        yield before
+        row_template = template_env.get_template("_admin_reserva_row.html")
+        rows = self.reservation_service.reservation_repo.iter_detailed()
+        idx = 0
+        try:
+            for idx, r in enumerate(rows, start=1):
+                yield row_template.render(idx=idx, r=r)
+        finally:
+            rows.close()
+        if idx == 0:
+            yield "<tr><td colspan='6' style='text-align:center; padding:20px;'>No hay reservas registradas.</td></tr>"
+        yield after
 
     def handle_dashboard(self, path: str):
         user = self.get_current_user()
@@ -580,104 +715,164 @@ class SimpleHandler(BaseHTTPRequestHandler):
         role_label = "Administrador" if user.rol_id == 1 else "Usuario"
         
         # Capturar mensaje de query param si existe
-        query = urlparse(self.path).query
-        msg = parse_qs(query).get("msg", [""])[0]
+        query = parse_qs(urlparse(self.path).query)
+        msg = query.get("msg", [""])[0]
         
         # Generar contenido dinámico según el rol
         content_html = ""
+        etag = None
         if path == "/dashboard/usuario": # Vista de Usuario (accesible para admin también)
-            # Tabla de mis reservas
-            mis_reservas = self.reservation_service.reservation_repo.find_by_user(user.id)
-            if not mis_reservas:
-                reservas_rows = "<tr><td colspan='5' style='text-align:center; padding:20px;'>No tienes reservas activas.</td></tr>"
-            else:
-                reservas_rows = ""
-                for r in mis_reservas:
-                    # Definir colores según estado
-                    if r['estado'] == 'confirmada':
-                        estado_color, bg_color = "#2e7d32", "#e8f5e9" # Verde
-                    elif r['estado'] == 'pendiente':
-                        estado_color, bg_color = "#ef6c00", "#fff3e0" # Naranja
-                    else:
-                        estado_color, bg_color = "#d32f2f", "#ffebee" # Rojo
-
-                    accion = ""
-                    if r['estado'] == 'pendiente':
-                        pay_link = f"/pagos/create?reservation_id={r['id']}"
-                        accion = (
-                            f"<div class='actions-inline'>"
-                            f"<a href='{pay_link}' class='btn btn-primary action-btn'>Pagar</a>"
-                            f"<form action='/reservas/cancel' method='POST' style='display:inline'>"
-                            f"<input type='hidden' name='id' value='{r['id']}'><button type='submit' class='btn btn-danger action-btn'>Cancelar</button></form>"
-                            f"</div>"
-                        )
-                    elif r['estado'] == 'confirmada':
-                        accion = (
-                            f"<div class='actions-inline'>"
-                            f"<form action='/reservas/cancel' method='POST' style='display:inline'>"
-                            f"<input type='hidden' name='id' value='{r['id']}'><button type='submit' class='btn btn-danger action-btn'>Cancelar</button></form>"
-                            f"</div>"
-                        )
-                    else:
-                        accion = "<span style='color:#999; font-size:0.9rem;'>-</span>"
-                    
-                    reservas_rows += f"<tr><td>{r['cancha']}</td><td>{r['fecha_inicio']}</td><td>{r['fecha_fin']}</td><td><span class='badge' style='background:{bg_color}; color:{estado_color};'>{r['estado']}</span></td><td>{accion}</td></tr>"
-            
-            # Si es admin viendo como usuario, agregar botón para volver
-            admin_controls = ""
-            if user.rol_id == 1:
-                admin_controls = "<div style='background:#fff3e0; padding:10px; border:1px solid #ffe0b2; border-radius:8px; margin-bottom:20px; text-align:center;'>👀 Estás viendo la vista de Usuario. <a href='/dashboard/admin' style='font-weight:bold;'>Volver al Panel de Admin</a></div>"
+            # Se pide en cada refresco (p. ej. esperando la confirmación de un pago):
+            # si nada de lo que muestra cambió, 304 sin consultar la BD
+            etag = make_etag(
+                "usuario", user.id, user.rol_id, user.nombre, user.email,
+                urlparse(self.path).query, datetime.now().year,
+                data_versions.get("canchas"), data_versions.get("reservas", user.id),
+                data_versions.get("pagos", user.id),
+            )
+            if self.not_modified(path, etag):
+                return
+
+            # Tabla de mis reservas: el HTML de cada página se reutiliza hasta que
+            # cambien las reservas del usuario o las canchas (muestra su nombre)
+            reservas_after = query.get("reservas_after", [None])[0]
+            reservas_before = query.get("reservas_before", [None])[0]
+
+            def render_reservas():
+                page = self.reservation_service.reservation_repo.find_page_by_user(
+                    user.id, USER_PAGE_SIZE, reservas_after, reservas_before
+                )
+                # Sólo los cursores: las filas ya quedan en el HTML
+                return self.user_reservas_rows(page.items), Page(next_cursor=page.next_cursor, prev_cursor=page.prev_cursor)
+
+            reservas_rows, reservas_page = fragment_cache.get_or_render(
+                "mis_reservas",
+                (user.id, reservas_after, reservas_before),
+                (data_versions.get("canchas"), data_versions.get("reservas", user.id)),
+                render_reservas,
+            )
 
-            # Cargar pagos del usuario
+            # Cargar pagos del usuario (fragmento cacheado por versión de sus pagos)
             try:
-                mis_pagos = self.payment_service.payment_repo.find_by_user(user.id)
+                pagos_rows = fragment_cache.get_or_render(
+                    "mis_pagos", user.id, (data_versions.get("pagos", user.id),),
+                    lambda: self.user_pagos_rows(
+                        self.payment_service.payment_repo.find_page_by_user(user.id, USER_PAYMENTS_PREVIEW).items
+                    ),
+                )
             except Exception:
-                mis_pagos = []
-            if not mis_pagos:
-                pagos_rows = "<tr><td colspan='7' style='text-align:center; padding:20px;'>No tiene pagos registrados.</td></tr>"
-            else:
-                # Ordenar y mostrar hasta 5 filas (más recientes primero)
-                mis_pagos = sorted(mis_pagos, key=lambda x: x.get('id', 0), reverse=True)[:5]
-                pagos_rows = ""
-                for i, p in enumerate(mis_pagos, start=1):
-                    # Show sequential number, reservation id, amount, state, date for user preview
-                    pagos_rows += f"<tr><td>{i}</td><td>${p['amount']}</td><td>{p['estado']}</td><td>{p['created_at']}</td></tr>"
-
-            # Cargar plantilla parcial de usuario
-            template_user = load_template("dashboard_user.html")
-            content_html = template_user.safe_substitute(
+                pagos_rows = self.user_pagos_rows([])
+
+            # Los fragmentos cacheados ya salieron escapados de sus plantillas;
+            # si es admin viendo como usuario, la plantilla agrega el botón para volver
+            content_html = template_env.render(
+                "dashboard_user.html",
                 nombre=user.nombre + (" (Admin)" if user.rol_id == 1 else ""),
-                reservas_rows=reservas_rows
+                es_admin=user.rol_id == 1,
+                reservas_rows=reservas_rows,
+                reservas_pager=self.render_pager(
+                    "/dashboard/usuario", query, "reservas_", reservas_page,
+                    self.int_param(query, "reservas_pos", 1), USER_PAGE_SIZE,
+                ),
+                pagos_rows=pagos_rows,
             )
-            # Inyectar la tabla de pagos en el marcador HTML
-            content_html = content_html.replace("<!-- PAGOS_ROWS -->", pagos_rows)
-            content_html = admin_controls + content_html
         
-        self.render_dashboard_layout(user, role_label, msg, content_html)
-
-    def render_dashboard_layout(self, user, role_label, msg, content_html):
-        # Inyectamos el contenido en el mensaje o concatenamos
-        # Como el template usa $message, vamos a poner todo el HTML ahí.
-        # Si hay un mensaje de error/exito (msg), lo ponemos arriba.
-        full_message = ""
-        if msg:
-            msg_class = "message-error" if "Error" in msg else "message-success"
-            full_message += f"<div class='message-box {msg_class}'>{msg}</div>"
-        full_message += content_html
-
-        template = load_template("dashboard.html")
-        html = template.substitute(
-            nombre=user.nombre,
-            email=user.email,
-            rol=role_label,
-            content=full_message,
-            year=datetime.now().year
+        self.render_dashboard_layout(user, role_label, msg, content_html, etag)
+
+    @staticmethod
+    def user_reservas_rows(mis_reservas) -> str:
+        # El color del estado y los botones (Pagar/Cancelar) los decide la plantilla
+        return template_env.render("_user_reservas_rows.html", reservas=mis_reservas)
+
+    @staticmethod
+    def user_pagos_rows(mis_pagos) -> str:
+        return template_env.render("_user_pagos_rows.html", pagos=mis_pagos, pos=1)
+
+    @staticmethod
+    def layout_context(user, role_label, msg) -> dict:
+        """Variables de dashboard.html (el mensaje de error/éxito va arriba del contenido)."""
+        return {
+            "nombre": user.nombre,
+            "email": user.email,
+            "rol": role_label,
+            "msg": msg,
+            "year": datetime.now().year,
+        }
+
+    def dashboard_layout(self, user, role_label, msg):
+        """Devuelve el layout del dashboard partido en (inicio, fin) donde va el contenido."""
+        html = template_env.render(
+            "dashboard.html", self.layout_context(user, role_label, msg), content=Markup(CONTENT_MARKER)
         )
-        
+        head, tail = html.split(CONTENT_MARKER, 1)
+        return head, tail
+
+    def render_dashboard_layout(self, user, role_label, msg, content_html, etag=None):
+        html = template_env.render(
+            "dashboard.html", self.layout_context(user, role_label, msg), content=Markup(content_html)
+        )
+        self.send_html(html, etag)
+
+    def send_html(self, html: str, etag: str = None):
+        body = html.encode("utf-8")
         self.send_response(200)
         self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_cache_validators(etag)
         self.end_headers()
-        self.wfile.write(html.encode("utf-8"))
+        self.wfile.write(body)
+
+    def send_cache_validators(self, etag: str):
+        # private: la página es de un usuario; no-cache: el navegador la guarda pero revalida siempre
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "private, no-cache")
+        self.send_header("Vary", "Cookie")
+
+    def not_modified(self, route: str, etag: str) -> bool:
+        """Responde 304 si el If-None-Match del navegador coincide con `etag` (comparación débil)."""
+        header = self.headers.get("If-None-Match")
+        if not header:
+            return False
+        wanted = etag[2:] if etag.startswith("W/") else etag
+        for tag in header.split(","):
+            tag = tag.strip()
+            if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == wanted:
+                self.send_response(304)
+                self.send_cache_validators(etag)
+                self.end_headers()
+                metrics.inc("http_not_modified_total", route=route)
+                return True
+        return False
+
+    def stream_dashboard_layout(self, user, role_label, msg, parts):
+        """Como render_dashboard_layout, pero envía el contenido a medida que `parts` lo genera.
+
+        El inicio del layout sale antes de tocar la base de datos, así el tiempo
+        hasta el primer byte no depende del tamaño del listado, y en memoria
+        sólo vive el chunk que se está armando.
+        """
+        head, tail = self.dashboard_layout(user, role_label, msg)
+        self.start_stream("text/html; charset=utf-8")
+        self.write_stream(head.encode("utf-8"))
+        buffer, size = [], 0
+        try:
+            for part in parts:
+                buffer.append(part)
+                size += len(part)
+                if size >= HTML_CHUNK_SIZE:
+                    self.write_stream("".join(buffer).encode("utf-8"))
+                    buffer, size = [], 0
+            buffer.append(tail)
+            self.write_stream("".join(buffer).encode("utf-8"))
+            self.end_stream()
+        except (BrokenPipeError, ConnectionResetError):
+            print(f"[STREAM] Cliente desconectado en {self.path}")
+        except Exception as e:
+            # Con las cabeceras ya enviadas sólo queda cortar la respuesta
+            print(f"[STREAM] Error generando {self.path}: {e}")
+        finally:
+            parts.close()
 
     def handle_logout(self):
         token = self.get_session_token()
@@ -692,6 +887,9 @@ class SimpleHandler(BaseHTTPRequestHandler):
         self.end_headers()
 
     def serve_static(self, path: str):
+        if path.startswith(DIST_PREFIX):
+            self.serve_bundle(path[len(DIST_PREFIX):])
+            return
         filename = path.replace("/static/", "", 1)
         file_path = os.path.join(STATIC_DIR, filename)
         if not os.path.exists(file_path):
@@ -703,11 +901,32 @@ class SimpleHandler(BaseHTTPRequestHandler):
         self.send_response(200)
         if file_path.endswith(".css"):
             self.send_header("Content-Type", "text/css")
+        elif file_path.endswith(".js"):
+            self.send_header("Content-Type", "application/javascript")
         else:
             self.send_header("Content-Type", "application/octet-stream")
         self.end_headers()
         self.wfile.write(content)
 
+    def serve_bundle(self, name: str):
+        bundle = assets.get(name)
+        if bundle is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        # El nombre cambia con el contenido: el navegador no necesita revalidar nunca
+        gzipped = accepts_gzip(self.headers.get("Accept-Encoding"))
+        body = bundle.gzip_body if gzipped else bundle.body
+        self.send_response(200)
+        self.send_header("Content-Type", bundle.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Cache-Control", IMMUTABLE_CACHE_CONTROL)
+        self.end_headers()
+        self.wfile.write(body)
+
     def serve_image(self, path: str):
         filename = path.replace("/img/", "", 1)
         file_path = os.path.join(IMG_DIR, filename)
@@ -743,13 +962,238 @@ class SimpleHandler(BaseHTTPRequestHandler):
         print(f"[DEBUG] User from token: {user.email if user else 'None'}")
         return user
 
-    def render_html(self, template_name: str, context: dict):
-        template = load_template(template_name)
-        html = template.substitute(**context)
+    def send_prerendered(self, template_name: str, message: str = ""):
+        headers, body = prerendered_pages.get(template_name).response(
+            message, accepts_gzip(self.headers.get("Accept-Encoding"))
+        )
         self.send_response(200)
-        self.send_header("Content-Type", "text/html; charset=utf-8")
+        for name, value in headers:
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(html.encode("utf-8"))
+        self.wfile.write(body)
+
+    @staticmethod
+    def int_param(query: dict, name: str, default: int) -> int:
+        try:
+            return max(int(query.get(name, [default])[0]), 1)
+        except (TypeError, ValueError):
+            return default
+
+    def render_pager(self, path: str, query: dict, prefix: str, page, pos: int, page_size: int, anchor: str = "") -> str:
+        """Enlaces Anteriores/Siguientes de una página keyset, conservando el resto de parámetros."""
+        if not page.prev_cursor and not page.next_cursor:
+            return ""
+        base = {k: v[0] for k, v in query.items() if not k.startswith(prefix) and k != "msg"}
+        links = []
+        if page.prev_cursor:
+            params = dict(base, **{f"{prefix}before": page.prev_cursor, f"{prefix}pos": max(pos - page_size, 1)})
+            links.append(f"<a href='{path}?{urlencode(params)}{anchor}' class='btn btn-secondary'>&larr; Anteriores</a>")
+        else:
+            links.append("<span></span>")
+        if page.next_cursor:
+            params = dict(base, **{f"{prefix}after": page.next_cursor, f"{prefix}pos": pos + len(page.items)})
+            links.append(f"<a href='{path}?{urlencode(params)}{anchor}' class='btn btn-secondary'>Siguientes &rarr;</a>")
+        return f"<div class='pager' style='display:flex; justify-content:space-between; margin-top:12px;'>{''.join(links)}</div>"
+
+    def check_rate_limit(self, route: str, scope: str, key: str) -> bool:
+        """Responde 429 con Retry-After si el cliente agotó su bucket. Devuelve False en ese caso."""
+        if self.rate_limiter is None:
+            return True
+        retry_after = self.rate_limiter.check(route, scope, key)
+        if not retry_after:
+            return True
+        print(f"[RATE LIMIT] {route} {scope}={key} retry_after={retry_after:.1f}s")
+        body = "Demasiadas solicitudes. Intenta nuevamente más tarde.".encode("utf-8")
+        self.send_response(429)
+        self.send_header("Retry-After", str(math.ceil(retry_after)))
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return False
+
+    def handle_metrics(self):
+        # Sólo desde la propia máquina (scraper local) o para administradores
+        if self.client_address[0] not in ("127.0.0.1", "::1"):
+            user = self.get_current_user()
+            if not user or user.rol_id != 1:
+                self.send_response(403)
+                self.end_headers()
+                return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_events(self):
+        """Server-sent events: cambios de reservas, pagos y disponibilidad mientras la pestaña está abierta.
+
+        Corre en el carril de conexiones largas del servidor (ver admission.py),
+        no en un trabajador. La conexión se cierra a los `sse_max_duration`
+        segundos; el navegador reconecta solo (y así se revalida la sesión).
+        """
+        if isinstance(self.server, AdmissionControlledHTTPServer) and not in_stream_lane():
+            # Llegó tarde al clasificador y está en un trabajador del pool: no retenerlo.
+            # Se responde sólo el `retry:` y se cierra; el navegador reconecta y entra al carril de streams.
+            metrics.inc("sse_rejected_on_worker_total")
+            body = b"retry: 1000\n\n"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(body)
+            self.close_connection = True
+            return
+        user = self.get_current_user()
+        if not user:
+            self.send_response(401)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        sub = event_bus.subscribe(user.id, user.rol_id == 1)
+        deadline = time.monotonic() + self.settings.sse_max_duration
+        try:
+            self.start_stream("text/event-stream; charset=utf-8", {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+            self.write_stream(b"retry: 3000\n\n")
+            # Lo perdido desde la última conexión; lo publicado mientras tanto puede venir repetido en la cola
+            last_id = 0
+            for event in event_bus.replay(sub, self.headers.get("Last-Event-ID")):
+                self.write_stream(event.frame)
+                last_id = event.id
+            while not sub.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                event = sub.get(timeout=min(self.settings.sse_keepalive, remaining))
+                if event is None:
+                    # Comentario SSE: mantiene viva la conexión y detecta clientes que se fueron
+                    self.write_stream(b": ping\n\n")
+                elif event.id > last_id:
+                    self.write_stream(event.frame)
+                    last_id = event.id
+            self.end_stream()
+        except OSError:
+            # El navegador cerró la pestaña o se cortó la red
+            pass
+        finally:
+            event_bus.unsubscribe(sub)
+
+    def handle_admin_export(self, parsed):
+        """Exporta reservas, pagos o transacciones como CSV, fila a fila desde un cursor del servidor."""
+        user = self.get_current_user()
+        if not user:
+            self.redirect("/login")
+            return
+        if user.rol_id != 1:
+            self.redirect("/dashboard")
+            return
+        dataset = parsed.path.rsplit("/", 1)[-1].removesuffix(".csv")
+        payment_repo = self.payment_service.payment_repo
+        exports = {
+            "reservas": (RESERVATION_EXPORT_COLUMNS, self.reservation_service.reservation_repo.iter_export),
+            "pagos": (PAYMENT_EXPORT_COLUMNS, payment_repo.iter_payments_export),
+            "transacciones": (TRANSACTION_EXPORT_COLUMNS, payment_repo.iter_transactions_export),
+        }
+        if dataset not in exports:
+            self.send_response(404)
+            self.end_headers()
+            self.wfile.write(b"Not found")
+            return
+        query = parse_qs(parsed.query)
+        try:
+            desde, hasta = self.parse_date_range(query)
+        except ValueError as e:
+            self.redirect(f"/dashboard/admin?msg=Error:%20{str(e)}#exportar")
+            return
+
+        columns, fetch = exports[dataset]
+        # "hasta" incluye el día completo: el repositorio filtra [desde, hasta)
+        rows = fetch(desde, hasta + timedelta(days=1) if hasta else None)
+        try:
+            # La primera fila abre la conexión: si la BD falla aún podemos responder 500
+            first = next(rows, None)
+        except Exception as e:
+            print(f"[EXPORT] Error exportando {dataset}: {e}")
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(b"Error generando la exportacion")
+            return
+
+        filename = f"{dataset}_{query.get('desde', ['inicio'])[0]}_{query.get('hasta', ['hoy'])[0]}.csv"
+        self.start_stream(
+            "text/csv; charset=utf-8",
+            {"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+        )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        buffer.write("\ufeff")  # BOM para que Excel detecte UTF-8
+        writer.writerow(columns)
+        count = 0
+        try:
+            if first is not None:
+                for row in itertools.chain((first,), rows):
+                    writer.writerow([json.dumps(v) if isinstance(v, (dict, list)) else v for v in row])
+                    count += 1
+                    if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                        self.write_stream(buffer.getvalue().encode("utf-8"))
+                        buffer.seek(0)
+                        buffer.truncate()
+            self.write_stream(buffer.getvalue().encode("utf-8"))
+            self.end_stream()
+        except (BrokenPipeError, ConnectionResetError):
+            print(f"[EXPORT] Cliente desconectado exportando {dataset} tras {count} filas")
+        except Exception as e:
+            # Con las cabeceras ya enviadas sólo queda cortar la respuesta
+            print(f"[EXPORT] Error exportando {dataset} tras {count} filas: {e}")
+        finally:
+            rows.close()
+            metrics.inc("export_rows_total", count, dataset=dataset)
+
+    @staticmethod
+    def parse_date_range(query: dict):
+        """Lee `desde`/`hasta` (AAAA-MM-DD, ambos opcionales e inclusivos)."""
+        try:
+            desde = datetime.strptime(query["desde"][0], "%Y-%m-%d") if query.get("desde", [""])[0] else None
+            hasta = datetime.strptime(query["hasta"][0], "%Y-%m-%d") if query.get("hasta", [""])[0] else None
+        except ValueError:
+            raise ValueError("Fecha inválida, usa el formato AAAA-MM-DD")
+        if desde and hasta and desde > hasta:
+            raise ValueError("La fecha desde no puede ser posterior a hasta")
+        return desde, hasta
+
+    def start_stream(self, content_type: str, headers: dict = None):
+        """Abre una respuesta 200 de largo desconocido.
+
+        A clientes HTTP/1.1 se les envía con Transfer-Encoding: chunked; a los
+        HTTP/1.0 sin Content-Length, marcando el final al cerrar la conexión.
+        """
+        self._chunked = self.request_version == "HTTP/1.1"
+        if self._chunked:
+            self.protocol_version = "HTTP/1.1"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self._chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+    def write_stream(self, data: bytes):
+        if not data:
+            return
+        if self._chunked:
+            self.wfile.write(b"%X\r\n%s\r\n" % (len(data), data))
+        else:
+            self.wfile.write(data)
+
+    def end_stream(self):
+        if self._chunked:
+            self.wfile.write(b"0\r\n\r\n")
 
     def redirect(self, location: str):
         self.send_response(302)
@@ -760,9 +1204,29 @@ class SimpleHandler(BaseHTTPRequestHandler):
 def run():
     settings = Settings.from_env()
     server_address = ("", settings.server_port)
-    httpd = HTTPServer(server_address, SimpleHandler)
+    # Crear el pool de hashing antes de aceptar conexiones
+    get_password_hasher(settings)
+    assets.build_templates(TEMPLATES_DIR)
+    prerendered_pages.load(*ANONYMOUS_PAGES)
+    # Entrega de correos pendientes; con workers dedicados se usa NOTIFICATION_INLINE_WORKERS=0
+    start_inline_workers(settings)
+    SimpleHandler.header_timeout = settings.server_header_timeout
+    SimpleHandler.timeout = settings.server_read_timeout
+    httpd = AdmissionControlledHTTPServer(
+        server_address,
+        SimpleHandler,
+        workers=settings.server_workers,
+        max_queue=settings.server_max_queue,
+        queue_timeout=settings.server_queue_timeout,
+        max_streams=settings.sse_max_connections,
+    )
     print(f"Servidor iniciado en http://localhost:{settings.server_port}")
-    httpd.serve_forever()
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        stop_inline_workers()
+        shutdown_password_hasher()
 
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@ from datetime import datetime, timezone
 from typing import Optional, Tuple
 
 from app.core import security
+from app.core.password_hasher import PasswordHasher
 from app.models.session import Session
 from app.models.user import User
 from app.repositories.session_repository import SessionRepository
@@ -10,10 +11,22 @@ from app.services.notification_service import NotificationService
 
 
 class AuthService:
-    def __init__(self, user_repo: UserRepository, session_repo: SessionRepository, notification_service: Optional[NotificationService] = None):
+    def __init__(self, user_repo: UserRepository, session_repo: SessionRepository, notification_service: Optional[NotificationService] = None, password_hasher: Optional[PasswordHasher] = None, password_policy: Optional[security.HashPolicy] = None):
         self.user_repo = user_repo
         self.session_repo = session_repo
         self.notification_service = notification_service
+        self.password_hasher = password_hasher
+        self.password_policy = password_policy or security.DEFAULT_POLICY
+
+    def _hash_password(self, password: str) -> str:
+        if self.password_hasher:
+            return self.password_hasher.hash(password, self.password_policy)
+        return security.generate_password_hash(password, self.password_policy)
+
+    def _check_password(self, user: User, password: str) -> bool:
+        if self.password_hasher:
+            return self.password_hasher.verify(password, user.password_hash)
+        return user.check_password(password)
 
     def registrar_usuario(self, nombre: str, email: str, password: str, rol_id: int) -> User:
         if not nombre or not email or not password:
@@ -25,8 +38,7 @@ class AuthService:
         existente = self.user_repo.find_by_email(email)
         if existente:
             raise ValueError("El email ya está registrado.")
-        user = User(nombre=nombre, email=email, password_hash="", rol_id=rol_id)
-        user.set_password(password)
+        user = User(nombre=nombre, email=email, password_hash=self._hash_password(password), rol_id=rol_id)
         user.validar_datos()
         created_user = self.user_repo.create(user)
         
@@ -42,10 +54,17 @@ class AuthService:
 
     def autenticar(self, email: str, password: str) -> Tuple[User, Session]:
         user = self.user_repo.find_by_email(email)
-        if not user or not user.check_password(password):
+        if not user or not self._check_password(user, password):
             raise ValueError("Credenciales inválidas.")
         if user.estado != "activo":
             raise ValueError("Usuario inactivo.")
+        # Actualizar hashes con parámetros antiguos aprovechando que tenemos la contraseña en claro
+        if security.needs_rehash(user.password_hash, self.password_policy):
+            try:
+                user.password_hash = self._hash_password(password)
+                self.user_repo.update(user)
+            except Exception as e:
+                print(f"[WARNING] Error rehashing password for user {user.id}: {e}")
         self.session_repo.delete_expired()
         token = security.generate_token()
         expires_at = security.token_expiration(60)
@@ -0,0 +1,89 @@
+"""Admin broadcasts: one email to every active user.
+
+Recipients are streamed from `users` with a server-side cursor and queued in
+batches of `broadcast_batch_size` with one multi-row INSERT each, so memory
+stays constant however many users there are. Delivery is left to the
+notification workers like any other queued email.
+
+Each batch is inserted in the same transaction that moves the broadcast's
+checkpoint (`last_user_id`), so a broadcast interrupted by a restart is
+resumed from the last committed batch without emailing anyone twice:
+
+    python scripts/broadcast.py --resume
+"""
+import logging
+import threading
+from typing import List, Optional
+
+from app.core.config import Settings
+from app.core.metrics import metrics
+from app.models.broadcast import Broadcast
+from app.models.user import User
+from app.repositories.broadcast_repository import BroadcastRepository
+from app.services.notification_service import NotificationService, outbox_wakeup
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastService:
+    def __init__(
+        self,
+        settings: Settings,
+        notification_service: Optional[NotificationService] = None,
+        broadcast_repo: Optional[BroadcastRepository] = None,
+    ):
+        self.settings = settings
+        self.notification_service = notification_service or NotificationService(settings)
+        self.broadcast_repo = broadcast_repo or BroadcastRepository(settings)
+        self.batch_size = settings.broadcast_batch_size
+
+    def create(self, admin: User, asunto: str, mensaje: str) -> Broadcast:
+        """Record a new broadcast (estado 'en_curso'); `run` or `start` queues its emails"""
+        broadcast = Broadcast(asunto=(asunto or "").strip(), mensaje=(mensaje or "").strip(), created_by=admin.id)
+        broadcast.validar_datos()
+        return self.broadcast_repo.create(broadcast)
+
+    def run(self, broadcast: Broadcast) -> Broadcast:
+        """Queue the broadcast for every recipient after its checkpoint, batch by batch"""
+        logger.info(f"Broadcast {broadcast.id}: queueing from user {broadcast.last_user_id}")
+        recipients: List[dict] = []
+        for recipient in self.broadcast_repo.iter_recipients(broadcast.last_user_id, itersize=self.batch_size):
+            recipients.append(recipient)
+            if len(recipients) >= self.batch_size:
+                if not self._flush(broadcast, recipients):
+                    return broadcast
+                recipients = []
+        if recipients and not self._flush(broadcast, recipients):
+            return broadcast
+        self.broadcast_repo.finish(broadcast.id)
+        broadcast.estado = "completado"
+        logger.info(f"Broadcast {broadcast.id}: {broadcast.encoladas} emails queued")
+        return broadcast
+
+    def _flush(self, broadcast: Broadcast, recipients: List[dict]) -> bool:
+        notifications = self.notification_service.build_broadcast(recipients, broadcast.asunto, broadcast.mensaje)
+        last_user_id = recipients[-1]["id"]
+        if not self.broadcast_repo.enqueue_batch(broadcast.id, notifications, broadcast.last_user_id, last_user_id):
+            logger.warning(f"Broadcast {broadcast.id}: checkpoint moved by another runner, stopping")
+            return False
+        broadcast.last_user_id = last_user_id
+        broadcast.encoladas += len(notifications)
+        metrics.inc("broadcast_notifications_enqueued_total", len(notifications))
+        outbox_wakeup.set()
+        return True
+
+    def start(self, broadcast: Broadcast) -> threading.Thread:
+        """Run the broadcast in a background thread so the admin's request returns right away"""
+        thread = threading.Thread(target=self._run_logged, args=(broadcast,), name=f"broadcast-{broadcast.id}", daemon=True)
+        thread.start()
+        return thread
+
+    def _run_logged(self, broadcast: Broadcast) -> None:
+        try:
+            self.run(broadcast)
+        except Exception as e:
+            logger.error(f"Broadcast {broadcast.id} stopped at user {broadcast.last_user_id}: {e}")
+
+    def resume_unfinished(self) -> List[Broadcast]:
+        """Run every broadcast still 'en_curso' (interrupted by a restart) to completion"""
+        return [self.run(broadcast) for broadcast in self.broadcast_repo.find_unfinished()]
@@ -0,0 +1,179 @@
+"""Email templates referenced by notifications.
+
+A notification stores `template_id`, `template_version` and the small set of
+parameters (`params`, JSONB) instead of the rendered HTML; the HTML is built
+when the email is delivered or shown. Bump `version` when a template changes
+in a way that needs different parameters, and keep the old text so rows
+queued before the change still render as they were written: copy the file to
+`<name>.v<old version>.html` and list it in `previous`.
+
+Each template is an HTML file in web/templates/emails (string.Template
+syntax); `fallback` is used when the file is missing.
+"""
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from string import Template
+from typing import Dict, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_DIR = os.path.join(BASE_DIR, "web", "templates", "emails")
+
+
+@dataclass(frozen=True)
+class EmailTemplate:
+    file: str
+    version: int
+    fallback: str
+    # Versiones anteriores aún referenciadas por filas en la cola: versión -> archivo
+    previous: Mapping[int, str] = field(default_factory=dict)
+
+
+EMAIL_TEMPLATES: Dict[str, EmailTemplate] = {
+    "welcome": EmailTemplate("welcome.html", 1, """
+            <h1>¡Bienvenido al Centro Deportivo!</h1>
+            <p>Hola $nombre,</p>
+            <p>Gracias por registrarte en nuestro sistema de reservas.</p>
+            <p>Ya puedes comenzar a hacer tus reservas de canchas deportivas.</p>
+            """),
+    "reservation_confirmation": EmailTemplate("reservation_confirmation.html", 1, """
+            <h1>Reserva Confirmada ✅</h1>
+            <p>Hola $nombre,</p>
+            <p>Tu reserva ha sido confirmada:</p>
+            <ul>
+                <li><strong>Cancha:</strong> $cancha</li>
+                <li><strong>Deporte:</strong> $deporte</li>
+                <li><strong>Inicio:</strong> $fecha_inicio</li>
+                <li><strong>Fin:</strong> $fecha_fin</li>
+                <li><strong>Precio:</strong> $$$precio</li>
+            </ul>
+            <p>¡Te esperamos!</p>
+            """),
+    "payment_confirmation": EmailTemplate("payment_confirmation.html", 1, """
+            <h1>Pago Confirmado 💳</h1>
+            <p>Hola $nombre,</p>
+            <p>Hemos recibido tu pago exitosamente:</p>
+            <ul>
+                <li><strong>Monto:</strong> $$$monto $moneda</li>
+                <li><strong>Fecha:</strong> $fecha</li>
+                <li><strong>Método:</strong> $metodo</li>
+                <li><strong>Cancha:</strong> $cancha</li>
+            </ul>
+            <p>¡Gracias por tu pago!</p>
+            """),
+    "payment_reservation_confirmation": EmailTemplate("payment_reservation_confirmation.html", 1, """
+            <h1>Pago y Reserva Confirmados ✅</h1>
+            <p>Hola $nombre,</p>
+            <p>Recibimos tu pago y tu reserva quedó confirmada:</p>
+            <ul>
+                <li><strong>Cancha:</strong> $cancha</li>
+                <li><strong>Deporte:</strong> $deporte</li>
+                <li><strong>Inicio:</strong> $fecha_inicio</li>
+                <li><strong>Fin:</strong> $fecha_fin</li>
+                <li><strong>Monto:</strong> $$$monto $moneda</li>
+                <li><strong>Método:</strong> $metodo</li>
+            </ul>
+            <p>¡Te esperamos!</p>
+            """),
+    "reservation_reminder": EmailTemplate("reservation_reminder.html", 1, """
+            <h1>Recordatorio de Reserva ⏰</h1>
+            <p>Hola $nombre,</p>
+            <p>Te recordamos que tienes una reserva pronto:</p>
+            <ul>
+                <li><strong>Cancha:</strong> $cancha</li>
+                <li><strong>Deporte:</strong> $deporte</li>
+                <li><strong>Inicio:</strong> $fecha_inicio</li>
+                <li><strong>Fin:</strong> $fecha_fin</li>
+            </ul>
+            <p>¡Te esperamos!</p>
+            """),
+    "broadcast": EmailTemplate("broadcast.html", 1, """
+            <h1>Centro Deportivo</h1>
+            <p>Hola $nombre,</p>
+            <p>$mensaje</p>
+            """),
+    "cancellation": EmailTemplate("cancellation.html", 1, """
+            <h1>Reserva Cancelada</h1>
+            <p>Hola $nombre,</p>
+            <p>Tu reserva ha sido cancelada:</p>
+            <ul>
+                <li><strong>Cancha:</strong> $cancha</li>
+                <li><strong>Fecha:</strong> $fecha_inicio</li>
+            </ul>
+            <p>Si necesitas ayuda, no dudes en contactarnos.</p>
+            """),
+}
+
+_sources: Dict[Tuple[str, int], str] = {}
+_sources_lock = threading.Lock()
+
+
+def _resolve_version(template: EmailTemplate, template_id: str, version: Optional[int]) -> int:
+    if version is None or version == template.version or version in template.previous:
+        return template.version if version is None else version
+    logger.warning(f"{template_id} v{version} is not kept, rendering with current v{template.version}")
+    return template.version
+
+
+def template_source(template_id: str, version: Optional[int] = None) -> str:
+    """Template text for `template_id` at `version` (default: current). Cached per process.
+
+    The current version falls back to the built-in text if its file is missing;
+    a previous version whose file is missing is an error, since rendering it
+    with other text would silently change an email already queued.
+    """
+    template = EMAIL_TEMPLATES[template_id]
+    version = _resolve_version(template, template_id, version)
+    key = (template_id, version)
+    source = _sources.get(key)
+    if source is None:
+        file = template.file if version == template.version else template.previous[version]
+        path = os.path.join(TEMPLATES_DIR, file)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                source = f.read()
+        elif version == template.version:
+            logger.warning(f"Template {file} not found, using built-in fallback")
+            source = template.fallback
+        else:
+            raise FileNotFoundError(f"Template {file} ({template_id} v{version}) not found")
+        with _sources_lock:
+            _sources[key] = source
+    return source
+
+
+def render_email(template_id: str, params: dict, version: Optional[int] = None) -> str:
+    """Render a stored notification with the template version it was queued with"""
+    return Template(template_source(template_id, version)).safe_substitute(params)
+
+
+def extract_params(template_id: str, html: str) -> Optional[dict]:
+    """Recover the parameters used to render `html` with `template_id`, or None if it doesn't match.
+
+    Used to compact rows stored before templates were referenced. The result
+    is only trusted if rendering it gives back exactly the same HTML.
+    """
+    source = template_source(template_id)
+    pattern, names = [], set()
+    pos = 0
+    for m in Template.pattern.finditer(source):
+        pattern.append(re.escape(source[pos:m.start()]))
+        name = m.group("named") or m.group("braced")
+        if m.group("escaped") is not None:
+            pattern.append(re.escape("$"))
+        elif name:
+            pattern.append(f"(?P={name})" if name in names else f"(?P<{name}>.*?)")
+            names.add(name)
+        else:
+            return None
+        pos = m.end()
+    pattern.append(re.escape(source[pos:]))
+    match = re.fullmatch("".join(pattern), html, re.S)
+    if not match:
+        return None
+    params = match.groupdict()
+    return params if render_email(template_id, params) == html else None
@@ -1,48 +1,119 @@
 """Service for sending email notifications using SMTP"""
+import html
 import smtplib
 import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timezone
-from string import Template
-from typing import Optional
-import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional
 
 from app.core.config import Settings
-from app.models.notification import Notification
+from app.core.metrics import metrics
+from app.models.notification import PRIORIDAD_MASIVA, Notification
 from app.models.user import User
 from app.repositories.notification_repository import NotificationRepository
+from app.services.email_templates import EMAIL_TEMPLATES, render_email
+from app.services.smtp_pool import SmtpConnectionPool, get_smtp_pool, is_connection_error
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Base directory for email templates
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-TEMPLATES_DIR = os.path.join(BASE_DIR, "web", "templates", "emails")
+# Set when a notification is queued, so in-process workers deliver it right away
+outbox_wakeup = threading.Event()
+
+# Sent together after a payment; coalesce() turns them into one email
+COALESCED_TYPES = ("payment_confirmation", "reservation_confirmation")
+
+# Upper bounds (seconds) of the per-message send latency histogram
+SEND_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class DeliveryResult(NamedTuple):
+    """Outcome of one send. `permanent` failures (5xx, refused or malformed address) are not retried.
+
+    `throttled` is the time spent waiting for the per-host rate limit before
+    sending, kept out of the latency histogram.
+    """
+    success: bool
+    error: Optional[str] = None
+    permanent: bool = False
+    throttled: float = 0.0
+
+
+def is_permanent_failure(error: BaseException) -> bool:
+    """5xx replies and recipient refusals won't succeed on retry; 4xx and dropped connections might."""
+    if is_connection_error(error):
+        return False
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+_delivery_executor: Optional[ThreadPoolExecutor] = None
+_delivery_lock = threading.Lock()
+
+
+def get_delivery_executor(settings: Settings) -> ThreadPoolExecutor:
+    """Process-wide thread pool used by deliver_many (NOTIFICATION_CONCURRENCY threads)."""
+    global _delivery_executor
+    with _delivery_lock:
+        if _delivery_executor is None:
+            _delivery_executor = ThreadPoolExecutor(
+                max_workers=max(settings.notification_concurrency, 1), thread_name_prefix="notification-send"
+            )
+        return _delivery_executor
+
+
+def shutdown_delivery_executor() -> None:
+    global _delivery_executor
+    with _delivery_lock:
+        if _delivery_executor is not None:
+            _delivery_executor.shutdown(wait=True)
+            _delivery_executor = None
+
+
+def observe_send_latency(seconds: float, mode: str) -> None:
+    """Record one send in a Prometheus-style histogram (sum, count and cumulative buckets)."""
+    metrics.inc("notification_send_seconds_sum", seconds, mode=mode)
+    metrics.inc("notification_send_seconds_count", mode=mode)
+    for bound in SEND_LATENCY_BUCKETS:
+        if seconds <= bound:
+            metrics.inc("notification_send_seconds_bucket", le=bound, mode=mode)
+    metrics.inc("notification_send_seconds_bucket", le="+Inf", mode=mode)
 
 
 class NotificationService:
     def __init__(self, settings: Settings):
         self.settings = settings
         self.notification_repo = NotificationRepository(settings)
+        self._smtp_pool: Optional[SmtpConnectionPool] = None
+        # Per-thread buffer used by coalesce()
+        self._coalescing = threading.local()
 
-    def _load_template(self, template_name: str) -> str:
-        """Load email HTML template from file"""
-        template_path = os.path.join(TEMPLATES_DIR, template_name)
-        if not os.path.exists(template_path):
-            logger.warning(f"Template {template_name} not found, using plain text")
-            return ""
-        with open(template_path, "r", encoding="utf-8") as f:
-            return f.read()
+    @property
+    def smtp_pool(self) -> SmtpConnectionPool:
+        if self._smtp_pool is None:
+            self._smtp_pool = get_smtp_pool(self.settings)
+        return self._smtp_pool
 
     def _send_smtp_email(
         self, to_email: str, subject: str, html_content: str, plain_text: str = ""
-    ) -> tuple[bool, Optional[str]]:
+    ) -> DeliveryResult:
         """
         Send email via SMTP (real email delivery)
-        Returns: (success: bool, error_message: Optional[str])
+        Returns: DeliveryResult(success, error_message, permanent, throttled)
         """
+        if not User.email_valida(to_email or ""):
+            error_msg = f"Invalid recipient address: {to_email!r}"
+            logger.error(error_msg)
+            return DeliveryResult(False, error_msg, permanent=True)
+        throttled = self.smtp_pool.wait_turn()
         try:
             # Create message
             msg = MIMEMultipart("alternative")
@@ -58,41 +129,28 @@ class NotificationService:
                 part2 = MIMEText(html_content, "html")
                 msg.attach(part2)
 
-            # Connect to SMTP server
-            logger.info(f"Connecting to SMTP server: {self.settings.smtp_host}:{self.settings.smtp_port}")
-            
-            # Use STARTTLS for Outlook (port 587)
-            with smtplib.SMTP(self.settings.smtp_host, self.settings.smtp_port) as server:
-                server.ehlo()  # Identify ourselves to the SMTP server
-                server.starttls()  # Secure the connection
-                server.ehlo()  # Re-identify ourselves over TLS connection
-                
-                # Login to SMTP server
-                logger.info(f"Logging in as {self.settings.smtp_user}")
-                server.login(self.settings.smtp_user, self.settings.smtp_password)
-                
-                # Send email
-                server.send_message(msg)
-                logger.info(f"Email sent successfully to {to_email}")
-                
-            return True, None
+            # Reuse an authenticated session from the pool (STARTTLS + login only on new sessions)
+            self.smtp_pool.send_message(msg, wait=False)
+            logger.info(f"Email sent successfully to {to_email}")
+
+            return DeliveryResult(True, throttled=throttled)
 
         except smtplib.SMTPAuthenticationError as e:
             error_msg = f"SMTP Authentication failed: {str(e)}"
             logger.error(error_msg)
-            return False, error_msg
+            return DeliveryResult(False, error_msg, is_permanent_failure(e), throttled)
         except smtplib.SMTPException as e:
             error_msg = f"SMTP error: {str(e)}"
             logger.error(error_msg)
-            return False, error_msg
+            return DeliveryResult(False, error_msg, is_permanent_failure(e), throttled)
         except Exception as e:
             error_msg = f"Unexpected error sending email: {str(e)}"
             logger.error(error_msg)
-            return False, error_msg
+            return DeliveryResult(False, error_msg, throttled=throttled)
 
     def _send_simulated_email(
         self, to_email: str, subject: str, html_content: str
-    ) -> tuple[bool, Optional[str]]:
+    ) -> DeliveryResult:
         """
         Simulate email sending (for testing without real SMTP)
         Just logs the email details and returns success
@@ -103,7 +161,7 @@ class NotificationService:
         logger.info(f"Content length: {len(html_content)} characters")
         logger.info(f"--- Email content preview ---")
         logger.info(html_content[:200] + "..." if len(html_content) > 200 else html_content)
-        return True, None
+        return DeliveryResult(True)
 
     def send_email(
         self,
@@ -114,167 +172,254 @@ class NotificationService:
         plain_text: str = "",
     ) -> Notification:
         """
-        Send email and record notification in database
+        Queue an email in the notifications outbox (estado 'pendiente').
+        Delivery happens in a NotificationWorker, off the request path.
         """
-        # Create notification record
         notification = Notification(
             user_id=user.id,
             tipo=tipo,
             asunto=subject,
             contenido=html_content,
             estado="pendiente",
+            texto_plano=plain_text,
         )
-        notification = self.notification_repo.create(notification)
+        return self.enqueue([notification])[0]
 
-        # Send email based on mode
+    def enqueue(self, notifications: List[Notification]) -> List[Notification]:
+        """Queue several notifications with a single multi-row INSERT"""
+        notifications = self.notification_repo.create_many(notifications)
+        if notifications:
+            outbox_wakeup.set()
+        return notifications
+
+    def deliver(
+        self, to_email: str, subject: str, html_content: str, plain_text: str = ""
+    ) -> DeliveryResult:
+        """Send one email using the configured notification mode"""
         if self.settings.notification_mode == "smtp":
-            success, error_msg = self._send_smtp_email(
-                user.email, subject, html_content, plain_text
-            )
-        else:
-            success, error_msg = self._send_simulated_email(
-                user.email, subject, html_content
-            )
+            return self._send_smtp_email(to_email, subject, html_content, plain_text)
+        return self._send_simulated_email(to_email, subject, html_content)
 
-        # Update notification status
-        if success:
-            self.notification_repo.update_status(
-                notification.id, "enviado", datetime.now(timezone.utc)
-            )
-            notification.estado = "enviado"
-            notification.sent_at = datetime.now(timezone.utc)
+    def _timed_deliver(self, item: dict) -> DeliveryResult:
+        start = time.perf_counter()
+        throttled = 0.0
+        try:
+            result = DeliveryResult(*self.deliver(item["email"], item["asunto"], self.render(item), item.get("texto_plano") or ""))
+            throttled = result.throttled
+            return result
+        except Exception as e:
+            # A row that can't be rendered (unknown template, missing old version) won't
+            # render on retry either; failing it alone lets the rest of the batch be recorded
+            error_msg = f"Could not deliver notification {item.get('id')}: {e!r}"
+            logger.error(error_msg)
+            return DeliveryResult(False, error_msg, permanent=True)
+        finally:
+            # The rate-limit wait is already in smtp_throttled_seconds_total; the histogram is the send itself
+            observe_send_latency(time.perf_counter() - start - throttled, self.settings.notification_mode)
+
+    def deliver_many(self, items: List[dict]) -> List[DeliveryResult]:
+        """
+        Deliver claimed outbox rows concurrently (bounded by NOTIFICATION_CONCURRENCY).
+        Per-host rate limiting happens in the SMTP pool. Results keep the order of `items`.
+        """
+        if not items:
+            return []
+        start = time.perf_counter()
+        if len(items) == 1 or self.settings.notification_concurrency <= 1:
+            results = [self._timed_deliver(item) for item in items]
         else:
-            self.notification_repo.update_status(
-                notification.id, "fallido", error_message=error_msg
-            )
-            notification.estado = "fallido"
-            notification.error_message = error_msg
+            results = list(get_delivery_executor(self.settings).map(self._timed_deliver, items))
+        elapsed = time.perf_counter() - start
+        metrics.set_gauge("notification_batch_size", len(items))
+        metrics.set_gauge("notification_batch_seconds", elapsed)
+        if elapsed > 0:
+            metrics.set_gauge("notification_throughput_per_second", len(items) / elapsed)
+        return results
+
+    def _templated(
+        self, user_id: int, tipo: str, subject: str, params: dict, plain_text: str = ""
+    ) -> Notification:
+        """Build a notification that references its template instead of storing the HTML"""
+        return Notification(
+            user_id=user_id,
+            tipo=tipo,
+            asunto=subject,
+            contenido=None,
+            texto_plano=plain_text,
+            template_id=tipo,
+            template_version=EMAIL_TEMPLATES[tipo].version,
+            params={key: str(value) for key, value in params.items()},
+        )
 
-        return notification
+    def render(self, notification) -> str:
+        """HTML of a notification (Notification or claimed row), rendered from its template if needed"""
+        get = notification.get if isinstance(notification, dict) else lambda key: getattr(notification, key)
+        if get("contenido") is not None or not get("template_id"):
+            return get("contenido") or ""
+        return render_email(get("template_id"), get("params") or {}, get("template_version"))
 
     def send_welcome_email(self, user: User) -> Notification:
         """Send welcome email to newly registered user"""
-        template_str = self._load_template("welcome.html")
-        if template_str:
-            html_content = Template(template_str).safe_substitute(
-                nombre=user.nombre,
-                email=user.email,
-            )
-        else:
-            html_content = f"""
-            <h1>¡Bienvenido al Centro Deportivo!</h1>
-            <p>Hola {user.nombre},</p>
-            <p>Gracias por registrarte en nuestro sistema de reservas.</p>
-            <p>Ya puedes comenzar a hacer tus reservas de canchas deportivas.</p>
-            """
-
         plain_text = f"Hola {user.nombre}, bienvenido al Centro Deportivo. Tu cuenta ha sido creada exitosamente."
-
-        return self.send_email(
-            user,
+        return self.enqueue([self._templated(
+            user.id,
             "welcome",
             "¡Bienvenido al Centro Deportivo! 🎾",
-            html_content,
+            {"nombre": user.nombre, "email": user.email},
             plain_text,
+        )])[0]
+
+    def _reservation_confirmation(self, user: User, reservation_data: dict) -> Notification:
+        return self._templated(
+            user.id,
+            "reservation_confirmation",
+            f"Reserva Confirmada - {reservation_data.get('cancha', 'Cancha')}",
+            {
+                "nombre": user.nombre,
+                "cancha": reservation_data.get("cancha", "N/A"),
+                "deporte": reservation_data.get("deporte", "N/A"),
+                "fecha_inicio": reservation_data.get("fecha_inicio", "N/A"),
+                "fecha_fin": reservation_data.get("fecha_fin", "N/A"),
+                "precio": reservation_data.get("precio", "N/A"),
+            },
+        )
+
+    def _payment_confirmation(self, user: User, payment_data: dict) -> Notification:
+        return self._templated(
+            user.id,
+            "payment_confirmation",
+            f"Pago Confirmado - ${payment_data.get('monto', '0')}",
+            {
+                "nombre": user.nombre,
+                "monto": payment_data.get("monto", "N/A"),
+                "moneda": payment_data.get("moneda", "USD"),
+                "fecha": payment_data.get("fecha", "N/A"),
+                "metodo": payment_data.get("metodo", "N/A"),
+                "cancha": payment_data.get("cancha", "N/A"),
+            },
         )
 
+    def _payment_reservation_confirmation(
+        self, user: User, payment_data: dict, reservation_data: dict
+    ) -> Notification:
+        """One email for a paid reservation (payment receipt + booking details)"""
+        return self._templated(
+            user.id,
+            "payment_reservation_confirmation",
+            f"Pago y Reserva Confirmados - {reservation_data.get('cancha', 'Cancha')}",
+            {
+                "nombre": user.nombre,
+                "cancha": reservation_data.get("cancha", "N/A"),
+                "deporte": reservation_data.get("deporte", "N/A"),
+                "fecha_inicio": reservation_data.get("fecha_inicio", "N/A"),
+                "fecha_fin": reservation_data.get("fecha_fin", "N/A"),
+                "precio": reservation_data.get("precio", "N/A"),
+                "monto": payment_data.get("monto", "N/A"),
+                "moneda": payment_data.get("moneda", "USD"),
+                "fecha": payment_data.get("fecha", "N/A"),
+                "metodo": payment_data.get("metodo", "N/A"),
+            },
+        )
+
+    @contextmanager
+    def coalesce(self) -> Iterator[None]:
+        """
+        Hold the notifications sent inside the block and queue them together on exit.
+        A payment confirmation and a reservation confirmation for the same user
+        become a single email, and everything is inserted with one multi-row INSERT.
+        Notifications returned inside the block are saved only when it ends.
+        """
+        if getattr(self._coalescing, "pending", None) is not None:
+            # Nested block: the outer one flushes
+            yield
+            return
+        self._coalescing.pending = []
+        try:
+            yield
+        finally:
+            # Also on error: what was already sent in the block still goes out
+            pending, self._coalescing.pending = self._coalescing.pending, None
+            self.enqueue(self._merge(pending))
+
+    def _merge(self, pending: List[tuple]) -> List[Notification]:
+        merged: List[Notification] = []
+        by_user = {}
+        for user, data, notification in pending:
+            kinds = by_user.setdefault(user.id, {})
+            if notification.tipo in COALESCED_TYPES and notification.tipo not in kinds:
+                kinds[notification.tipo] = (user, data, len(merged))
+            merged.append(notification)
+        drop = set()
+        for kinds in by_user.values():
+            if len(kinds) < len(COALESCED_TYPES):
+                continue
+            user, payment_data, payment_pos = kinds["payment_confirmation"]
+            _, reservation_data, reservation_pos = kinds["reservation_confirmation"]
+            merged[payment_pos] = self._payment_reservation_confirmation(user, payment_data, reservation_data)
+            drop.add(reservation_pos)
+            metrics.inc("notifications_coalesced_total")
+        return [n for i, n in enumerate(merged) if i not in drop]
+
+    def _queue(self, user: User, data: dict, notification: Notification) -> Notification:
+        pending = getattr(self._coalescing, "pending", None)
+        if pending is not None:
+            pending.append((user, data, notification))
+            return notification
+        return self.enqueue([notification])[0]
+
     def send_reservation_confirmation(
         self, user: User, reservation_data: dict
     ) -> Notification:
         """Send reservation confirmation email"""
-        template_str = self._load_template("reservation_confirmation.html")
-        if template_str:
-            html_content = Template(template_str).safe_substitute(
-                nombre=user.nombre,
-                cancha=reservation_data.get("cancha", "N/A"),
-                deporte=reservation_data.get("deporte", "N/A"),
-                fecha_inicio=reservation_data.get("fecha_inicio", "N/A"),
-                fecha_fin=reservation_data.get("fecha_fin", "N/A"),
-                precio=reservation_data.get("precio", "N/A"),
-            )
-        else:
-            html_content = f"""
-            <h1>Reserva Confirmada ✅</h1>
-            <p>Hola {user.nombre},</p>
-            <p>Tu reserva ha sido confirmada:</p>
-            <ul>
-                <li><strong>Cancha:</strong> {reservation_data.get('cancha', 'N/A')}</li>
-                <li><strong>Deporte:</strong> {reservation_data.get('deporte', 'N/A')}</li>
-                <li><strong>Inicio:</strong> {reservation_data.get('fecha_inicio', 'N/A')}</li>
-                <li><strong>Fin:</strong> {reservation_data.get('fecha_fin', 'N/A')}</li>
-                <li><strong>Precio:</strong> ${reservation_data.get('precio', 'N/A')}</li>
-            </ul>
-            <p>¡Te esperamos!</p>
-            """
-
-        return self.send_email(
-            user,
-            "reservation_confirmation",
-            f"Reserva Confirmada - {reservation_data.get('cancha', 'Cancha')}",
-            html_content,
-        )
+        return self._queue(user, reservation_data, self._reservation_confirmation(user, reservation_data))
 
     def send_payment_confirmation(
         self, user: User, payment_data: dict
     ) -> Notification:
         """Send payment confirmation email"""
-        template_str = self._load_template("payment_confirmation.html")
-        if template_str:
-            html_content = Template(template_str).safe_substitute(
-                nombre=user.nombre,
-                monto=payment_data.get("monto", "N/A"),
-                moneda=payment_data.get("moneda", "USD"),
-                fecha=payment_data.get("fecha", "N/A"),
-                metodo=payment_data.get("metodo", "N/A"),
-                cancha=payment_data.get("cancha", "N/A"),
+        return self._queue(user, payment_data, self._payment_confirmation(user, payment_data))
+
+    def build_reservation_reminders(self, reservations: List[dict]) -> List[Notification]:
+        """One reminder per upcoming reservation (rows with nombre joined); the caller inserts them"""
+        return [
+            self._templated(
+                reservation["user_id"],
+                "reservation_reminder",
+                f"Recordatorio de Reserva - {reservation.get('cancha', 'Cancha')}",
+                {
+                    "nombre": reservation.get("nombre", ""),
+                    "cancha": reservation.get("cancha", "N/A"),
+                    "deporte": reservation.get("deporte", "N/A"),
+                    "fecha_inicio": reservation["fecha_inicio"].strftime("%d/%m/%Y %H:%M"),
+                    "fecha_fin": reservation["fecha_fin"].strftime("%d/%m/%Y %H:%M"),
+                },
             )
-        else:
-            html_content = f"""
-            <h1>Pago Confirmado 💳</h1>
-            <p>Hola {user.nombre},</p>
-            <p>Hemos recibido tu pago exitosamente:</p>
-            <ul>
-                <li><strong>Monto:</strong> ${payment_data.get('monto', 'N/A')} {payment_data.get('moneda', 'USD')}</li>
-                <li><strong>Fecha:</strong> {payment_data.get('fecha', 'N/A')}</li>
-                <li><strong>Método:</strong> {payment_data.get('metodo', 'N/A')}</li>
-                <li><strong>Cancha:</strong> {payment_data.get('cancha', 'N/A')}</li>
-            </ul>
-            <p>¡Gracias por tu pago!</p>
-            """
-
-        return self.send_email(
-            user,
-            "payment_confirmation",
-            f"Pago Confirmado - ${payment_data.get('monto', '0')}",
-            html_content,
-        )
+            for reservation in reservations
+        ]
+
+    def build_broadcast(self, recipients: List[dict], subject: str, message: str) -> List[Notification]:
+        """Notifications of an admin broadcast for `recipients` (id, nombre); the caller inserts them"""
+        mensaje = html.escape(message).replace("\n", "<br>")
+        notifications = [
+            self._templated(recipient["id"], "broadcast", subject, {"nombre": recipient["nombre"], "mensaje": mensaje})
+            for recipient in recipients
+        ]
+        for notification in notifications:
+            # Después de cualquier correo transaccional en la bandeja
+            notification.prioridad = PRIORIDAD_MASIVA
+        return notifications
 
     def send_cancellation_notification(
         self, user: User, reservation_data: dict
     ) -> Notification:
         """Send cancellation notification email"""
-        template_str = self._load_template("cancellation.html")
-        if template_str:
-            html_content = Template(template_str).safe_substitute(
-                nombre=user.nombre,
-                cancha=reservation_data.get("cancha", "N/A"),
-                fecha_inicio=reservation_data.get("fecha_inicio", "N/A"),
-            )
-        else:
-            html_content = f"""
-            <h1>Reserva Cancelada</h1>
-            <p>Hola {user.nombre},</p>
-            <p>Tu reserva ha sido cancelada:</p>
-            <ul>
-                <li><strong>Cancha:</strong> {reservation_data.get('cancha', 'N/A')}</li>
-                <li><strong>Fecha:</strong> {reservation_data.get('fecha_inicio', 'N/A')}</li>
-            </ul>
-            <p>Si necesitas ayuda, no dudes en contactarnos.</p>
-            """
-
-        return self.send_email(
-            user,
+        return self.enqueue([self._templated(
+            user.id,
             "cancellation",
             f"Reserva Cancelada - {reservation_data.get('cancha', 'Cancha')}",
-            html_content,
-        )
+            {
+                "nombre": user.nombre,
+                "cancha": reservation_data.get("cancha", "N/A"),
+                "fecha_inicio": reservation_data.get("fecha_inicio", "N/A"),
+            },
+        )])[0]
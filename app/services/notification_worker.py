@@ -0,0 +1,192 @@
+"""Background delivery of queued email notifications.
+
+`NotificationService.send_email` only inserts a 'pendiente' row into the
+notifications table. Workers claim batches of those rows with
+FOR UPDATE SKIP LOCKED and deliver them, so any number of workers, in this
+process or on other nodes, can drain the same outbox without sending an email
+twice.
+
+Run a dedicated worker with:
+
+    python -m app.services.notification_worker
+
+The web server also starts `notification_inline_workers` threads (default 1)
+so a single-node setup keeps delivering without extra processes; set
+NOTIFICATION_INLINE_WORKERS=0 when dedicated workers are running.
+
+A failed send is marked 'fallido' with `next_attempt_at` set by exponential
+backoff with jitter; each worker loop moves due retries back to 'pendiente'.
+After `notification_max_attempts` attempts the row is left as 'descartado'
+(dead letter) for manual review. Permanent failures (5xx replies, refused or
+malformed recipients) go to 'descartado' right away.
+
+Both the inline threads and the dedicated worker also run a ReminderScheduler
+(app/services/reminder_scheduler.py) unless REMINDER_SCHEDULER_ENABLED=false.
+"""
+import logging
+import random
+import signal
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+from app.core.config import Settings
+from app.core.metrics import metrics
+from app.repositories.notification_repository import NotificationRepository, StatusUpdate
+from app.services.notification_service import NotificationService, outbox_wakeup, shutdown_delivery_executor
+from app.services.reminder_scheduler import ReminderScheduler
+from app.services.smtp_pool import close_smtp_pool
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts: int, base: float, cap: float, rand: Callable[[], float] = random.random) -> float:
+    """Seconds before retry number `attempts` (1 = first retry).
+
+    Exponential backoff capped at `cap`, with "equal jitter": half the delay is
+    fixed and half random, so messages that failed together during an SMTP
+    outage do not all come back at the same instant.
+    """
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay / 2 + rand() * delay / 2
+
+
+class NotificationWorker:
+    def __init__(
+        self,
+        settings: Settings,
+        notification_service: Optional[NotificationService] = None,
+        notification_repo: Optional[NotificationRepository] = None,
+    ):
+        self.settings = settings
+        self.notification_service = notification_service or NotificationService(settings)
+        self.notification_repo = notification_repo or self.notification_service.notification_repo
+        self.batch_size = settings.notification_batch_size
+        self.poll_interval = settings.notification_poll_interval
+        self.lease_seconds = settings.notification_lease_seconds
+        self.max_attempts = settings.notification_max_attempts
+        self.retry_base = settings.notification_retry_base
+        self.retry_max = settings.notification_retry_max
+
+    def schedule_retries(self) -> int:
+        """Requeue failed notifications whose backoff has expired. Returns how many were requeued."""
+        requeued = self.notification_repo.schedule_due_retries(self.batch_size * 10)
+        if requeued:
+            metrics.inc("notification_retries_scheduled_total", requeued)
+        return requeued
+
+    def run_once(self) -> int:
+        """Claim one batch and deliver it. Returns the number of notifications processed."""
+        batch = self.notification_repo.claim_pending(self.batch_size, self.lease_seconds)
+        results = self.notification_service.deliver_many(batch)
+        # One UPDATE for the whole batch instead of one connection per message
+        now = datetime.now(timezone.utc)
+        updates = []
+        for item, (success, error_msg, permanent, _) in zip(batch, results):
+            attempts = (item.get("attempts") or 0) + 1
+            if success:
+                update = StatusUpdate(item["id"], "enviado", now, None, attempts)
+            elif permanent or attempts >= self.max_attempts:
+                # Un 5xx o una dirección rechazada no mejora reintentando
+                update = StatusUpdate(item["id"], "descartado", None, error_msg, attempts)
+            else:
+                delay = retry_delay(attempts, self.retry_base, self.retry_max)
+                update = StatusUpdate(item["id"], "fallido", None, error_msg, attempts, now + timedelta(seconds=delay))
+            updates.append(update)
+            metrics.inc("notifications_delivered_total", estado=update.estado)
+        self.notification_repo.update_statuses(updates)
+        return len(batch)
+
+    def drain(self) -> int:
+        """Deliver until the outbox is empty. Returns the number of notifications processed."""
+        total = 0
+        while True:
+            processed = self.run_once()
+            total += processed
+            if processed == 0:
+                return total
+
+    def run_forever(self, stop: threading.Event) -> None:
+        """Poll the outbox until `stop` is set.
+
+        A full batch means there is probably more work, so the next claim
+        happens right away; otherwise the worker sleeps for `poll_interval` or
+        until `send_email` signals a new notification in this process.
+        """
+        while not stop.is_set():
+            try:
+                self.schedule_retries()
+                processed = self.run_once()
+            except Exception as e:
+                logger.error(f"Notification worker failed to process a batch: {e}")
+                processed = 0
+            if processed < self.batch_size:
+                outbox_wakeup.wait(self.poll_interval)
+                outbox_wakeup.clear()
+
+
+_inline_stop = threading.Event()
+_inline_threads: List[threading.Thread] = []
+
+
+def start_inline_workers(settings: Settings) -> None:
+    """Start the in-process worker threads used by the web server."""
+    _inline_stop.clear()
+    for i in range(settings.notification_inline_workers):
+        worker = NotificationWorker(settings)
+        thread = threading.Thread(
+            target=worker.run_forever, args=(_inline_stop,), name=f"notification-worker-{i}", daemon=True
+        )
+        thread.start()
+        _inline_threads.append(thread)
+    if settings.reminder_scheduler_enabled:
+        scheduler = ReminderScheduler(settings)
+        thread = threading.Thread(
+            target=scheduler.run_forever, args=(_inline_stop,), name="reminder-scheduler", daemon=True
+        )
+        thread.start()
+        _inline_threads.append(thread)
+
+
+def stop_inline_workers(timeout: float = 5.0) -> None:
+    _inline_stop.set()
+    outbox_wakeup.set()
+    for thread in _inline_threads:
+        thread.join(timeout)
+    _inline_threads.clear()
+    shutdown_delivery_executor()
+    close_smtp_pool()
+
+
+def main() -> None:
+    settings = Settings.from_env()
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info("Stopping notification worker")
+        stop.set()
+        outbox_wakeup.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    logger.info(
+        f"Notification worker started (batch={settings.notification_batch_size}, "
+        f"poll={settings.notification_poll_interval}s)"
+    )
+    scheduler_thread = None
+    if settings.reminder_scheduler_enabled:
+        scheduler_thread = threading.Thread(
+            target=ReminderScheduler(settings).run_forever, args=(stop,), name="reminder-scheduler", daemon=True
+        )
+        scheduler_thread.start()
+    try:
+        NotificationWorker(settings).run_forever(stop)
+    finally:
+        if scheduler_thread is not None:
+            scheduler_thread.join(5.0)
+        shutdown_delivery_executor()
+        close_smtp_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -109,35 +109,37 @@ class PaymentService:
             if self.notification_service and self.user_repo and user:
                 print("[DEBUG PAYMENT] All services available, sending emails...")
                 try:
-                    method_name = method_obj.get('nombre', 'Tarjeta') if method_obj else 'Tarjeta'
-                    from datetime import datetime
+                    # Pago y reserva se fusionan en un solo correo
+                    with self.notification_service.coalesce():
+                        method_name = method_obj.get('nombre', 'Tarjeta') if method_obj else 'Tarjeta'
+                        from datetime import datetime
                     
-                    # 1. Send payment confirmation
-                    payment_data_email = {
-                        "monto": str(provided_amount),
-                        "moneda": payment_data.get("currency", "USD"),
-                        "fecha": datetime.now().strftime("%d/%m/%Y %H:%M"),
-                        "metodo": method_name,
-                        "cancha": cancha.nombre
-                    }
-                    print(f"[DEBUG PAYMENT] Sending payment email to {user.email}")
-                    self.notification_service.send_payment_confirmation(user, payment_data_email)
-                    print("[DEBUG PAYMENT] Payment email sent successfully!")
-                    
-                    # 2. Send reservation confirmation (now that it's paid)
-                    reserva = self.reservation_repo.find_by_id(reservation_id)
-                    if reserva:
-                        dur_horas = (reserva.fecha_fin - reserva.fecha_inicio).total_seconds() / 3600
-                        reservation_data_email = {
-                            "cancha": cancha.nombre,
-                            "deporte": cancha.deporte,
-                            "fecha_inicio": reserva.fecha_inicio.strftime("%d/%m/%Y %H:%M"),
-                            "fecha_fin": reserva.fecha_fin.strftime("%d/%m/%Y %H:%M"),
-                            "precio": f"{float(cancha.precio_hora) * dur_horas:.2f}"
+                        # 1. Send payment confirmation
+                        payment_data_email = {
+                            "monto": str(provided_amount),
+                            "moneda": payment_data.get("currency", "USD"),
+                            "fecha": datetime.now().strftime("%d/%m/%Y %H:%M"),
+                            "metodo": method_name,
+                            "cancha": cancha.nombre
                         }
-                        print(f"[DEBUG PAYMENT] Sending reservation email to {user.email}")
-                        self.notification_service.send_reservation_confirmation(user, reservation_data_email)
-                        print("[DEBUG PAYMENT] Reservation email sent successfully!")
+                        print(f"[DEBUG PAYMENT] Sending payment email to {user.email}")
+                        self.notification_service.send_payment_confirmation(user, payment_data_email)
+                        print("[DEBUG PAYMENT] Payment email sent successfully!")
+                    
+                        # 2. Send reservation confirmation (now that it's paid)
+                        reserva = self.reservation_repo.find_by_id(reservation_id)
+                        if reserva:
+                            dur_horas = (reserva.fecha_fin - reserva.fecha_inicio).total_seconds() / 3600
+                            reservation_data_email = {
+                                "cancha": cancha.nombre,
+                                "deporte": cancha.deporte,
+                                "fecha_inicio": reserva.fecha_inicio.strftime("%d/%m/%Y %H:%M"),
+                                "fecha_fin": reserva.fecha_fin.strftime("%d/%m/%Y %H:%M"),
+                                "precio": f"{float(cancha.precio_hora) * dur_horas:.2f}"
+                            }
+                            print(f"[DEBUG PAYMENT] Sending reservation email to {user.email}")
+                            self.notification_service.send_reservation_confirmation(user, reservation_data_email)
+                            print("[DEBUG PAYMENT] Reservation email sent successfully!")
                         
                 except Exception as e:
                     print(f"[WARNING] Error sending confirmation emails: {e}")
@@ -275,33 +277,35 @@ class PaymentService:
                 if self.notification_service and self.user_repo:
                     print("[DEBUG STRIPE] Sending emails after Stripe checkout...")
                     try:
-                        user = self.user_repo.find_by_id(user_id)
-                        if user:
-                            from datetime import datetime
+                        # Pago y reserva se fusionan en un solo correo
+                        with self.notification_service.coalesce():
+                            user = self.user_repo.find_by_id(user_id)
+                            if user:
+                                from datetime import datetime
                             
-                            # Email 1: Confirmación de pago
-                            payment_email_data = {
-                                "monto": str(amount),
-                                "moneda": "USD",
-                                "fecha": datetime.now().strftime("%d/%m/%Y %H:%M"),
-                                "metodo": "Tarjeta (Stripe)",
-                                "cancha": cancha.nombre
-                            }
-                            print(f"[DEBUG STRIPE] Sending payment email to {user.email}")
-                            self.notification_service.send_payment_confirmation(user, payment_email_data)
-                            print("[DEBUG STRIPE] Payment email sent!")
+                                # Email 1: Confirmación de pago
+                                payment_email_data = {
+                                    "monto": str(amount),
+                                    "moneda": "USD",
+                                    "fecha": datetime.now().strftime("%d/%m/%Y %H:%M"),
+                                    "metodo": "Tarjeta (Stripe)",
+                                    "cancha": cancha.nombre
+                                }
+                                print(f"[DEBUG STRIPE] Sending payment email to {user.email}")
+                                self.notification_service.send_payment_confirmation(user, payment_email_data)
+                                print("[DEBUG STRIPE] Payment email sent!")
                             
-                            # Email 2: Confirmación de reserva
-                            reserv_email_data = {
-                                "cancha": cancha.nombre,
-                                "deporte": cancha.deporte,
-                                "fecha_inicio": reserva.fecha_inicio.strftime("%d/%m/%Y %H:%M"),
-                                "fecha_fin": reserva.fecha_fin.strftime("%d/%m/%Y %H:%M"),
-                                "precio": f"{amount:.2f}"
-                            }
-                            print(f"[DEBUG STRIPE] Sending reservation email to {user.email}")
-                            self.notification_service.send_reservation_confirmation(user, reserv_email_data)
-                            print("[DEBUG STRIPE] Reservation email sent!")
+                                # Email 2: Confirmación de reserva
+                                reserv_email_data = {
+                                    "cancha": cancha.nombre,
+                                    "deporte": cancha.deporte,
+                                    "fecha_inicio": reserva.fecha_inicio.strftime("%d/%m/%Y %H:%M"),
+                                    "fecha_fin": reserva.fecha_fin.strftime("%d/%m/%Y %H:%M"),
+                                    "precio": f"{amount:.2f}"
+                                }
+                                print(f"[DEBUG STRIPE] Sending reservation email to {user.email}")
+                                self.notification_service.send_reservation_confirmation(user, reserv_email_data)
+                                print("[DEBUG STRIPE] Reservation email sent!")
                     except Exception as e:
                         print(f"[WARNING] Error sending Stripe emails: {e}")
                         import traceback
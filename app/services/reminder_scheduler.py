@@ -0,0 +1,111 @@
+"""Reminder emails sent `reminder_hours_before` hours before a paid reservation starts.
+
+The scheduler keeps a min-heap of upcoming due times (fecha_inicio minus the
+lead time) loaded every `reminder_refresh_interval` seconds, so it sleeps
+until exactly the next reminder is due instead of polling the reservas table.
+When something is due it pages through the reservations starting in
+(now, now + lead] with a keyset range scan over idx_reservas_pagada_inicio,
+and queues the reminders of each page with one INSERT.
+
+Each reminder is recorded in reservation_reminders in the same transaction
+that queues its notification. The table's primary key is the reservation id,
+so a reservation gets one reminder even if several schedulers (inline and
+dedicated workers) run at once, and after a restart nothing already sent is
+sent again.
+"""
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from app.core.config import Settings
+from app.core.metrics import metrics
+from app.repositories.reminder_repository import ReminderRepository
+from app.services.notification_service import NotificationService, outbox_wakeup
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    def __init__(
+        self,
+        settings: Settings,
+        notification_service: Optional[NotificationService] = None,
+        reminder_repo: Optional[ReminderRepository] = None,
+        clock: Callable[[], datetime] = datetime.now,
+        max_heap: int = 10000,
+    ):
+        self.settings = settings
+        self.notification_service = notification_service or NotificationService(settings)
+        self.reminder_repo = reminder_repo or ReminderRepository(settings)
+        # Las reservas guardan hora local sin zona, igual que datetime.now()
+        self.clock = clock
+        self.lead = timedelta(hours=settings.reminder_hours_before)
+        self.batch_size = settings.reminder_batch_size
+        self.refresh_interval = timedelta(seconds=settings.reminder_refresh_interval)
+        self.max_heap = max_heap
+        self._heap: List[Tuple[datetime, int]] = []
+        self._next_refresh: Optional[datetime] = None
+
+    def refresh(self, now: datetime) -> None:
+        """Reload the due times of the reminders that fall before the next refresh"""
+        horizon = now + self.lead + self.refresh_interval
+        upcoming = self.reminder_repo.upcoming_start_times(now, horizon, self.max_heap)
+        self._heap = [(fecha_inicio - self.lead, reservation_id) for reservation_id, fecha_inicio in upcoming]
+        heapq.heapify(self._heap)
+        self._next_refresh = now + self.refresh_interval
+        if len(upcoming) == self.max_heap:
+            # Heap lleno: recargar cuando venza el último cargado
+            self._next_refresh = min(self._next_refresh, upcoming[-1][1] - self.lead)
+        metrics.set_gauge("reminder_heap_size", len(self._heap))
+
+    def next_wakeup(self, now: datetime) -> float:
+        """Seconds until the next reminder is due or the next refresh, whichever comes first"""
+        if self._next_refresh is None:
+            return 0.0
+        wake = self._next_refresh
+        if self._heap:
+            wake = min(wake, self._heap[0][0])
+        return max(0.0, (wake - now).total_seconds())
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """Queue every reminder due at `now`. Returns how many were queued."""
+        now = now or self.clock()
+        end = now + self.lead
+        after = (now, 0)
+        sent = 0
+        while True:
+            rows = self.reminder_repo.find_due(now, end, after, self.batch_size)
+            if not rows:
+                break
+            after = (rows[-1]["fecha_inicio"], rows[-1]["id"])
+            notifications = self.notification_service.build_reservation_reminders(rows)
+            queued = self.reminder_repo.record([(row["id"], n) for row, n in zip(rows, notifications)])
+            if queued:
+                outbox_wakeup.set()
+                sent += len(queued)
+            if len(rows) < self.batch_size:
+                break
+        while self._heap and self._heap[0][0] <= now:
+            heapq.heappop(self._heap)
+        if sent:
+            metrics.inc("reservation_reminders_sent_total", sent)
+        return sent
+
+    def run_forever(self, stop: threading.Event) -> None:
+        """Sleep until the next due reminder (or refresh) until `stop` is set"""
+        logger.info(f"Reminder scheduler started ({self.settings.reminder_hours_before}h before)")
+        while not stop.is_set():
+            now = self.clock()
+            try:
+                if self._next_refresh is None or now >= self._next_refresh:
+                    self.refresh(now)
+                if self._heap and self._heap[0][0] <= now:
+                    self.run_once(now)
+            except Exception as e:
+                logger.error(f"Reminder scheduler failed: {e}")
+                # Reintentar en el próximo refresh en lugar de en un bucle cerrado
+                self._heap = []
+                self._next_refresh = now + self.refresh_interval
+            stop.wait(self.next_wakeup(self.clock()))
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
 from typing import Optional
 from app.models.reservation import Reservation
 from app.repositories.court_repository import CourtRepository
@@ -58,6 +58,35 @@ class ReservationService:
         
         return created_reservation
 
+    def disponibilidad(self, cancha_id: int, dia: date) -> dict:
+        """Bloques ocupados y horas de inicio libres (de una hora) de la cancha en el día."""
+        cancha = self.court_repo.find_by_id(cancha_id)
+        if not cancha:
+            raise ValueError("La cancha seleccionada no existe.")
+
+        # Mismo horario de atención que valida crear_reserva (07:00 - 22:00)
+        inicio_jornada = datetime.combine(dia, time(7))
+        fin_jornada = datetime.combine(dia, time(22))
+        ocupados = sorted(
+            self.reservation_repo.find_overlapping(cancha_id, inicio_jornada, fin_jornada),
+            key=lambda r: r.fecha_inicio,
+        )
+
+        ahora = datetime.now()
+        libres = []
+        hora = inicio_jornada
+        while hora < fin_jornada:
+            siguiente = hora + timedelta(hours=1)
+            if hora >= ahora and not any(r.fecha_inicio < siguiente and r.fecha_fin > hora for r in ocupados):
+                libres.append(hora)
+            hora = siguiente
+
+        return {
+            "cancha": cancha,
+            "ocupados": [(r.fecha_inicio, r.fecha_fin) for r in ocupados],
+            "libres": libres,
+        }
+
     def cancelar_reserva(self, reservation_id: int, user_id: int, is_admin: bool):
         reserva = self.reservation_repo.find_by_id(reservation_id)
         if not reserva:
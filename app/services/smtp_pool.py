@@ -0,0 +1,230 @@
+"""Pool of authenticated SMTP sessions shared by the notification senders.
+
+Opening a session costs a TCP connect plus EHLO, STARTTLS, EHLO and LOGIN,
+several round trips that dominate the time to send one email. The pool keeps
+sessions open and hands them out again:
+
+- a session idle for more than `noop_after` seconds is checked with NOOP
+  before reuse (servers drop idle clients silently);
+- a send that fails because the connection dropped is retried once on a
+  fresh session;
+- a session is closed after `max_messages` messages, since many providers cap
+  messages per connection;
+- with a `rate` policy, every message takes a token from a bucket shared by
+  all threads sending to this host, to stay under the provider's limits.
+
+smtplib has no PIPELINING support, so messages on one session still go one at
+a time; the gain is skipping the handshake for every message after the first.
+"""
+import logging
+import smtplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Iterator, Optional
+
+from app.core.config import Settings
+from app.core.metrics import metrics
+from app.core.rate_limit import RatePolicy, Throttle
+
+logger = logging.getLogger(__name__)
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """True if `error` means the session is unusable, not that one message was refused.
+
+    SMTPException subclasses OSError, so socket errors are told apart explicitly.
+    """
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421: the server is closing the session
+        return error.smtp_code == 421
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class PooledConnection:
+    __slots__ = ("smtp", "messages_sent", "last_used")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+
+class SmtpConnectionPool:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str = "",
+        password: str = "",
+        max_size: int = 4,
+        max_messages: int = 100,
+        noop_after: float = 30.0,
+        timeout: float = 30.0,
+        starttls: bool = True,
+        rate: Optional[RatePolicy] = None,
+        smtp_factory: Callable[..., smtplib.SMTP] = smtplib.SMTP,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.max_size = max_size
+        self.max_messages = max_messages
+        self.noop_after = noop_after
+        self.timeout = timeout
+        self.starttls = starttls
+        self.smtp_factory = smtp_factory
+        self.throttle = Throttle(rate) if rate else None
+        self._idle: Deque[PooledConnection] = deque()
+        self._lock = threading.Lock()
+        # At most max_size sessions open (in use + idle)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._closed = False
+
+    def _connect(self) -> PooledConnection:
+        logger.info(f"Connecting to SMTP server: {self.host}:{self.port}")
+        smtp = self.smtp_factory(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.user:
+                smtp.login(self.user, self.password)
+        except Exception:
+            self._discard(PooledConnection(smtp))
+            raise
+        metrics.inc("smtp_connections_opened_total")
+        return PooledConnection(smtp)
+
+    def _discard(self, conn: PooledConnection) -> None:
+        try:
+            conn.smtp.quit()
+        except Exception:
+            try:
+                conn.smtp.close()
+            except Exception:
+                pass
+
+    def _healthy(self, conn: PooledConnection) -> bool:
+        if time.monotonic() - conn.last_used < self.noop_after:
+            return True
+        try:
+            return conn.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self) -> PooledConnection:
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._connect()
+            if self._healthy(conn):
+                metrics.inc("smtp_connections_reused_total")
+                return conn
+            metrics.inc("smtp_connections_stale_total")
+            self._discard(conn)
+
+    def _release(self, conn: PooledConnection) -> None:
+        conn.last_used = time.monotonic()
+        if self._closed or conn.messages_sent >= self.max_messages:
+            self._discard(conn)
+            return
+        with self._lock:
+            self._idle.append(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """Borrow an authenticated session. It goes back to the pool unless it failed."""
+        self._slots.acquire()
+        try:
+            conn = self._acquire()
+            try:
+                yield conn
+            except BaseException as e:
+                if is_connection_error(e):
+                    self._discard(conn)
+                else:
+                    self._release(conn)
+                raise
+            self._release(conn)
+        finally:
+            self._slots.release()
+
+    def wait_turn(self) -> float:
+        """Block until the per-host rate limit allows one more message. Returns the seconds waited."""
+        if not self.throttle:
+            return 0.0
+        waited = self.throttle.acquire()
+        if waited:
+            metrics.inc("smtp_throttled_seconds_total", waited, host=self.host)
+        return waited
+
+    def send_message(self, msg, wait: bool = True) -> None:
+        """Send `msg` on a pooled session, retrying once on a fresh one if the session dropped.
+
+        Pass `wait=False` if the caller already took its turn with `wait_turn()`.
+        """
+        if wait:
+            self.wait_turn()
+        for attempt in (1, 2):
+            try:
+                with self.connection() as conn:
+                    conn.smtp.send_message(msg)
+                    conn.messages_sent += 1
+                return
+            except Exception as e:
+                if attempt == 2 or not is_connection_error(e):
+                    raise
+                logger.warning(f"SMTP session dropped ({e}), reconnecting")
+                metrics.inc("smtp_reconnects_total")
+
+    def idle_count(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+    def close(self) -> None:
+        self._closed = True
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._discard(conn)
+
+
+_pool: Optional[SmtpConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool(settings: Settings) -> SmtpConnectionPool:
+    """Process-wide pool, shared by every NotificationService and worker thread."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SmtpConnectionPool(
+                settings.smtp_host,
+                settings.smtp_port,
+                settings.smtp_user,
+                settings.smtp_password,
+                max_size=settings.smtp_pool_size,
+                max_messages=settings.smtp_max_messages_per_connection,
+                noop_after=settings.smtp_noop_after,
+                timeout=settings.smtp_timeout,
+                starttls=settings.smtp_starttls,
+                rate=RatePolicy(settings.smtp_rate_burst, settings.smtp_rate_per_second)
+                if settings.smtp_rate_per_second > 0
+                else None,
+            )
+        return _pool
+
+
+def close_smtp_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
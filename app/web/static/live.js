@@ -0,0 +1,43 @@
+// live.js
+// Listens to /events (server-sent events) and refreshes the page when the data it shows changes.
+// The page opts in with data-live="<event types>" on any element.
+(function(){
+  if(!window.EventSource) return;
+  const root = document.querySelector('[data-live]');
+  if(!root) return;
+  const types = root.getAttribute('data-live').split(/\s+/).filter(Boolean);
+  const source = new EventSource('/events');
+  let reloadTimer = null;
+
+  function scheduleReload(){
+    // Several events usually arrive together (payment + reservation): reload once
+    if(reloadTimer) return;
+    reloadTimer = setTimeout(function(){ window.location.reload(); }, 800);
+  }
+
+  function showAvailability(data){
+    const select = document.querySelector('select[name="cancha_id"]');
+    if(!select || String(data.cancha_id) !== select.value || !data.ocupado) return;
+    let box = document.getElementById('live-availability');
+    if(!box){
+      box = document.createElement('div');
+      box.id = 'live-availability';
+      box.className = 'message-box message-error';
+      select.closest('form').prepend(box);
+    }
+    const start = data.fecha_inicio.replace('T', ' ').slice(0, 16);
+    const end = data.fecha_fin.slice(11, 16);
+    box.textContent = 'Se acaba de reservar esta cancha: ' + start + ' - ' + end + '.';
+  }
+
+  types.forEach(function(type){
+    source.addEventListener(type, function(e){
+      if(type === 'disponibilidad'){
+        showAvailability(JSON.parse(e.data));
+      } else {
+        scheduleReload();
+      }
+    });
+  });
+  window.addEventListener('beforeunload', function(){ source.close(); });
+})();
@@ -0,0 +1,58 @@
+"""Comunicados a todos los usuarios activos desde la línea de comandos.
+
+python scripts/broadcast.py --asunto "Cancha 2 cerrada" --mensaje "Mañana la cancha 2 no abre."
+python scripts/broadcast.py --resume   # retoma los que quedaron 'en_curso' (p. ej. tras un reinicio)
+python scripts/broadcast.py --status   # avance de los últimos comunicados
+
+Los correos quedan encolados en notifications; los entregan los workers
+(python -m app.services.notification_worker o los hilos del servidor).
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import Settings
+from app.models.broadcast import Broadcast
+from app.services.broadcast_service import BroadcastService
+
+
+def print_status(broadcast: Broadcast) -> None:
+    avance = broadcast.encoladas * 100 / broadcast.total if broadcast.total else 100
+    print(
+        f"#{broadcast.id} [{broadcast.estado}] {broadcast.asunto}: "
+        f"{broadcast.encoladas}/{broadcast.total} encolados ({avance:.0f}%), checkpoint usuario {broadcast.last_user_id}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--asunto")
+    parser.add_argument("--mensaje")
+    parser.add_argument("--resume", action="store_true", help="retoma los comunicados sin terminar")
+    parser.add_argument("--status", action="store_true", help="muestra el avance de los últimos comunicados")
+    args = parser.parse_args()
+
+    service = BroadcastService(Settings.from_env())
+    if args.status:
+        for broadcast in service.broadcast_repo.find_recent():
+            print_status(broadcast)
+        return
+    if args.resume:
+        for broadcast in service.resume_unfinished():
+            print_status(broadcast)
+        return
+    if not args.asunto or not args.mensaje:
+        parser.error("--asunto y --mensaje son obligatorios")
+    broadcast = Broadcast(asunto=args.asunto.strip(), mensaje=args.mensaje.strip())
+    try:
+        broadcast.validar_datos()
+    except ValueError as e:
+        parser.error(str(e))
+    broadcast = service.broadcast_repo.create(broadcast)
+    print_status(service.run(broadcast))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Calibra los parámetros de hash de contraseñas para la máquina donde se despliega.
+
+Mide cuánto tarda un hash en este host y propone las variables de entorno
+para que un login cueste aproximadamente el tiempo objetivo:
+python scripts/calibrate_password_hash.py --target-ms 250 --algorithm scrypt
+
+Los hashes existentes se actualizan solos en el siguiente login exitoso.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import security
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--algorithm",
+        choices=[security.PASSWORD_ALGORITHM, security.SCRYPT_ALGORITHM],
+        default=security.PASSWORD_ALGORITHM,
+    )
+    parser.add_argument("--target-ms", type=float, default=250.0, help="latencia objetivo por hash")
+    args = parser.parse_args()
+
+    policy = security.calibrate_policy(args.algorithm, args.target_ms)
+
+    # Verificar el resultado con un hash real
+    start = time.perf_counter()
+    security.generate_password_hash("calibracion", policy)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    print(f"Hash de prueba: {elapsed_ms:.1f} ms (objetivo {args.target_ms:.0f} ms)")
+    print("Agrega a tu .env:")
+    print(f"PASSWORD_ALGORITHM={policy.algorithm}")
+    if policy.algorithm == security.SCRYPT_ALGORITHM:
+        print(f"SCRYPT_N={policy.scrypt_n}")
+        print(f"SCRYPT_R={policy.scrypt_r}")
+        print(f"SCRYPT_P={policy.scrypt_p}")
+    else:
+        print(f"PASSWORD_ITERATIONS={policy.iterations}")
+
+
+if __name__ == "__main__":
+    main()
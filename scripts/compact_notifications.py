@@ -0,0 +1,104 @@
+"""Compacta notificaciones viejas: HTML completo -> plantilla + parámetros.
+
+Para cada fila con `contenido` de un tipo con plantilla, recupera los
+parámetros con los que se armó el HTML; si al volver a renderizarlos se obtiene
+exactamente el mismo HTML, guarda template_id/template_version/params y deja
+`contenido` en NULL. Las filas que no coinciden (plantilla cambiada, HTML de
+respaldo) se dejan como están.
+
+python scripts/compact_notifications.py [--batch-size 500] [--dry-run]
+
+El espacio liberado por las filas actualizadas se reutiliza tras el autovacuum;
+para devolverlo al sistema operativo hace falta VACUUM FULL notifications.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2.extras
+
+from app.core.config import Settings
+from app.core.db import get_connection
+from app.services.email_templates import EMAIL_TEMPLATES, extract_params
+
+
+def table_size(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_total_relation_size('notifications') AS size")
+        return cur.fetchone()["size"]
+
+
+def compact(settings: Settings, batch_size: int = 500, dry_run: bool = False) -> dict:
+    stats = {"revisadas": 0, "compactadas": 0, "bytes_antes": 0, "bytes_despues": 0}
+    conn = get_connection(settings)
+    try:
+        stats["tabla_antes"] = table_size(conn)
+        last_id = 0
+        while True:
+            with conn.cursor() as cur:
+                # Por lotes en orden de id: memoria constante y sin transacciones largas
+                cur.execute(
+                    """
+                    SELECT id, tipo, contenido
+                    FROM notifications
+                    WHERE id > %s AND contenido IS NOT NULL AND tipo = ANY(%s)
+                    ORDER BY id
+                    LIMIT %s
+                    """,
+                    (last_id, list(EMAIL_TEMPLATES), batch_size),
+                )
+                rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            updates = []
+            for row in rows:
+                stats["revisadas"] += 1
+                params = extract_params(row["tipo"], row["contenido"])
+                if params is None:
+                    continue
+                updates.append((row["id"], row["tipo"], EMAIL_TEMPLATES[row["tipo"]].version, psycopg2.extras.Json(params)))
+                stats["bytes_antes"] += len(row["contenido"].encode("utf-8"))
+                stats["bytes_despues"] += len(json.dumps(params, ensure_ascii=False).encode("utf-8"))
+            if updates and not dry_run:
+                with conn.cursor() as cur:
+                    psycopg2.extras.execute_values(
+                        cur,
+                        """
+                        UPDATE notifications AS n
+                        SET template_id = v.template_id, template_version = v.template_version,
+                            params = v.params, contenido = NULL
+                        FROM (VALUES %s) AS v (id, template_id, template_version, params)
+                        WHERE n.id = v.id
+                        """,
+                        updates,
+                        template="(%s::integer, %s::varchar, %s::integer, %s::jsonb)",
+                    )
+            stats["compactadas"] += len(updates)
+        stats["tabla_despues"] = table_size(conn)
+    finally:
+        conn.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="sólo calcula, no modifica filas")
+    args = parser.parse_args()
+
+    stats = compact(Settings.from_env(), args.batch_size, args.dry_run)
+    saved = stats["bytes_antes"] - stats["bytes_despues"]
+    print(f"Filas revisadas: {stats['revisadas']}, compactadas: {stats['compactadas']}")
+    print(f"HTML reemplazado: {stats['bytes_antes'] / 1024:.1f} KB -> parámetros: {stats['bytes_despues'] / 1024:.1f} KB")
+    print(f"Ahorro estimado: {saved / 1024:.1f} KB")
+    print(f"Tamaño de la tabla: {stats['tabla_antes'] / 1024:.1f} KB -> {stats['tabla_despues'] / 1024:.1f} KB")
+    if stats["compactadas"] and not args.dry_run:
+        print("El espacio se reutiliza tras el autovacuum; VACUUM FULL notifications lo devuelve al disco.")
+
+
+if __name__ == "__main__":
+    main()
@@ -47,7 +47,11 @@ CREATE TABLE IF NOT EXISTS reservas (
 );
 
 CREATE INDEX IF NOT EXISTS idx_reservas_cancha_fecha ON reservas (cancha_id, fecha_inicio);
-CREATE INDEX IF NOT EXISTS idx_reservas_user ON reservas (user_id);
+-- Historial del usuario paginado por keyset; cubre también las búsquedas por user_id
+DROP INDEX IF EXISTS idx_reservas_user;
+CREATE INDEX IF NOT EXISTS idx_reservas_user_fecha_id ON reservas (user_id, fecha_inicio DESC, id DESC);
+-- Paginación keyset del listado de reservas del admin
+CREATE INDEX IF NOT EXISTS idx_reservas_fecha_id ON reservas (fecha_inicio DESC, id DESC);
 
 -- Seed roles
 INSERT INTO roles (nombre_rol)
@@ -89,9 +93,14 @@ CREATE TABLE IF NOT EXISTS transactions (
     created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_payments_user ON payments (user_id);
+DROP INDEX IF EXISTS idx_payments_user;
+CREATE INDEX IF NOT EXISTS idx_payments_user_created_id ON payments (user_id, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_payments_reservation ON payments (reservation_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_payment ON transactions (payment_id);
+-- Exportación por rango de fechas
+CREATE INDEX IF NOT EXISTS idx_transactions_created ON transactions (created_at);
+-- Paginación keyset / top-N del historial de pagos del admin
+CREATE INDEX IF NOT EXISTS idx_payments_created_id ON payments (created_at DESC, id DESC);
 
 -- Métodos de pago
 INSERT INTO payment_methods (nombre, tipo)
@@ -102,16 +111,61 @@ ON CONFLICT (nombre) DO NOTHING;
 CREATE TABLE IF NOT EXISTS notifications (
     id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-    tipo VARCHAR(50) NOT NULL, -- welcome, reservation_confirmation, payment_confirmation, cancellation
+    tipo VARCHAR(50) NOT NULL, -- welcome, reservation_confirmation, payment_confirmation, payment_reservation_confirmation, cancellation, reservation_reminder, broadcast
     asunto VARCHAR(255) NOT NULL,
     contenido TEXT NOT NULL,
-    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente', -- pendiente, enviado, fallido
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente', -- pendiente, enviando, enviado, fallido, descartado
     sent_at TIMESTAMP WITHOUT TIME ZONE,
     error_message TEXT,
     created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications (user_id);
-CREATE INDEX IF NOT EXISTS idx_notifications_estado ON notifications (estado);
+-- Bandeja de salida: send_email sólo inserta 'pendiente'; los workers reclaman
+-- lotes con FOR UPDATE SKIP LOCKED (ver app/services/notification_worker.py)
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS texto_plano TEXT NOT NULL DEFAULT '';
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITHOUT TIME ZONE;
+-- Reintentos: 'fallido' con next_attempt_at vuelve a 'pendiente' al vencer; tras
+-- NOTIFICATION_MAX_ATTEMPTS intentos queda 'descartado'
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP WITHOUT TIME ZONE;
+-- Plantilla + parámetros en vez del HTML completo (contenido queda NULL); el HTML
+-- se arma al enviar o mostrar. scripts/compact_notifications.py migra filas viejas
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS template_id VARCHAR(64);
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS template_version INTEGER;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS params JSONB;
+ALTER TABLE notifications ALTER COLUMN contenido DROP NOT NULL;
+
+DROP INDEX IF EXISTS idx_notifications_user;
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created_id ON notifications (user_id, created_at DESC, id DESC);
+-- (estado, next_attempt_at) también sirve para filtrar sólo por estado
+DROP INDEX IF EXISTS idx_notifications_estado;
 CREATE INDEX IF NOT EXISTS idx_notifications_tipo ON notifications (tipo);
+CREATE INDEX IF NOT EXISTS idx_notifications_retry ON notifications (estado, next_attempt_at);
+-- prioridad: 0 transaccionales, 1 comunicados masivos; los workers reclaman por (prioridad, id)
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS prioridad SMALLINT NOT NULL DEFAULT 0;
+DROP INDEX IF EXISTS idx_notifications_outbox;
+CREATE INDEX IF NOT EXISTS idx_notifications_outbox_prioridad ON notifications (prioridad, id) WHERE estado IN ('pendiente', 'enviando');
+
+-- Recordatorios enviados (uno por reserva: la PK evita duplicados entre schedulers)
+CREATE TABLE IF NOT EXISTS reservation_reminders (
+    reservation_id INTEGER PRIMARY KEY REFERENCES reservas(id) ON DELETE CASCADE,
+    notification_id INTEGER REFERENCES notifications(id) ON DELETE SET NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW()
+);
+-- Búsqueda por rango de fecha_inicio de las reservas pagadas (ver app/services/reminder_scheduler.py)
+CREATE INDEX IF NOT EXISTS idx_reservas_pagada_inicio ON reservas (fecha_inicio, id) WHERE estado = 'pagada';
 
+-- Comunicados del admin: se encolan por lotes recorriendo users con un cursor del
+-- lado del servidor; last_user_id es el checkpoint para retomarlos (ver app/services/broadcast_service.py)
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id SERIAL PRIMARY KEY,
+    asunto VARCHAR(255) NOT NULL,
+    mensaje TEXT NOT NULL,
+    created_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'en_curso', -- en_curso, completado
+    total INTEGER NOT NULL DEFAULT 0,
+    encoladas INTEGER NOT NULL DEFAULT 0,
+    last_user_id INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMP WITHOUT TIME ZONE
+);
@@ -0,0 +1,169 @@
+"""Local SMTP server that accepts and discards mail, for tests and benchmarks.
+
+It speaks the subset of SMTP that smtplib uses (EHLO/HELO, MAIL, RCPT, DATA,
+RSET, NOOP, QUIT) without STARTTLS or AUTH, so point the pool at it with
+`starttls=False` and no user. Delays and failures can be injected:
+
+- `handshake_latency`: delay before the greeting, standing in for the TCP,
+  TLS and login round trips of a real provider;
+- `latency`: delay before answering each message's DATA;
+- `fail_rate`: fraction of messages answered with a temporary 451 error;
+- `drop_rate`: fraction of messages after which the connection is closed.
+
+Run one standalone with:
+
+    python -m tests.smtp_sink --port 1025 --latency 0.05
+"""
+import argparse
+import logging
+import random
+import socketserver
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    server: "_SinkServer"
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        sink = self.server.sink
+        if sink.handshake_latency:
+            time.sleep(sink.handshake_latency)
+        sink._count("connections")
+        self.reply("220 smtp-sink ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.reply("250-smtp-sink")
+                self.reply("250-8BITMIME")
+                self.reply("250 SIZE 10485760")
+            elif verb == "HELO":
+                self.reply("250 smtp-sink")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = self.read_data()
+                if sink.latency:
+                    time.sleep(sink.latency)
+                if sink.rand() < sink.drop_rate:
+                    sink._count("dropped")
+                    return
+                if sink.rand() < sink.fail_rate:
+                    sink._count("failed")
+                    self.reply("451 4.3.0 Temporary failure (injected)")
+                else:
+                    sink._count("messages", size)
+                    self.reply("250 OK queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                # STARTTLS, AUTH, ... no soportados
+                self.reply("502 Command not implemented")
+
+    def read_data(self) -> int:
+        size = 0
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                return size
+            size += len(line)
+
+
+class _SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, sink: "SmtpSink"):
+        self.sink = sink
+        super().__init__(address, _SinkHandler)
+
+
+class SmtpSink:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        handshake_latency: float = 0.0,
+        fail_rate: float = 0.0,
+        drop_rate: float = 0.0,
+        rand: Callable[[], float] = random.random,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.handshake_latency = handshake_latency
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.rand = rand
+        self.connections = 0
+        self.messages = 0
+        self.failed = 0
+        self.dropped = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._server: Optional[_SinkServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _count(self, name: str, size: int = 0) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+            self.bytes_received += size
+
+    def start(self) -> "SmtpSink":
+        """Listen in a background thread; with port=0 the OS picks a free port (see `self.port`)"""
+        self._server = _SinkServer((self.host, self.port), self)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self) -> "SmtpSink":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local SMTP sink (no STARTTLS/AUTH)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before answering DATA")
+    parser.add_argument("--handshake-latency", type=float, default=0.0, help="seconds before the greeting")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of messages answered with 451")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of messages that drop the connection")
+    args = parser.parse_args()
+    sink = SmtpSink(args.host, args.port, args.latency, args.handshake_latency, args.fail_rate, args.drop_rate).start()
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"SMTP sink listening on {sink.host}:{sink.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(10)
+            logger.info(f"{sink.messages} messages, {sink.failed} failed, {sink.connections} connections")
+    except KeyboardInterrupt:
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,7 @@ from app.services.auth_service import AuthService
 from app.services.reservation_service import ReservationService
 from app.services.payment_service import PaymentService
 from app.services.notification_service import NotificationService
+from app.services.notification_worker import NotificationWorker
 
 
 class TestAceptacionUsuario(unittest.TestCase):
@@ -39,6 +40,7 @@ class TestAceptacionUsuario(unittest.TestCase):
         self.notification_repo = NotificationRepository(self.settings)
         
         self.notification_service = NotificationService(self.settings)
+        self.notification_worker = NotificationWorker(self.settings, self.notification_service)
         self.auth_service = AuthService(
             self.user_repo, self.session_repo, self.notification_service
         )
@@ -72,6 +74,8 @@ class TestAceptacionUsuario(unittest.TestCase):
         print(f"✓ Usuario registrado: {user.nombre} ({user.email})")
         
         # Y debo recibir un email de bienvenida
+        # (el correo sale de la bandeja de salida al procesarla un worker)
+        self.notification_worker.drain()
         notifications = self.notification_repo.get_by_user(user.id)
         welcome_emails = [n for n in notifications if n.tipo == "welcome"]
         self.assertEqual(len(welcome_emails), 1, "Debe recibir exactamente 1 email de bienvenida")
@@ -138,11 +142,12 @@ class TestAceptacionUsuario(unittest.TestCase):
         print(f"✓ Reserva creada: {cancha.nombre} del {fecha_inicio.strftime('%d/%m/%Y %H:%M')}")
         
         # Y debo recibir un email de confirmación
+        self.notification_worker.drain()
         notifications = self.notification_repo.get_by_user(user.id)
         conf_emails = [n for n in notifications if n.tipo == "reservation_confirmation"]
         self.assertEqual(len(conf_emails), 1, "Debe recibir email de confirmación de reserva")
         self.assertEqual(conf_emails[0].estado, "enviado")
-        self.assertIn(cancha.nombre, conf_emails[0].contenido)
+        self.assertIn(cancha.nombre, self.notification_service.render(conf_emails[0]))
         print(f"✓ Email de confirmación enviado: {conf_emails[0].asunto}")
         
         print("✅ UAT-003 PASSED")
@@ -187,12 +192,14 @@ class TestAceptacionUsuario(unittest.TestCase):
         self.assertEqual(reserva_pagada.estado, "pagada")
         print(f"✓ Reserva actualizada a: {reserva_pagada.estado}")
         
-        # Y debo recibir un email con el recibo
+        # Y debo recibir un único email con el recibo y la reserva confirmada
+        self.notification_worker.drain()
         notifications = self.notification_repo.get_by_user(user.id)
-        payment_emails = [n for n in notifications if n.tipo == "payment_confirmation"]
+        payment_emails = [n for n in notifications if n.tipo == "payment_reservation_confirmation"]
         self.assertEqual(len(payment_emails), 1, "Debe recibir email de confirmación de pago")
+        self.assertEqual([n for n in notifications if n.tipo == "payment_confirmation"], [])
         self.assertEqual(payment_emails[0].estado, "enviado")
-        self.assertIn(str(monto), payment_emails[0].contenido)
+        self.assertIn(str(monto), self.notification_service.render(payment_emails[0]))
         print(f"✓ Recibo enviado por email: {payment_emails[0].asunto}")
         
         print("✅ UAT-004 PASSED")
@@ -228,6 +235,7 @@ class TestAceptacionUsuario(unittest.TestCase):
         print(f"✓ Reserva cancelada: {reserva_cancelada.estado}")
         
         # Y debo recibir notificación de cancelación
+        self.notification_worker.drain()
         notifications = self.notification_repo.get_by_user(user.id)
         cancel_emails = [n for n in notifications if n.tipo == "cancellation"]
         self.assertEqual(len(cancel_emails), 1, "Debe recibir email de cancelación")
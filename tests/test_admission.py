@@ -0,0 +1,170 @@
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from app.core.admission import (
+    PRIORITY_CRITICAL,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    AdmissionControlledHTTPServer,
+    DeadlineRequestHandlerMixin,
+    classify,
+    in_stream_lane,
+    is_stream,
+)
+from app.core.metrics import metrics
+
+
+class SlowHandler(DeadlineRequestHandlerMixin, BaseHTTPRequestHandler):
+    header_timeout = 0.5
+    release = threading.Event()
+
+    def do_GET(self):
+        if self.path == "/lane":
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"stream" if in_stream_lane() else b"worker")
+            return
+        if self.path in ("/dashboard/lento", "/events"):
+            self.release.wait(5)
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(self.path.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+def raw_request(port: int, path: str) -> socket.socket:
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(f"GET {path} HTTP/1.0\r\nHost: test\r\n\r\n".encode())
+    return sock
+
+
+def read_status(sock: socket.socket) -> int:
+    sock.settimeout(5)
+    data = b""
+    while b"\r\n" not in data:
+        chunk = sock.recv(1024)
+        if not chunk:
+            break
+        data += chunk
+    sock.close()
+    return int(data.split(b" ")[1]) if data else 0
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_prioridades(self):
+        self.assertEqual(classify(b"POST /webhook/stripe HTTP/1.1"), PRIORITY_CRITICAL)
+        self.assertEqual(classify(b"POST /pagos/create HTTP/1.1"), PRIORITY_CRITICAL)
+        self.assertEqual(classify(b"GET /dashboard/admin?x=1 HTTP/1.1"), PRIORITY_LOW)
+        self.assertEqual(classify(b"GET /login HTTP/1.1"), PRIORITY_NORMAL)
+        self.assertEqual(classify(b"GET /api/v1/reservas HTTP/1.1"), PRIORITY_LOW)
+        self.assertEqual(classify(b"POST /api/v1/reservas HTTP/1.1"), PRIORITY_NORMAL)
+        self.assertEqual(classify(b""), PRIORITY_NORMAL)
+        self.assertTrue(is_stream(b"GET /events?x=1 HTTP/1.1"))
+        self.assertFalse(is_stream(b"POST /events HTTP/1.1"))
+
+
+class AdmissionServerTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        SlowHandler.release.clear()
+        self.server = AdmissionControlledHTTPServer(
+            ("127.0.0.1", 0), SlowHandler, workers=1, max_queue=1, queue_timeout=5, max_streams=1
+        )
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        SlowHandler.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _wait_until(self, predicate):
+        deadline = time.time() + 5
+        while not predicate() and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_cola_llena_descarta_con_503(self):
+        busy = raw_request(self.port, "/dashboard/lento")
+        self._wait_until(lambda: metrics.get("http_busy_workers") == 1)
+        queued = raw_request(self.port, "/login")
+        self._wait_until(lambda: self.server.queue_depth() == 1)
+        rejected = raw_request(self.port, "/dashboard/otro")
+        self.assertEqual(read_status(rejected), 503)
+        self.assertEqual(metrics.get("http_shed_total", priority="low", reason="queue_full"), 1)
+        SlowHandler.release.set()
+        self.assertEqual(read_status(busy), 200)
+        self.assertEqual(read_status(queued), 200)
+
+    def test_prioridad_alta_desplaza_a_baja(self):
+        busy = raw_request(self.port, "/dashboard/lento")
+        self._wait_until(lambda: metrics.get("http_busy_workers") == 1)
+        low = raw_request(self.port, "/dashboard/lento")
+        self._wait_until(lambda: self.server.queue_depth() == 1)
+        critical = raw_request(self.port, "/pagos/create")
+        self.assertEqual(read_status(low), 503)
+        SlowHandler.release.set()
+        self.assertEqual(read_status(busy), 200)
+        self.assertEqual(read_status(critical), 200)
+        self.assertEqual(metrics.get("http_shed_total", priority="low", reason="queue_full"), 1)
+
+    def test_streams_no_ocupan_trabajadores(self):
+        stream = raw_request(self.port, "/events")
+        self._wait_until(lambda: self.server.open_streams() == 1)
+        # El único trabajador sigue libre
+        self.assertEqual(read_status(raw_request(self.port, "/login")), 200)
+        self.assertEqual(read_status(raw_request(self.port, "/events")), 503)
+        self.assertEqual(metrics.get("http_shed_total", priority="low", reason="streams_full"), 1)
+        SlowHandler.release.set()
+        self.assertEqual(read_status(stream), 200)
+        self._wait_until(lambda: self.server.open_streams() == 0)
+        self.assertEqual(self.server.open_streams(), 0)
+
+    def test_clientes_mudos_no_frenan_el_accept(self):
+        self.tearDown()
+        self.server = AdmissionControlledHTTPServer(("127.0.0.1", 0), SlowHandler, workers=1, max_queue=64)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        idle = [socket.create_connection(("127.0.0.1", self.port)) for _ in range(20)]
+        start = time.time()
+        # Con el peek en el hilo del accept, 20 clientes mudos lo frenaban 20 x peek_timeout
+        self.assertEqual(read_status(raw_request(self.port, "/pagos/create")), 200)
+        self.assertLess(time.time() - start, self.server.peek_timeout * 5)
+        for sock in idle:
+            sock.close()
+
+    def test_peticion_tardia_cae_en_un_trabajador(self):
+        # La línea llega después de peek_timeout: se clasifica normal y el handler lo sabe
+        import app.core.admission as admission
+        admission.STREAM_PATHS, old = (b"/lane",), admission.STREAM_PATHS
+        self.addCleanup(setattr, admission, "STREAM_PATHS", old)
+        fast = raw_request(self.port, "/lane")
+        slow = socket.create_connection(("127.0.0.1", self.port))
+        time.sleep(self.server.peek_timeout * 3)
+        slow.sendall(b"GET /lane HTTP/1.0\r\n\r\n")
+        for sock, expected in ((fast, b"stream"), (slow, b"worker")):
+            sock.settimeout(5)
+            data = b""
+            while chunk := sock.recv(1024):
+                data += chunk
+            sock.close()
+            self.assertTrue(data.endswith(expected), data)
+
+    def test_cabeceras_lentas_se_cortan(self):
+        sock = socket.create_connection(("127.0.0.1", self.port))
+        sock.sendall(b"GET /login HTTP/1.0\r\n")
+        sock.settimeout(5)
+        start = time.time()
+        self.assertEqual(sock.recv(1024), b"")
+        self.assertLess(time.time() - start, 3)
+        sock.close()
+        self.assertEqual(metrics.get("http_header_timeouts_total"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+
+from app.api import _COMPILED_ROUTES, dumps, pago_json, page_json, reserva_json
+from app.core.pagination import Page
+
+
+class ApiSerializationTest(unittest.TestCase):
+    def test_json_compacto(self):
+        body = dumps({"nombre": "Cancha Ñ", "monto": Decimal("12.50"), "dia": date(2026, 1, 2),
+                      "inicio": datetime(2026, 1, 2, 10, 0, 0, 123456)})
+        self.assertEqual(
+            body.decode("utf-8"),
+            '{"nombre":"Cancha Ñ","monto":12.5,"dia":"2026-01-02","inicio":"2026-01-02T10:00:00"}',
+        )
+
+    def test_listados_con_cursores(self):
+        row = {"id": 3, "amount": Decimal("5"), "estado": "confirmado", "created_at": datetime(2026, 1, 1),
+               "reservation_id": 7, "currency": "usd", "metodo_nombre": "Tarjeta", "usuario_nombre": "Ana",
+               "gateway_ref": "cs_123", "payment_method_id": 1}
+        data = json.loads(dumps(page_json(Page(items=[row], next_cursor="abc"), pago_json)))
+        self.assertEqual(data["next"], "abc")
+        self.assertIsNone(data["prev"])
+        # Sólo los campos públicos, no las columnas internas del pago
+        self.assertEqual(
+            set(data["items"][0]),
+            {"id", "reservation_id", "amount", "currency", "estado", "metodo", "created_at", "usuario"},
+        )
+        reserva = reserva_json({"id": 1, "cancha": "C", "fecha_inicio": None, "fecha_fin": None, "estado": "pendiente"})
+        self.assertNotIn("usuario", reserva)
+
+    def test_rutas(self):
+        def match(method, path):
+            return [name for m, pattern, name in _COMPILED_ROUTES if m == method and pattern.fullmatch(path)]
+
+        self.assertEqual(match("GET", "/canchas/12/disponibilidad"), ["api_disponibilidad"])
+        self.assertEqual(match("POST", "/reservas/5/cancelar"), ["api_cancelar_reserva"])
+        self.assertEqual(match("POST", "/reservas"), ["api_crear_reserva"])
+        self.assertEqual(match("GET", "/canchas/x/disponibilidad"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from app.core.assets import AssetPipeline, minify_css, minify_js
+
+
+class AssetPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.dir.name, "static")
+        os.makedirs(self.static)
+        self.write("a.css", "/* base */\nbody {\r\n    color: red;\r\n}\n")
+        self.write("b.css", ".x > .y ,\n.z { margin: 0 auto; }\n")
+        self.write("app.js", "// comentario\nfunction f() {\n    return 1\n}\n")
+        self.pipeline = AssetPipeline(self.static)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name, content):
+        with open(os.path.join(self.static, name), "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+
+    def test_minificacion(self):
+        self.assertEqual(minify_css("/* c */ a:hover , b { color: red ; }"), "a:hover,b{color:red}")
+        self.assertEqual(minify_js("// x\n  var a = 1\n\n  a++\n"), "var a = 1\na++")
+
+    def test_reescribe_la_pagina_con_un_bundle(self):
+        page = (
+            '<head>\n    <link rel="stylesheet" href="/static/a.css">\n'
+            '    <link rel="stylesheet" href="/static/b.css">\n</head>'
+            '<script src="/static/app.js"></script>'
+        )
+        out = self.pipeline.rewrite(page)
+        css_url = self.pipeline.bundle(("a.css", "b.css")).url
+        self.assertRegex(css_url, r"^/static/dist/a-b\.[0-9a-f]{12}\.css$")
+        self.assertEqual(out.split("<script")[0], f'<head>\n    <link rel="stylesheet" href="{css_url}">\n</head>')
+        self.assertIn('<script src="/static/dist/app.', out)
+
+        bundle = self.pipeline.get(css_url.rsplit("/", 1)[1])
+        self.assertEqual(bundle.body, b"body{color:red}\n.x > .y,.z{margin:0 auto}")
+        # También queda escrito en dist/
+        with open(os.path.join(self.static, "dist", css_url.rsplit("/", 1)[1]), "rb") as f:
+            self.assertEqual(f.read(), bundle.body)
+
+    def test_el_hash_cambia_con_el_contenido(self):
+        first = AssetPipeline(self.static).bundle(("a.css",)).url
+        self.write("a.css", "body { color: blue; }")
+        second = AssetPipeline(self.static).bundle(("a.css",)).url
+        self.assertNotEqual(first, second)
+        # Un proceso nuevo sigue sirviendo el bundle anterior desde dist/
+        self.assertIsNotNone(AssetPipeline(self.static).get(first.rsplit("/", 1)[1]))
+
+    def test_referencias_desconocidas_no_se_tocan(self):
+        page = '<link rel="stylesheet" href="/static/falta.css">'
+        self.assertEqual(self.pipeline.rewrite(page), page)
+        self.assertIsNone(self.pipeline.get("../a.css"))
+        self.assertIsNone(self.pipeline.get("a.css"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@ import unittest
 from datetime import datetime, timedelta, timezone
 
 from app.core import security
+from app.core.password_hasher import PasswordHasher
 from app.models.session import Session
 from app.models.user import User
 from app.services.auth_service import AuthService
@@ -79,6 +80,34 @@ class AuthServiceTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.service.autenticar("ana@example.com", "WrongPass1")
 
+    def test_rehash_en_login_con_parametros_nuevos(self):
+        self.service.registrar_usuario("Ana", "ana@example.com", "Password1", 2)
+        old_hash = self.user_repo.find_by_email("ana@example.com").password_hash
+        policy = security.HashPolicy(algorithm=security.SCRYPT_ALGORITHM, scrypt_n=2**10)
+        service = AuthService(self.user_repo, self.session_repo, password_policy=policy)
+        service.autenticar("ana@example.com", "Password1")
+        new_hash = self.user_repo.find_by_email("ana@example.com").password_hash
+        self.assertNotEqual(old_hash, new_hash)
+        self.assertTrue(new_hash.startswith("scrypt$1024$"))
+        self.assertFalse(security.needs_rehash(new_hash, policy))
+        # El hash actualizado sigue permitiendo el login
+        service.autenticar("ana@example.com", "Password1")
+
+    def test_login_fallido_no_rehashea(self):
+        self.service.registrar_usuario("Ana", "ana@example.com", "Password1", 2)
+        old_hash = self.user_repo.find_by_email("ana@example.com").password_hash
+        service = AuthService(self.user_repo, self.session_repo, password_policy=security.HashPolicy(iterations=1000))
+        with self.assertRaises(ValueError):
+            service.autenticar("ana@example.com", "WrongPass1")
+        self.assertEqual(self.user_repo.find_by_email("ana@example.com").password_hash, old_hash)
+
+    def test_needs_rehash(self):
+        stored = security.generate_password_hash("Password1", security.HashPolicy(iterations=1000))
+        self.assertFalse(security.needs_rehash(stored, security.HashPolicy(iterations=1000)))
+        self.assertTrue(security.needs_rehash(stored, security.HashPolicy(iterations=2000)))
+        self.assertTrue(security.needs_rehash(stored, security.HashPolicy(algorithm=security.SCRYPT_ALGORITHM)))
+        self.assertFalse(security.verify_password("Password1", "md5$abc"))
+
     def test_validacion_email(self):
         self.assertFalse(User.email_valida("mal_correo"))
         self.assertTrue(User.email_valida("bien@example.com"))
@@ -89,5 +118,53 @@ class AuthServiceTest(unittest.TestCase):
         self.assertTrue(User.password_valida("Password1"))
 
 
+class AuthServicePasswordPoolTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.hasher = PasswordHasher(workers=1, max_pending=4)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.hasher.shutdown()
+
+    def setUp(self):
+        self.user_repo = FakeUserRepo()
+        self.session_repo = FakeSessionRepo()
+        self.service = AuthService(self.user_repo, self.session_repo, password_hasher=self.hasher)
+
+    def test_registro_y_login_con_pool(self):
+        self.service.registrar_usuario("Ana", "ana@example.com", "Password1", 2)
+        self.assertTrue(security.verify_password("Password1", self.user_repo.find_by_email("ana@example.com").password_hash))
+        user, _ = self.service.autenticar("ana@example.com", "Password1")
+        self.assertEqual(user.email, "ana@example.com")
+        with self.assertRaises(ValueError):
+            self.service.autenticar("ana@example.com", "WrongPass1")
+
+    def test_pool_roto_se_recrea(self):
+        hasher = PasswordHasher(workers=1, max_pending=1)
+        try:
+            stored = hasher.hash("Password1")
+            broken = hasher._executor
+            # Simula un OOM kill del proceso que hashea
+            for process in list(broken._processes.values()):
+                process.kill()
+                process.join()
+            self.assertTrue(hasher.verify("Password1", stored))
+            self.assertIsNot(hasher._executor, broken)
+            self.assertTrue(security.verify_password("Password1", hasher.hash("Password1")))
+        finally:
+            hasher.shutdown()
+
+    def test_cola_llena_rechaza(self):
+        hasher = PasswordHasher(workers=1, max_pending=0, acquire_timeout=0)
+        try:
+            hasher._slots.acquire()
+            with self.assertRaises(ValueError):
+                hasher.hash("Password1")
+        finally:
+            hasher._slots.release()
+            hasher.shutdown()
+
+
 if __name__ == "__main__":
     unittest.main()
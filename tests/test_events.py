@@ -0,0 +1,53 @@
+import unittest
+
+from app.core.events import EventBus
+from app.core.fragment_cache import BOOT_ID
+from app.core.metrics import metrics
+
+
+class EventBusTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.bus = EventBus(max_queue=2, history=10)
+
+    def test_cada_uno_recibe_lo_suyo(self):
+        dueno = self.bus.subscribe(user_id=1)
+        otro = self.bus.subscribe(user_id=2)
+        admin = self.bus.subscribe(user_id=3, is_admin=True)
+        self.bus.publish("pago", {"id": 10, "estado": "confirmado"}, user_id=1)
+        self.bus.publish("disponibilidad", {"cancha_id": 4, "ocupado": True})
+
+        self.assertEqual([dueno.get(0).type, dueno.get(0).type], ["pago", "disponibilidad"])
+        self.assertEqual(otro.get(0).type, "disponibilidad")
+        self.assertIsNone(otro.get(0))
+        self.assertEqual(admin.get(0).data["id"], 10)
+
+    def test_frame_sse(self):
+        event = self.bus.publish("pago", {"id": 1, "nombre": "Ñandú"}, user_id=1)
+        self.assertEqual(
+            event.frame.decode("utf-8"),
+            f'id: {BOOT_ID}-{event.id}\nevent: pago\ndata: {{"id":1,"nombre":"Ñandú"}}\n\n',
+        )
+
+    def test_cliente_lento_se_desconecta(self):
+        lento = self.bus.subscribe(user_id=1)
+        for i in range(3):
+            self.bus.publish("disponibilidad", {"i": i})
+        self.assertTrue(lento.closed)
+        self.assertEqual(self.bus.subscriber_count(), 0)
+        self.assertEqual(metrics.get("sse_dropped_subscribers_total"), 1)
+
+    def test_replay_desde_last_event_id(self):
+        first = self.bus.publish("disponibilidad", {"i": 1})
+        self.bus.publish("pago", {"id": 5}, user_id=2)
+        self.bus.publish("disponibilidad", {"i": 2})
+        sub = self.bus.subscribe(user_id=1)
+        replayed = self.bus.replay(sub, f"{BOOT_ID}-{first.id}")
+        self.assertEqual([e.data for e in replayed], [{"i": 2}])
+        # Ids de otro arranque o inválidos no reenvían nada
+        self.assertEqual(self.bus.replay(sub, f"otro-{first.id}"), [])
+        self.assertEqual(self.bus.replay(sub, None), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
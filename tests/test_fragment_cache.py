@@ -0,0 +1,69 @@
+import unittest
+
+from app.core.fragment_cache import DataVersions, FragmentCache, make_etag
+from app.core.metrics import metrics
+
+
+class FragmentCacheTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.versions = DataVersions()
+        self.cache = FragmentCache(max_entries=2)
+        self.renders = 0
+
+    def render(self, value):
+        def _render():
+            self.renders += 1
+            return value
+        return _render
+
+    def test_reutiliza_hasta_que_cambia_la_version(self):
+        v = (self.versions.get("canchas"),)
+        self.assertEqual(self.cache.get_or_render("opciones", None, v, self.render("a")), "a")
+        self.assertEqual(self.cache.get_or_render("opciones", None, v, self.render("b")), "a")
+        self.assertEqual(self.renders, 1)
+
+        self.versions.bump("canchas")
+        v = (self.versions.get("canchas"),)
+        self.assertEqual(self.cache.get_or_render("opciones", None, v, self.render("b")), "b")
+        self.assertEqual(metrics.get("fragment_cache_hits_total", fragment="opciones"), 1)
+        self.assertEqual(metrics.get("fragment_cache_misses_total", fragment="opciones"), 2)
+
+    def test_version_por_clave_y_global(self):
+        self.versions.bump("reservas", 7)
+        self.assertEqual(self.versions.get("reservas", 7), 1)
+        self.assertEqual(self.versions.get("reservas", 8), 0)
+        # La versión global de la entidad cambia con cualquier escritura
+        self.assertEqual(self.versions.get("reservas"), 1)
+        self.versions.reset()
+        self.assertEqual(self.versions.get("reservas", 7), 0)
+
+    def test_expulsa_la_entrada_menos_usada(self):
+        self.cache.get_or_render("f", 1, (0,), self.render("uno"))
+        self.cache.get_or_render("f", 2, (0,), self.render("dos"))
+        self.cache.get_or_render("f", 1, (0,), self.render("x"))  # 1 pasa a ser la más reciente
+        self.cache.get_or_render("f", 3, (0,), self.render("tres"))
+        self.assertEqual(self.cache.get_or_render("f", 1, (0,), self.render("x")), "uno")
+        self.assertEqual(self.cache.get_or_render("f", 2, (0,), self.render("dos otra vez")), "dos otra vez")
+        self.assertEqual(metrics.get("fragment_cache_evictions_total"), 2)
+        self.assertEqual(metrics.get("fragment_cache_entries"), 2)
+
+    def test_errores_no_se_guardan(self):
+        def falla():
+            raise RuntimeError("db caída")
+        with self.assertRaises(RuntimeError):
+            self.cache.get_or_render("f", 1, (0,), falla)
+        self.assertEqual(self.cache.get_or_render("f", 1, (0,), self.render("ok")), "ok")
+
+    def test_etag_cambia_con_las_versiones(self):
+        first = make_etag("usuario", 7, self.versions.get("pagos", 7))
+        self.assertTrue(first.startswith('W/"'))
+        self.assertEqual(make_etag("usuario", 7, self.versions.get("pagos", 7)), first)
+        self.versions.bump("pagos", 8)
+        self.assertEqual(make_etag("usuario", 7, self.versions.get("pagos", 7)), first)
+        self.versions.bump("pagos", 7)
+        self.assertNotEqual(make_etag("usuario", 7, self.versions.get("pagos", 7)), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,580 @@
+import os
+import smtplib
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+
+from app.core.config import Settings
+from app.core.metrics import metrics
+from app.core.rate_limit import RatePolicy, Throttle
+from app.models.broadcast import Broadcast
+from app.models.notification import Notification
+from app.models.user import User
+from app.services.broadcast_service import BroadcastService
+from app.services.notification_service import DeliveryResult, NotificationService, is_permanent_failure, outbox_wakeup
+from app.services import email_templates
+from app.services.email_templates import EmailTemplate, extract_params, render_email
+from app.services.notification_worker import NotificationWorker, retry_delay
+from app.services.reminder_scheduler import ReminderScheduler
+from app.services.smtp_pool import SmtpConnectionPool
+from tests.smtp_sink import SmtpSink
+
+
+def make_settings(**overrides) -> Settings:
+    values = dict(
+        db_host="localhost", db_port=5433, db_name="test", db_user="test", db_password="",
+        secret_key="test", server_port=0, smtp_host="", smtp_port=0, smtp_user="",
+        smtp_password="", smtp_from_email="", smtp_from_name="", notification_mode="simulated",
+        notification_batch_size=2,
+    )
+    values.update(overrides)
+    return Settings(**values)
+
+
+class FakeOutbox:
+    """Tabla notifications en memoria con la misma semántica de reclamo."""
+
+    def __init__(self):
+        self.rows = {}
+        self.emails = {1: "ana@test.com"}
+
+    def create_many(self, notifications):
+        self.inserts = getattr(self, "inserts", 0) + 1
+        for notification in notifications:
+            notification.id = len(self.rows) + 1
+            self.rows[notification.id] = notification
+        return notifications
+
+    def claim_pending(self, limit, lease_seconds):
+        pending = [n for n in self.rows.values() if n.estado == "pendiente"]
+        batch = sorted(pending, key=lambda n: (n.prioridad, n.id))[:limit]
+        for n in batch:
+            n.estado = "enviando"
+        return [
+            {"id": n.id, "user_id": n.user_id, "asunto": n.asunto, "contenido": n.contenido,
+             "texto_plano": n.texto_plano, "attempts": n.attempts, "template_id": n.template_id,
+             "template_version": n.template_version, "params": n.params, "email": self.emails[n.user_id]}
+            for n in batch
+        ]
+
+    def update_statuses(self, updates):
+        self.flushes = getattr(self, "flushes", 0) + 1
+        for u in updates:
+            row = self.rows[u.id]
+            row.estado, row.error_message, row.next_attempt_at = u.estado, u.error_message, u.next_attempt_at
+            if u.attempts is not None:
+                row.attempts = u.attempts
+
+    def schedule_due_retries(self, limit):
+        due = [n for n in self.rows.values() if n.estado == "fallido" and n.next_attempt_at][:limit]
+        for n in due:
+            n.estado = "pendiente"
+        return len(due)
+
+
+class NotificationOutboxTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.outbox = FakeOutbox()
+        self.service = NotificationService(make_settings())
+        self.service.notification_repo = self.outbox
+        self.sent = []
+        self.service.deliver = lambda to, subject, html, plain="": self.sent.append((to, subject)) or (True, None)
+        self.worker = NotificationWorker(self.service.settings, self.service)
+        self.user = User(id=1, nombre="Ana", email="ana@test.com", password_hash="x", rol_id=2)
+
+    def test_send_email_solo_encola(self):
+        outbox_wakeup.clear()
+        notification = self.service.send_email(self.user, "test", "Hola", "<p>Hola</p>", "Hola")
+        self.assertEqual(notification.estado, "pendiente")
+        self.assertEqual(notification.texto_plano, "Hola")
+        self.assertEqual(self.sent, [])
+        self.assertTrue(outbox_wakeup.is_set())
+
+    def test_worker_entrega_por_lotes(self):
+        for i in range(3):
+            self.service.send_email(self.user, "test", f"Asunto {i}", "<p>x</p>")
+        self.assertEqual(self.worker.run_once(), 2)
+        self.assertEqual(self.outbox.flushes, 1)
+        self.assertEqual(self.worker.drain(), 1)
+        self.assertEqual(sorted(s for _, s in self.sent), ["Asunto 0", "Asunto 1", "Asunto 2"])
+        self.assertTrue(all(n.estado == "enviado" for n in self.outbox.rows.values()))
+        self.assertEqual(metrics.get("notifications_delivered_total", estado="enviado"), 3)
+
+    def test_plantilla_se_guarda_como_referencia(self):
+        recibidos = []
+        self.service.deliver = lambda to, subject, html, plain="": recibidos.append(html) or (True, None)
+        notification = self.service.send_welcome_email(self.user)
+        self.assertIsNone(notification.contenido)
+        self.assertEqual(notification.template_id, "welcome")
+        self.assertEqual(notification.params, {"nombre": "Ana", "email": "ana@test.com"})
+        self.worker.drain()
+        self.assertIn("Ana", recibidos[0])
+        self.assertNotIn("$nombre", recibidos[0])
+
+    def test_encolar_varias_en_un_insert(self):
+        queued = self.service.enqueue([
+            Notification(user_id=1, tipo="test", asunto=f"Asunto {i}", contenido="<p>x</p>") for i in range(3)
+        ])
+        self.assertEqual([n.id for n in queued], [1, 2, 3])
+        self.assertEqual(self.outbox.inserts, 1)
+
+    def test_coalesce_une_pago_y_reserva(self):
+        otro = User(id=2, nombre="Luis", email="luis@test.com", password_hash="x", rol_id=2)
+        with self.service.coalesce():
+            self.service.send_payment_confirmation(self.user, {"monto": "20.00", "metodo": "Tarjeta"})
+            self.service.send_reservation_confirmation(self.user, {"cancha": "Cancha 1", "fecha_inicio": "01/01/2030 10:00"})
+            self.service.send_payment_confirmation(otro, {"monto": "15.00"})
+            self.assertEqual(self.outbox.rows, {})
+        self.assertEqual(self.outbox.inserts, 1)
+        tipos = [n.tipo for n in self.outbox.rows.values()]
+        self.assertEqual(tipos, ["payment_reservation_confirmation", "payment_confirmation"])
+        combinado = self.service.render(self.outbox.rows[1])
+        self.assertIn("20.00", combinado)
+        self.assertIn("Cancha 1", combinado)
+        self.assertEqual(metrics.get("notifications_coalesced_total"), 1)
+
+    def test_fallo_de_envio_queda_registrado(self):
+        self.service.deliver = lambda *args: (False, "SMTP error: 550")
+        notification = self.service.send_email(self.user, "test", "Hola", "<p>Hola</p>")
+        self.worker.drain()
+        self.assertEqual(notification.estado, "fallido")
+        self.assertEqual(notification.error_message, "SMTP error: 550")
+        self.assertEqual(notification.attempts, 1)
+        self.assertIsNotNone(notification.next_attempt_at)
+
+    def test_reintentos_hasta_descartar(self):
+        self.service.deliver = lambda *args: (False, "SMTP error: 451")
+        notification = self.service.send_email(self.user, "test", "Hola", "<p>Hola</p>")
+        for _ in range(self.worker.max_attempts):
+            # Simula que venció el backoff
+            self.assertEqual(self.worker.schedule_retries(), 1 if notification.attempts else 0)
+            self.worker.drain()
+        self.assertEqual(notification.estado, "descartado")
+        self.assertEqual(notification.attempts, self.worker.max_attempts)
+        self.assertIsNone(notification.next_attempt_at)
+        self.assertEqual(self.worker.schedule_retries(), 0)
+
+    def test_fila_sin_plantilla_no_frena_el_lote(self):
+        self.worker.batch_size = 3
+        good = [self.service.send_email(self.user, "test", f"Hola {i}", "<p>Hola</p>") for i in range(2)]
+        bad = self.service.send_welcome_email(self.user)
+        bad.template_id = "plantilla_borrada"
+        self.assertEqual(self.worker.run_once(), 3)
+        self.assertEqual([n.estado for n in good], ["enviado", "enviado"])
+        self.assertEqual(bad.estado, "descartado")
+        self.assertEqual(bad.attempts, 1)
+        self.assertIn("plantilla_borrada", bad.error_message)
+
+    def test_fallo_permanente_se_descarta_sin_reintentar(self):
+        self.service.deliver = lambda *args: DeliveryResult(False, "SMTP error: 550 mailbox unavailable", True)
+        notification = self.service.send_email(self.user, "test", "Hola", "<p>Hola</p>")
+        self.worker.drain()
+        self.assertEqual(notification.estado, "descartado")
+        self.assertEqual(notification.attempts, 1)
+        self.assertIsNone(notification.next_attempt_at)
+
+    def test_clasificacion_de_errores_smtp(self):
+        self.assertTrue(is_permanent_failure(smtplib.SMTPRecipientsRefused({"x@test.com": (550, b"no such user")})))
+        self.assertFalse(is_permanent_failure(smtplib.SMTPRecipientsRefused({"x@test.com": (450, b"try later")})))
+        self.assertTrue(is_permanent_failure(smtplib.SMTPAuthenticationError(535, b"bad credentials")))
+        self.assertTrue(is_permanent_failure(smtplib.SMTPDataError(554, b"rejected")))
+        self.assertFalse(is_permanent_failure(smtplib.SMTPDataError(451, b"try later")))
+        self.assertFalse(is_permanent_failure(smtplib.SMTPServerDisconnected("reset")))
+        self.assertFalse(is_permanent_failure(ConnectionResetError()))
+        service = NotificationService(make_settings(notification_mode="smtp"))
+        self.assertEqual(service.deliver("no-es-email", "Hola", "<p>Hola</p>").permanent, True)
+
+    def test_envio_en_paralelo_con_metricas(self):
+        barrier = threading.Barrier(2, timeout=2)
+
+        def deliver(to, subject, html, plain=""):
+            # Sólo pasa si los dos envíos del lote corren a la vez
+            barrier.wait()
+            return True, None
+
+        self.service.deliver = deliver
+        for i in range(2):
+            self.service.send_email(self.user, "test", f"Asunto {i}", "<p>x</p>")
+        self.assertEqual(self.worker.run_once(), 2)
+        self.assertEqual(metrics.get("notification_send_seconds_count", mode="simulated"), 2)
+        self.assertEqual(metrics.get("notification_send_seconds_bucket", le="+Inf", mode="simulated"), 2)
+        self.assertGreater(metrics.get("notification_throughput_per_second"), 0)
+
+
+class RetryDelayTest(unittest.TestCase):
+    def test_backoff_exponencial_con_jitter(self):
+        self.assertEqual([retry_delay(n, 60, 3600, rand=lambda: 0) for n in (1, 2, 3)], [30, 60, 120])
+        self.assertEqual([retry_delay(n, 60, 3600, rand=lambda: 1) for n in (1, 2, 3)], [60, 120, 240])
+        # Con tope
+        self.assertEqual(retry_delay(20, 60, 3600, rand=lambda: 1), 3600)
+
+
+class EmailTemplatesTest(unittest.TestCase):
+    def test_extraer_params_de_html_viejo(self):
+        params = {
+            "nombre": "Ana", "cancha": "Cancha 1", "deporte": "Tenis", "fecha_inicio": "01/01/2030 10:00",
+            "fecha_fin": "01/01/2030 11:00", "precio": "20.00",
+        }
+        html = render_email("reservation_confirmation", params)
+        self.assertEqual(extract_params("reservation_confirmation", html), params)
+        self.assertIsNone(extract_params("reservation_confirmation", html.replace("<body>", "<body >")))
+
+    def test_fila_v1_se_renderiza_con_su_version_despues_de_v2(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(email_templates, "TEMPLATES_DIR", tmp), \
+                mock.patch.dict(email_templates._sources, clear=True), \
+                mock.patch.dict(email_templates.EMAIL_TEMPLATES):
+            def write(name, text):
+                with open(os.path.join(tmp, name), "w", encoding="utf-8") as f:
+                    f.write(text)
+
+            write("aviso.html", "<p>Hola $nombre</p>")
+            email_templates.EMAIL_TEMPLATES["aviso"] = EmailTemplate("aviso.html", 1, "")
+            v1 = render_email("aviso", {"nombre": "Ana"}, 1)
+
+            # v2 cambia los parámetros; la v1 se conserva como aviso.v1.html
+            os.rename(os.path.join(tmp, "aviso.html"), os.path.join(tmp, "aviso.v1.html"))
+            write("aviso.html", "<p>Hola $nombre, tu cancha es $cancha</p>")
+            email_templates._sources.clear()
+            email_templates.EMAIL_TEMPLATES["aviso"] = EmailTemplate("aviso.html", 2, "", previous={1: "aviso.v1.html"})
+
+            self.assertEqual(render_email("aviso", {"nombre": "Ana"}, 1), v1)
+            self.assertEqual(render_email("aviso", {"nombre": "Ana", "cancha": "Norte"}, 2), "<p>Hola Ana, tu cancha es Norte</p>")
+            self.assertEqual(render_email("aviso", {"nombre": "Ana", "cancha": "Norte"}), "<p>Hola Ana, tu cancha es Norte</p>")
+
+
+class FakeReminders:
+    """Reservas pagadas + reservation_reminders en memoria."""
+
+    def __init__(self, outbox, starts):
+        self.outbox = outbox
+        self.reservas = {
+            rid: {"id": rid, "user_id": 1, "fecha_inicio": inicio, "fecha_fin": inicio + timedelta(hours=1),
+                  "cancha": "Cancha 1", "deporte": "Tenis", "nombre": "Ana", "email": "ana@test.com"}
+            for rid, inicio in starts.items()
+        }
+        self.reminders = {}
+        self.pages = 0
+
+    def _pending(self, start, end, after):
+        rows = [r for r in self.reservas.values() if r["id"] not in self.reminders
+                and start < r["fecha_inicio"] <= end and (r["fecha_inicio"], r["id"]) > after]
+        return sorted(rows, key=lambda r: (r["fecha_inicio"], r["id"]))
+
+    def find_due(self, start, end, after, limit):
+        self.pages += 1
+        return self._pending(start, end, after)[:limit]
+
+    def upcoming_start_times(self, start, end, limit):
+        return [(r["id"], r["fecha_inicio"]) for r in self._pending(start, end, (start, 0))[:limit]]
+
+    def record(self, reminders):
+        # Todo o nada, como la transacción del repositorio
+        queued = [(rid, n) for rid, n in reminders if rid not in self.reminders]
+        self.outbox.create_many([n for _, n in queued])
+        for rid, n in queued:
+            self.reminders[rid] = n.id
+        return [n for _, n in queued]
+
+
+class ReminderSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.now = datetime(2025, 3, 1, 10, 0)
+        self.outbox = FakeOutbox()
+        self.service = NotificationService(make_settings())
+        self.service.notification_repo = self.outbox
+        self.reminders = FakeReminders(self.outbox, {
+            1: self.now + timedelta(hours=2),
+            2: self.now + timedelta(hours=20),
+            3: self.now + timedelta(hours=23),
+            4: self.now + timedelta(hours=30),
+        })
+        settings = make_settings(reminder_hours_before=24, reminder_batch_size=2, reminder_refresh_interval=3600)
+        self.scheduler = ReminderScheduler(settings, self.service, self.reminders, clock=lambda: self.now)
+
+    def test_envia_por_lotes_sin_duplicar(self):
+        self.assertEqual(self.scheduler.run_once(self.now), 3)
+        self.assertEqual(self.reminders.pages, 2)
+        self.assertEqual({n.tipo for n in self.outbox.rows.values()}, {"reservation_reminder"})
+        self.assertEqual(self.reminders.reminders, {1: 1, 2: 2, 3: 3})
+        # Segunda pasada (u otro scheduler): nada nuevo
+        self.assertEqual(self.scheduler.run_once(self.now), 0)
+        self.assertEqual(len(self.outbox.rows), 3)
+        self.assertIn("Cancha 1", self.service.render(self.outbox.rows[1]))
+        self.assertEqual(metrics.get("reservation_reminders_sent_total"), 3)
+
+    def test_heap_despierta_en_el_proximo_vencimiento(self):
+        self.scheduler.refresh(self.now)
+        self.scheduler.run_once(self.now)
+        # La reserva 4 vence 30 h - 24 h = 6 h después; antes toca el refresh (1 h)
+        self.assertEqual(self.scheduler.next_wakeup(self.now), 3600)
+        self.scheduler.refresh(self.now + timedelta(hours=5, minutes=30))
+        self.assertEqual(self.scheduler.next_wakeup(self.now + timedelta(hours=5, minutes=30)), 1800)
+        self.assertEqual(self.scheduler.run_once(self.now + timedelta(hours=6)), 1)
+        self.assertEqual(self.reminders.reminders[4], 4)
+
+    def test_fallo_al_encolar_no_marca_el_recordatorio(self):
+        def fail(notifications):
+            raise RuntimeError("db caída")
+        self.outbox.create_many = fail
+        with self.assertRaises(RuntimeError):
+            self.scheduler.run_once(self.now)
+        self.assertEqual(self.reminders.reminders, {})
+        del self.outbox.create_many
+        self.assertEqual(self.scheduler.run_once(self.now), 3)
+
+
+class FakeBroadcasts:
+    """Tabla broadcasts + users en memoria; enqueue_batch con el mismo control de checkpoint."""
+
+    def __init__(self, outbox, users):
+        self.outbox = outbox
+        self.users = users
+        self.broadcasts = {}
+        self.streamed = []
+        self.fail_after = None
+
+    def create(self, broadcast):
+        broadcast.id = len(self.broadcasts) + 1
+        broadcast.total = len(self.users)
+        self.broadcasts[broadcast.id] = broadcast
+        return broadcast
+
+    def iter_recipients(self, after_user_id, itersize=2000):
+        for user_id in sorted(self.users):
+            if user_id > after_user_id:
+                self.streamed.append(user_id)
+                yield {"id": user_id, "nombre": self.users[user_id]}
+
+    def enqueue_batch(self, broadcast_id, notifications, expected_last_user_id, last_user_id):
+        if self.fail_after is not None and self.outbox.rows and len(self.outbox.rows) >= self.fail_after:
+            raise RuntimeError("conexión perdida")
+        stored = self.broadcasts[broadcast_id]
+        if stored.last_user_id != expected_last_user_id:
+            return False
+        self.outbox.create_many(notifications)
+        stored.last_user_id, stored.encoladas = last_user_id, stored.encoladas + len(notifications)
+        return True
+
+    def finish(self, broadcast_id):
+        self.broadcasts[broadcast_id].estado = "completado"
+
+    def find_unfinished(self):
+        return [b for b in self.broadcasts.values() if b.estado == "en_curso"]
+
+
+class BroadcastServiceTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.outbox = FakeOutbox()
+        notification_service = NotificationService(make_settings())
+        notification_service.notification_repo = self.outbox
+        self.repo = FakeBroadcasts(self.outbox, {i: f"Usuario {i}" for i in range(1, 8)})
+        self.service = BroadcastService(make_settings(broadcast_batch_size=3), notification_service, self.repo)
+        self.admin = User(id=1, nombre="Admin", email="admin@test.com", password_hash="x", rol_id=1)
+
+    def test_encola_por_lotes_a_todos(self):
+        broadcast = self.service.run(self.service.create(self.admin, "Cancha 2 cerrada", "Mañana <no> abre"))
+        self.assertEqual(broadcast.estado, "completado")
+        self.assertEqual(self.outbox.inserts, 3)  # 3 + 3 + 1
+        self.assertEqual(sorted(n.user_id for n in self.outbox.rows.values()), list(range(1, 8)))
+        html = self.service.notification_service.render(self.outbox.rows[7])
+        self.assertIn("Usuario 7", html)
+        self.assertIn("Mañana &lt;no&gt; abre", html)
+        self.assertEqual(metrics.get("broadcast_notifications_enqueued_total"), 7)
+
+    def test_retoma_desde_el_checkpoint_sin_duplicar(self):
+        broadcast = self.service.create(self.admin, "Aviso", "Hola")
+        self.repo.fail_after = 3
+        with self.assertRaises(RuntimeError):
+            self.service.run(broadcast)
+        self.assertEqual(self.repo.broadcasts[broadcast.id].last_user_id, 3)
+        self.repo.fail_after = None
+        self.repo.streamed = []
+        self.service.resume_unfinished()
+        self.assertEqual(self.repo.streamed, [4, 5, 6, 7])
+        self.assertEqual(sorted(n.user_id for n in self.outbox.rows.values()), list(range(1, 8)))
+
+    def test_otro_runner_avanzo_el_checkpoint(self):
+        broadcast = self.service.create(self.admin, "Aviso", "Hola")
+        stale = Broadcast(broadcast.asunto, broadcast.mensaje, id=broadcast.id)
+        self.service.run(broadcast)
+        self.service.run(stale)
+        self.assertEqual(len(self.outbox.rows), 7)
+
+    def test_transaccional_pasa_antes_que_el_comunicado(self):
+        self.service.run(self.service.create(self.admin, "Aviso", "Hola"))
+        welcome = self.service.notification_service.send_welcome_email(
+            User(id=1, nombre="Usuario 1", email="ana@test.com", password_hash="x", rol_id=2)
+        )
+        self.service.notification_service.deliver = lambda to, subject, html, plain="": (True, None)
+        worker = NotificationWorker(make_settings(notification_batch_size=1), self.service.notification_service)
+        worker.run_once()
+        # La bienvenida se encoló después de los 7 del comunicado, pero sale en el primer lote
+        self.assertEqual(welcome.estado, "enviado")
+        self.assertEqual([n.tipo for n in self.outbox.rows.values() if n.estado == "enviado"], ["welcome"])
+
+    def test_asunto_obligatorio(self):
+        with self.assertRaises(ValueError):
+            self.service.create(self.admin, "  ", "Hola")
+
+
+class FakeSMTP:
+    """Sesión SMTP falsa: cuenta handshakes y puede simular caídas."""
+
+    opened = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.logins = 0
+        self.alive = True
+        self.fail_next = None
+        FakeSMTP.opened.append(self)
+
+    def ehlo(self):
+        return 250, b"ok"
+
+    def starttls(self):
+        return 220, b"ok"
+
+    def login(self, user, password):
+        self.logins += 1
+
+    def noop(self):
+        if not self.alive:
+            raise smtplib.SMTPServerDisconnected("gone")
+        return 250, b"ok"
+
+    def send_message(self, msg):
+        if not self.alive:
+            raise smtplib.SMTPServerDisconnected("gone")
+        if self.fail_next:
+            error, self.fail_next = self.fail_next, None
+            raise error
+        self.sent.append(msg)
+
+    def quit(self):
+        self.alive = False
+
+    def close(self):
+        self.alive = False
+
+
+class SmtpConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        FakeSMTP.opened = []
+        self.pool = SmtpConnectionPool("smtp.test", 587, "user", "pw", max_messages=3, smtp_factory=FakeSMTP)
+
+    def test_reutiliza_la_sesion_autenticada(self):
+        for i in range(3):
+            self.pool.send_message(f"msg {i}")
+        self.assertEqual(len(FakeSMTP.opened), 1)
+        self.assertEqual(FakeSMTP.opened[0].logins, 1)
+        self.assertEqual(len(FakeSMTP.opened[0].sent), 3)
+
+    def test_cierra_al_llegar_a_max_messages(self):
+        for i in range(4):
+            self.pool.send_message(f"msg {i}")
+        self.assertEqual(len(FakeSMTP.opened), 2)
+        self.assertFalse(FakeSMTP.opened[0].alive)
+
+    def test_noop_descarta_sesion_caida(self):
+        self.pool.noop_after = 0
+        self.pool.send_message("a")
+        FakeSMTP.opened[0].alive = False
+        self.pool.send_message("b")
+        self.assertEqual(len(FakeSMTP.opened), 2)
+        self.assertEqual(metrics.get("smtp_connections_stale_total"), 1)
+
+    def test_reconecta_si_la_sesion_se_corta_al_enviar(self):
+        self.pool.send_message("a")
+        FakeSMTP.opened[0].fail_next = smtplib.SMTPServerDisconnected("reset")
+        self.pool.send_message("b")
+        self.assertEqual([len(s.sent) for s in FakeSMTP.opened], [1, 1])
+        self.assertEqual(metrics.get("smtp_reconnects_total"), 1)
+
+    def test_destinatario_rechazado_no_tira_la_sesion(self):
+        self.pool.send_message("a")
+        FakeSMTP.opened[0].fail_next = smtplib.SMTPRecipientsRefused({"x@test.com": (550, b"no")})
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            self.pool.send_message("b")
+        self.pool.send_message("c")
+        self.assertEqual(len(FakeSMTP.opened), 1)
+        self.assertEqual(self.pool.idle_count(), 1)
+
+    def test_limite_por_host(self):
+        now = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        policy = RatePolicy(capacity=1, refill_per_second=0.5)
+        self.pool = SmtpConnectionPool("smtp.test", 587, rate=policy, smtp_factory=FakeSMTP)
+        self.pool.throttle = Throttle(policy, clock=lambda: now[0], sleep=sleep)
+        self.pool.send_message("a")
+        self.pool.send_message("b")
+        self.assertEqual(len(waits), 1)
+        self.assertEqual(metrics.get("smtp_throttled_seconds_total", host="smtp.test"), 2.0)
+
+    def test_latencia_no_incluye_la_espera_del_limite(self):
+        service = NotificationService(make_settings(notification_mode="smtp", smtp_from_email="test@test.com"))
+        service._smtp_pool = self.pool
+        # La espera del token bucket es real (0.3 s); el envío en FakeSMTP es inmediato
+        self.pool.throttle = Throttle(RatePolicy(capacity=1, refill_per_second=1 / 0.3))
+        item = {"email": "ana@test.com", "asunto": "Hola", "contenido": "<p>Hola</p>"}
+        service._timed_deliver(item)
+        result = service._timed_deliver(item)
+        self.assertTrue(result.success)
+        self.assertGreater(result.throttled, 0.2)
+        self.assertEqual(metrics.get("notification_send_seconds_count", mode="smtp"), 2)
+        self.assertLess(metrics.get("notification_send_seconds_sum", mode="smtp"), 0.1)
+        self.assertEqual(metrics.get("notification_send_seconds_bucket", le=0.1, mode="smtp"), 2)
+
+
+class SmtpSinkTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.rolls = []
+        # Sin tiradas pendientes rand() da 1.0: ni fallos ni cortes
+        self.sink = SmtpSink(fail_rate=0.5, drop_rate=0.5, rand=lambda: self.rolls.pop(0) if self.rolls else 1.0).start()
+        self.addCleanup(self.sink.stop)
+        self.service = NotificationService(make_settings(
+            notification_mode="smtp", smtp_host=self.sink.host, smtp_port=self.sink.port,
+            smtp_from_email="test@test.com", smtp_rate_per_second=0,
+        ))
+        self.service._smtp_pool = SmtpConnectionPool(self.sink.host, self.sink.port, starttls=False)
+        self.addCleanup(self.service.smtp_pool.close)
+
+    def test_entrega_reutilizando_la_sesion(self):
+        for i in range(3):
+            self.assertTrue(self.service.deliver(f"u{i}@test.com", "Hola", "<p>Hola</p>", "Hola").success)
+        self.assertEqual(self.sink.messages, 3)
+        self.assertEqual(self.sink.connections, 1)
+
+    def test_falla_inyectada(self):
+        self.rolls = [1.0, 0.0]  # no cortar la conexión, sí responder 451
+        result = self.service.deliver("ana@test.com", "Hola", "<p>Hola</p>")
+        self.assertFalse(result.success)
+        self.assertIn("451", result.error)
+        self.assertFalse(result.permanent)
+        self.assertEqual(self.sink.failed, 1)
+        # Un 451 no tira la sesión: el siguiente mensaje usa la misma conexión
+        self.assertTrue(self.service.deliver("ana@test.com", "Hola", "<p>Hola</p>").success)
+        self.assertEqual(self.sink.connections, 1)
+
+    def test_corte_inyectado_reconecta(self):
+        self.rolls = [0.0]  # el primer DATA cierra la conexión; el pool reintenta en una nueva
+        self.assertTrue(self.service.deliver("ana@test.com", "Hola", "<p>Hola</p>").success)
+        self.assertEqual(self.sink.dropped, 1)
+        self.assertEqual(self.sink.connections, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
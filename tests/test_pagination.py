@@ -0,0 +1,127 @@
+import base64
+import json
+import sqlite3
+import unittest
+from datetime import datetime
+
+from app.core.pagination import decode_cursor, encode_cursor, fetch_keyset_page
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+
+
+class SqliteCursor:
+    """Adapta sqlite3 al estilo de parámetros de psycopg2 (%s) para probar el SQL generado."""
+
+    def __init__(self, conn):
+        self._cur = conn.cursor()
+
+    def execute(self, sql, params=()):
+        self._cur.execute(sql.replace("%s", "?"), params)
+
+    def fetchall(self):
+        names = [d[0] for d in self._cur.description]
+        return [dict(zip(names, row)) for row in self._cur.fetchall()]
+
+
+class RecordingCursor:
+    """Guarda el SQL y los parámetros sin ejecutarlos."""
+
+    def execute(self, sql, params=()):
+        self.sql, self.params = sql, params
+
+    def fetchall(self):
+        return []
+
+
+class KeysetPaginationTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("CREATE TABLE reservas (id INTEGER PRIMARY KEY, dia INTEGER, estado TEXT)")
+        # Varias filas comparten "dia" para comprobar el desempate por id
+        rows = [(i, i // 3, "pagada" if i % 2 else "pendiente") for i in range(1, 21)]
+        self.conn.executemany("INSERT INTO reservas VALUES (?, ?, ?)", rows)
+        self.cur = SqliteCursor(self.conn)
+
+    def page(self, **kwargs):
+        return fetch_keyset_page(
+            self.cur,
+            "SELECT r.id, r.dia, r.estado FROM reservas r",
+            sort_columns=("r.dia", "r.id"),
+            row_keys=("dia", "id"),
+            sort_types=(int, int),
+            limit=kwargs.pop("limit", 6),
+            **kwargs,
+        )
+
+    def test_recorrido_completo_hacia_adelante_y_atras(self):
+        first = self.page()
+        self.assertEqual([r["id"] for r in first.items], [20, 19, 18, 17, 16, 15])
+        self.assertIsNone(first.prev_cursor)
+
+        seen = [r["id"] for r in first.items]
+        page = first
+        while page.next_cursor:
+            page = self.page(after=page.next_cursor)
+            seen.extend(r["id"] for r in page.items)
+        self.assertEqual(seen, list(range(20, 0, -1)))
+        self.assertIsNotNone(page.prev_cursor)
+
+        back = self.page(before=page.prev_cursor)
+        self.assertEqual([r["id"] for r in back.items], [8, 7, 6, 5, 4, 3])
+        self.assertIsNotNone(back.next_cursor)
+        self.assertIsNotNone(back.prev_cursor)
+
+    def test_volver_a_la_primera_pagina(self):
+        second = self.page(after=self.page().next_cursor)
+        first_again = self.page(before=second.prev_cursor)
+        self.assertEqual([r["id"] for r in first_again.items], [20, 19, 18, 17, 16, 15])
+        self.assertIsNone(first_again.prev_cursor)
+
+    def test_condiciones_y_orden_ascendente(self):
+        page = self.page(conditions=("r.estado = %s",), params=("pagada",), descending=False, limit=4)
+        self.assertEqual([r["id"] for r in page.items], [1, 3, 5, 7])
+        page = self.page(conditions=("r.estado = %s",), params=("pagada",), descending=False, limit=4, after=page.next_cursor)
+        self.assertEqual([r["id"] for r in page.items], [9, 11, 13, 15])
+
+    def test_cursor_con_fechas_y_cursor_invalido(self):
+        values = [datetime(2026, 1, 2, 10, 30), 7]
+        self.assertEqual(decode_cursor(encode_cursor(values)), values)
+        self.assertIsNone(decode_cursor("no-es-un-cursor"))
+        # Un cursor inválido se ignora y devuelve la primera página
+        self.assertEqual(self.page(after="basura").items[0]["id"], 20)
+
+    def test_cursor_editado_a_mano_se_ignora(self):
+        # Un JSON que no es lista se ignora
+        self.assertIsNone(decode_cursor(raw_cursor("abc")))
+        self.assertIsNone(decode_cursor(raw_cursor({"id": 1})))
+        self.assertIsNone(decode_cursor(raw_cursor([{"$dt": 5}, 1])))
+        self.assertEqual(self.page(after=raw_cursor("abc")).items[0]["id"], 20)
+        # Lista con un largo distinto de sort_columns: primera página, sin error de parámetros
+        self.assertEqual(self.page(after=encode_cursor([1])).items[0]["id"], 20)
+        self.assertEqual(self.page(before=encode_cursor([1, 2, 3])).items[0]["id"], 20)
+
+    def test_cursor_con_tipos_equivocados_se_ignora(self):
+        # Una fecha (o un texto, o true) donde la columna es entera no llega a la BD
+        for values in ([datetime(2026, 1, 2), 7], ["3", 7], [3, True], [3, None]):
+            self.assertEqual(self.page(after=encode_cursor(values)).items[0]["id"], 20, values)
+            self.assertEqual(self.page(before=encode_cursor(values)).items[0]["id"], 20, values)
+        # Y un entero donde va una fecha, como en (fecha_inicio, id)
+        cur = RecordingCursor()
+        fetch_keyset_page(
+            cur, "SELECT id, fecha_inicio FROM reservas", sort_columns=("fecha_inicio", "id"),
+            row_keys=("fecha_inicio", "id"), limit=5, after=encode_cursor([1, 2]), sort_types=(datetime, int),
+        )
+        self.assertNotIn("WHERE", cur.sql)
+        self.assertEqual(cur.params, [6])
+        fetch_keyset_page(
+            cur, "SELECT id, fecha_inicio FROM reservas", sort_columns=("fecha_inicio", "id"),
+            row_keys=("fecha_inicio", "id"), limit=5, after=encode_cursor([datetime(2026, 1, 2), 2]),
+            sort_types=(datetime, int),
+        )
+        self.assertIn("WHERE (fecha_inicio, id) < (%s, %s)", cur.sql)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from app.core.prerender import PrerenderedPages, accepts_gzip
+
+
+class PrerenderedPagesTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.dir.name, "login.html"), "w", encoding="utf-8") as f:
+            f.write("<p>Precio: $$10</p><p class='msg'>$message</p><footer>ñ</footer>")
+        self.pages = PrerenderedPages(self.dir.name)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_sin_mensaje_y_gzip(self):
+        page = self.pages.get("login.html")
+        headers, body = page.response()
+        self.assertEqual(body.decode("utf-8"), "<p>Precio: $10</p><p class='msg'></p><footer>ñ</footer>")
+        self.assertIn(("Content-Length", str(len(body))), headers)
+
+        gz_headers, gz_body = page.response(accept_gzip=True)
+        self.assertEqual(gzip.decompress(gz_body), body)
+        self.assertIn(("Content-Encoding", "gzip"), gz_headers)
+        # Se arma una sola vez
+        self.assertIs(page.response()[1], body)
+        self.assertIs(self.pages.get("login.html"), page)
+
+    def test_mensaje_escapado(self):
+        headers, body = self.pages.get("login.html").response("<script>x</script>", accept_gzip=True)
+        self.assertIn(b"<p class='msg'>&lt;script&gt;x&lt;/script&gt;</p>", body)
+        self.assertNotIn(("Content-Encoding", "gzip"), headers)
+        self.assertIn(("Content-Length", str(len(body))), headers)
+
+    def test_accept_encoding(self):
+        self.assertTrue(accepts_gzip("gzip, deflate, br"))
+        self.assertTrue(accepts_gzip("br;q=1.0, gzip;q=0.8"))
+        self.assertFalse(accepts_gzip("gzip;q=0"))
+        self.assertFalse(accepts_gzip("identity"))
+        self.assertFalse(accepts_gzip(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import io
+import unittest
+from urllib.parse import urlencode
+
+from app.core.metrics import metrics
+from app.core.rate_limit import RateLimiter, RatePolicy, Throttle
+from app.server import SimpleHandler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+POLICIES = {
+    "/login": {
+        "ip": RatePolicy(capacity=3, refill_per_second=1),
+        "account": RatePolicy(capacity=2, refill_per_second=0.5),
+    },
+}
+
+
+class RateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(POLICIES, max_buckets=100, clock=self.clock)
+
+    def test_rafaga_y_recarga(self):
+        for _ in range(3):
+            self.assertEqual(self.limiter.check("/login", "ip", "1.2.3.4"), 0)
+        retry_after = self.limiter.check("/login", "ip", "1.2.3.4")
+        self.assertAlmostEqual(retry_after, 1.0)
+        self.clock.now += 1
+        self.assertEqual(self.limiter.check("/login", "ip", "1.2.3.4"), 0)
+
+    def test_claves_independientes(self):
+        for _ in range(2):
+            self.limiter.check("/login", "account", "ana@example.com")
+        self.assertGreater(self.limiter.check("/login", "account", "ana@example.com"), 0)
+        self.assertEqual(self.limiter.check("/login", "account", "luis@example.com"), 0)
+
+    def test_ruta_sin_politica_no_limita(self):
+        for _ in range(50):
+            self.assertEqual(self.limiter.check("/logout", "ip", "1.2.3.4"), 0)
+        self.assertEqual(self.limiter.bucket_count(), 0)
+
+    def test_desalojo_lru(self):
+        limiter = RateLimiter(POLICIES, max_buckets=2, clock=self.clock)
+        limiter.check("/login", "ip", "a")
+        limiter.check("/login", "ip", "b")
+        limiter.check("/login", "ip", "a")  # "b" pasa a ser el menos reciente
+        limiter.check("/login", "ip", "c")
+        self.assertEqual(limiter.bucket_count(), 2)
+        self.assertEqual(metrics.get("rate_limit_evictions_total"), 1)
+
+    def test_metricas_de_rechazos(self):
+        for _ in range(5):
+            self.limiter.check("/login", "ip", "1.2.3.4")
+        self.assertEqual(metrics.get("rate_limit_throttled_total", route="/login", scope="ip"), 2)
+        self.assertIn('rate_limit_throttled_total{route="/login",scope="ip"} 2', metrics.render())
+
+
+class FakeAuthService:
+    def autenticar(self, email, password):
+        if password != "Password1":
+            raise ValueError("Credenciales inválidas")
+        return None, type("Session", (), {"token": "tok"})()
+
+
+class LoginRateLimitTest(unittest.TestCase):
+    """handle_login sin servidor: sólo las piezas que usa del handler."""
+
+    def setUp(self):
+        metrics.reset()
+        self.limiter = RateLimiter(POLICIES, clock=FakeClock())
+
+    def login(self, ip, password):
+        handler = SimpleHandler.__new__(SimpleHandler)
+        body = urlencode({"email": "Ana@Example.com", "password": password}).encode()
+        handler.headers = {"Content-Length": str(len(body))}
+        handler.rfile = io.BytesIO(body)
+        handler.wfile = io.BytesIO()
+        handler.client_address = (ip, 5000)
+        handler.rate_limiter = self.limiter
+        handler.auth_service = FakeAuthService()
+        handler.statuses = []
+        handler.send_response = handler.statuses.append
+        handler.send_header = lambda *args: None
+        handler.end_headers = lambda: None
+        handler.send_prerendered = lambda name, msg: handler.statuses.append(200)
+        handler.handle_login()
+        return handler.statuses[0]
+
+    def test_fallos_de_otro_cliente_no_bloquean_al_dueno(self):
+        for _ in range(2):
+            self.assertEqual(self.login("6.6.6.6", "mala"), 200)
+        self.assertEqual(self.login("6.6.6.6", "mala"), 429)
+        # El dueño entra desde su IP con la contraseña correcta
+        self.assertEqual(self.login("1.2.3.4", "Password1"), 302)
+
+
+class ThrottleTest(unittest.TestCase):
+    def test_espera_en_vez_de_rechazar(self):
+        clock = FakeClock()
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock.now += seconds
+
+        throttle = Throttle(RatePolicy(capacity=2, refill_per_second=0.5), clock=clock, sleep=sleep)
+        self.assertEqual(throttle.acquire(), 0)
+        self.assertEqual(throttle.acquire(), 0)
+        self.assertAlmostEqual(throttle.acquire(), 2.0)
+        self.assertEqual(len(sleeps), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -64,5 +64,15 @@ class ReservationServiceTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.service.crear_reserva(1, 1, fecha, 1)
 
+    def test_disponibilidad(self):
+        dia = (datetime.now() + timedelta(days=1)).date()
+        self.service.crear_reserva(1, 1, datetime.combine(dia, datetime.min.time()).replace(hour=10), 2)
+        disp = self.service.disponibilidad(1, dia)
+        self.assertEqual(len(disp["ocupados"]), 1)
+        horas = [h.hour for h in disp["libres"]]
+        self.assertEqual(horas, [7, 8, 9] + list(range(12, 22)))
+        with self.assertRaises(ValueError):
+            self.service.disponibilidad(99, dia)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
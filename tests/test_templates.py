@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+from app.core.template_engine import Markup, TemplateEnvironment, TemplateSyntaxError
+
+
+class TemplateEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.env = TemplateEnvironment(self.dir.name)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name, source):
+        with open(os.path.join(self.dir.name, name), "w", encoding="utf-8") as f:
+            f.write(source)
+
+    def test_escape_automatico_y_safe(self):
+        t = self.env.from_string("{{ nombre }}|{{ html|safe }}|{{ nada }}|{{ falta }}|{{ n }}")
+        out = t.render(nombre="<b>O'Neil & co</b>", html="<i>ok</i>", nada=None, n=3)
+        self.assertEqual(out, "&lt;b&gt;O&#x27;Neil &amp; co&lt;/b&gt;|<i>ok</i>|||3")
+        self.assertEqual(t.render(nombre=Markup("<b>ya seguro</b>")).split("|")[0], "<b>ya seguro</b>")
+
+    def test_for_con_else_e_if(self):
+        t = self.env.from_string(
+            "{% for i, r in enumerate(rows, start=5) %}{{ i }}:{{ r['n'] }}"
+            "{% if r['n'] > 1 %}+{% elif r['n'] %}={% else %}0{% endif %} "
+            "{% else %}vacío{% endfor %}"
+        )
+        self.assertEqual(t.render(rows=[{"n": 0}, {"n": 1}, {"n": 2}]), "5:00 6:1= 7:2+ ")
+        self.assertEqual(t.render(rows=[]), "vacío")
+
+    def test_include_ve_variables_del_ciclo(self):
+        self.write("fila.html", "<tr><td>{{ idx }}</td><td>{{ r }}</td><td>{{ titulo }}</td></tr>")
+        t = self.env.from_string('{% for idx, r in enumerate(rows) %}{% include "fila.html" %}{% endfor %}')
+        self.assertEqual(
+            t.render(rows=["a"], titulo="T"),
+            "<tr><td>0</td><td>a</td><td>T</td></tr>",
+        )
+
+    def test_herencia_de_bloques(self):
+        self.write("base.html", "<title>{% block titulo %}Base{% endblock %}</title><main>{% block contenido %}{% endblock %}</main>")
+        self.write("medio.html", '{% extends "base.html" %}{% block contenido %}medio{% endblock %}')
+        self.write("hijo.html", '{% extends "medio.html" %}ignorado{% block titulo %}Hijo {{ x }}{% endblock %}')
+        self.assertEqual(self.env.render("hijo.html", x=1), "<title>Hijo 1</title><main>medio</main>")
+        self.assertEqual(self.env.render("base.html"), "<title>Base</title><main></main>")
+
+    def test_compila_una_sola_vez(self):
+        self.write("a.html", "{{ x }}")
+        first = self.env.get_template("a.html")
+        self.assertIs(self.env.get_template("a.html"), first)
+        self.assertEqual(first.render(x=1), "1")
+        self.assertEqual(first.render(x=2), "2")
+
+    def test_errores_de_sintaxis_con_linea(self):
+        for source, fragment in [
+            ("a\n{% for x %}", "línea 2"),
+            ("{% if x %}", "falta cerrar if"),
+            ("{% endfor %}", "endfor sin for"),
+            ("{{ 1 + }}", "expresión inválida"),
+            ("{% foo %}", "etiqueta desconocida"),
+            ('x{% extends "base.html" %}', "extends debe ser la primera"),
+        ]:
+            with self.assertRaises(TemplateSyntaxError) as ctx:
+                self.env.from_string(source)
+            self.assertIn(fragment, str(ctx.exception))
+
+
+class UserPagesTemplateTest(unittest.TestCase):
+    """Filas de las páginas de usuario y de pagos con datos que traen HTML."""
+
+    def setUp(self):
+        self.env = TemplateEnvironment(os.path.join(os.path.dirname(__file__), "..", "app", "web", "templates"))
+
+    def test_filas_de_reservas_escapan_y_eligen_acciones(self):
+        out = self.env.render("_user_reservas_rows.html", reservas=[
+            {"id": 7, "cancha": "<script>x</script>", "fecha_inicio": "a", "fecha_fin": "b", "estado": "pendiente"},
+            {"id": 8, "cancha": "Norte", "fecha_inicio": "a", "fecha_fin": "b", "estado": "cancelada"},
+        ])
+        self.assertIn("&lt;script&gt;x&lt;/script&gt;", out)
+        self.assertNotIn("<script>", out)
+        self.assertIn("/pagos/create?reservation_id=7", out)
+        self.assertEqual(out.count("Cancelar</button>"), 1)
+        self.assertIn("No tienes reservas activas.", self.env.render("_user_reservas_rows.html", reservas=[]))
+
+    def test_listados_de_pagos_escapan(self):
+        pago = {"amount": "10.00", "estado": "<b>ok</b>", "created_at": "hoy", "usuario_nombre": "<i>Ana</i>", "metodo_nombre": None}
+        out = self.env.render("payments_list.html", pagos=[pago], pos=11, pager=Markup("<div class='pager'></div>"))
+        self.assertIn("<tr><td>11</td><td>&lt;i&gt;Ana&lt;/i&gt;</td><td>$10.00</td><td></td><td>&lt;b&gt;ok&lt;/b&gt;</td>", out)
+        self.assertIn("<div class='pager'></div>", out)
+        out = self.env.render("payments_list_user.html", pagos=[pago], pos=3)
+        self.assertIn("<tr><td>3</td><td>$10.00</td><td>&lt;b&gt;ok&lt;/b&gt;</td>", out)
+
+    def test_dashboard_de_usuario(self):
+        out = self.env.render(
+            "dashboard_user.html", nombre="<Ana>", es_admin=False,
+            reservas_rows=Markup("<tr>R</tr>"), pagos_rows=Markup("<tr>P</tr>"),
+        )
+        self.assertIn("Bienvenido, &lt;Ana&gt;", out)
+        self.assertIn("<tbody><tr>R</tr></tbody>", out)
+        self.assertIn("<tbody><tr>P</tr></tbody>", out)
+        self.assertNotIn("Volver al Panel de Admin", out)
+        self.assertIn("Volver al Panel de Admin", self.env.render("dashboard_user.html", es_admin=True))
+
+
+if __name__ == "__main__":
+    unittest.main()